@@ -0,0 +1,42 @@
+import resource
+import sys
+
+import click
+from loguru import logger
+
+from src.translator.translate import translate
+from src.translator.treeFormula import DMNTree, tree, translateDMNReadyinDMNTree
+
+EXPRESSIONS = (
+    "fields['SignFL{i}'] eq true or fields['SignUL'] eq true",
+    "(fields.status{i} eq 'a' or fields.status{i} eq 'b') and fields.flag",
+    "!(fields.a{i} and fields.b) or fields.c",
+    "(fields.a{i} or fields.b) and (fields.c or fields.d) and (fields.e or fields.f)",
+)
+
+
+@click.command()
+@click.option('--count', default=10000, type=int, help='expressions in batch')
+@click.option('--freeze/--no-freeze', default=True, help='release parse trees after translation')
+def main(count, freeze):
+    """
+    Peak RSS of batch translation, translated DMN trees are kept until the end of batch
+    """
+    logger.remove()
+    trees = []
+    for i in range(count):
+        expression = EXPRESSIONS[i % len(EXPRESSIONS)].format(i=i)
+        if freeze:
+            trees.append(translate(expression))
+        else:
+            dmn_tree = DMNTree(tree(expression))
+            translateDMNReadyinDMNTree(dmn_tree)
+            trees.append(dmn_tree)
+
+    # ru_maxrss в килобайтах на linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sys.stdout.write(f'expressions: {count}, freeze: {freeze}, peak RSS: {peak / 1024:.1f} MB\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import sys
+import time
+
+import click
+from loguru import logger
+
+from src.translator.parseArena import ParseArena
+from src.translator.prattParser import parse
+from src.translator.treeFormula import tree
+
+EXPRESSIONS = (
+    "fields['SignFL{i}'] eq true or fields['SignUL'] eq true",
+    "(fields.status{i} eq 'a' or fields.status{i} eq 'b') and fields.flag",
+    "!(fields.a{i} and fields.b) or fields.c",
+    "(fields.a{i} or fields.b) and (fields.c or fields.d) and (fields.e or fields.f)",
+    "(fields.a{i} or fields.b) ? fields.c eq 'x' : !empty (fields.d and fields.e)",
+    "fields.p_ContractTransferType.Code eq '7185643' and !empty fields.ScanNotificationLetterSO{i}",
+)
+
+
+def antlrArena(expression: str) -> ParseArena:
+    """
+    ANTLR parse tree copied to ParseArena, as DMNTree does
+    """
+    return ParseArena(tree(expression))
+
+
+@click.command()
+@click.option('--count', default=3000, type=int, help='expressions in batch')
+def main(count):
+    """
+    Expressions per second parsed to ParseArena: ANTLR front end against prattParser
+    """
+    logger.remove()
+    expressions = [EXPRESSIONS[i % len(EXPRESSIONS)].format(i=i) for i in range(count)]
+
+    started = time.perf_counter()
+    for e in expressions:
+        antlrArena(e)
+    antlr_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for e in expressions:
+        parse(e)
+    pratt_time = time.perf_counter() - started
+
+    sys.stdout.write(f'expressions: {count}\n'
+                     f'antlr: {count / antlr_time:.0f} expressions/s\n'
+                     f'pratt: {count / pratt_time:.0f} expressions/s\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import random
+import sys
+
+import click
+from loguru import logger
+from lxml import etree
+
+from src.translator.dmnEvaluator import DMNEvaluator, columnsFromRecords
+from src.translator.ruleOrdering import optimizeTables
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+
+EXPRESSIONS = (
+    "fields['status{i}'] eq 'a' or fields['status{i}'] eq 'b' and fields['flag'] or fields['code'] eq 1",
+    "fields['SignFL{i}'] eq true or fields['SignUL'] eq true",
+    "fields['type{i}'] eq 1 and fields['flag'] or fields['type{i}'] eq 2 or fields['code'] eq null",
+    "fields['flag{i}'] and fields['code'] eq 2 or fields['status'] eq 'c'",
+)
+VALUES = ('a', 'b', 'c', 1, 2, None, True, False)
+
+
+def sampleRecords(rng: random.Random, names: list, size: int) -> list:
+    # у каждого поля свое частое значение
+    weights = {name: [rng.random() ** 4 for _ in VALUES] for name in names}
+    return [{'fields': {name: rng.choices(VALUES, weights[name])[0] for name in names}} for _ in range(size)]
+
+
+@click.command()
+@click.option('--count', default=200, type=int, help='expressions in batch')
+@click.option('--file', 'path', type=click.File('r'), default=None,
+              help='corpus of expressions, one per line, instead of generated batch')
+@click.option('--records', default=500, type=int, help='sample records per expression')
+def main(count, path, records):
+    """
+    Input entries evaluated per record before and after ordering of rules and choice of hit policy
+    """
+    logger.remove()
+    if path is not None:
+        expressions = [line.strip() for line in path if line.strip()]
+    else:
+        expressions = [EXPRESSIONS[i % len(EXPRESSIONS)].format(i=i) for i in range(count)]
+
+    rng = random.Random(49)
+    failed = tables = 0
+    before = after = 0.0
+    policies = {}
+    for e in expressions:
+        try:
+            definitions = etree.fromstring(etree.tostring(DMN_XML.visit(translate(e))))
+            inputs = DMNEvaluator(definitions).inputExpressions()
+            # fields [ "x" ] -> x
+            names = [x.split('"')[1] for x in inputs if '"' in x]
+            sample = sampleRecords(rng, names, records)
+            for table in optimizeTables(definitions, columnsFromRecords(sample, inputs)):
+                tables += 1
+                before += table.before
+                after += table.after
+                policies[table.hitPolicy] = policies.get(table.hitPolicy, 0) + 1
+        except Exception:
+            failed += 1
+
+    sys.stdout.write(f'expressions: {len(expressions)}, not optimized: {failed}, tables: {tables}\n'
+                     f'hit policies: {policies}\n'
+                     f'entries evaluated per record: {before:.1f} -> {after:.1f}\n')
+
+
+if __name__ == '__main__':
+    main()
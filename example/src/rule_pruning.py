@@ -0,0 +1,56 @@
+import sys
+
+import click
+from loguru import logger
+
+from src.translator.translate import translate
+from src.translator.treeFormula import ExpressionDMN, postorder
+from src.translator.xmlPacker import DmnElementsExtracter
+
+EXPRESSIONS = (
+    "fields['status{i}'] eq 'a' and fields['status{i}'] eq 'b' or fields['flag']",
+    "(fields['status{i}'] eq 'a' or fields['status{i}'] eq 'b') and (fields['status{i}'] eq 'b' or fields['flag'])",
+    "fields['code{i}'] eq null and fields['code{i}'] eq '7185643' or fields['SignFL'] eq true",
+    "fields['SignFL{i}'] eq true or fields['SignUL'] eq true",
+    "fields['flag{i}'] and fields['flag{i}'] eq 'Y' or fields['type'] eq 1 and fields['d']",
+)
+
+
+def tableSize(expression: str, prune: bool) -> tuple:
+    inputs = DmnElementsExtracter.getInputs(expression)
+    rules = DmnElementsExtracter.getRulesOrdered(expression, inputs, prune)
+    return len(rules), sum(1 for rule in rules for entry in rule.inputEntries if entry)
+
+
+@click.command()
+@click.option('--count', default=500, type=int, help='expressions in batch')
+@click.option('--file', 'path', type=click.File('r'), default=None,
+              help='corpus of expressions, one per line, instead of generated batch')
+def main(count, path):
+    """
+    Rules and input entries of decision tables with and without SAT pruning
+    """
+    logger.remove()
+    if path is not None:
+        expressions = [line.strip() for line in path if line.strip()]
+    else:
+        expressions = [EXPRESSIONS[i % len(EXPRESSIONS)].format(i=i) for i in range(count)]
+
+    failed = 0
+    totals = [0, 0, 0, 0]
+    for e in expressions:
+        try:
+            for node in postorder(translate(e).root):
+                if isinstance(node, ExpressionDMN):
+                    sizes = tableSize(node.expression, False) + tableSize(node.expression, True)
+                    totals = [t + s for t, s in zip(totals, sizes)]
+        except Exception:
+            failed += 1
+
+    rules, entries, pruned_rules, pruned_entries = totals
+    sys.stdout.write(f'expressions: {len(expressions)}, not translated: {failed}\n'
+                     f'rules: {rules} -> {pruned_rules}, input entries: {entries} -> {pruned_entries}\n')
+
+
+if __name__ == '__main__':
+    main()
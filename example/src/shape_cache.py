@@ -0,0 +1,49 @@
+import sys
+
+import click
+from loguru import logger
+
+from src.translator.toKNF import shapeCacheInfo
+from src.translator.translate import translate
+
+EXPRESSIONS = (
+    "fields['SignFL{i}'] eq true or fields['SignUL'] eq true",
+    "(fields.status{i} eq 'a' or fields.status{i} eq 'b') and fields.flag",
+    "!(fields.a{i} and fields.b) or fields.c",
+    "(fields.a{i} or fields.b) and (fields.c or fields.d) and (fields.e or fields.f)",
+    "(fields.a{i} or fields.b) ? fields.c eq 'x' : !empty (fields.d and fields.e)",
+    "fields.p_ContractTransferType.Code eq '7185643' and !empty fields.ScanNotificationLetterSO{i}",
+)
+
+
+@click.command()
+@click.option('--count', default=600, type=int, help='expressions in batch')
+@click.option('--file', 'path', type=click.File('r'), default=None,
+              help='corpus of expressions, one per line, instead of generated batch')
+def main(count, path):
+    """
+    Hit rate of DNF cache by formula shape on batch translation
+    """
+    logger.remove()
+    if path is not None:
+        expressions = [line.strip() for line in path if line.strip()]
+    else:
+        expressions = [EXPRESSIONS[i % len(EXPRESSIONS)].format(i=i) for i in range(count)]
+
+    failed = 0
+    for e in expressions:
+        try:
+            translate(e)
+        except Exception:
+            # арифметику и прочие не логические формулы pyeda не разбирает
+            failed += 1
+
+    info = shapeCacheInfo()
+    calls = info.hits + info.misses
+    sys.stdout.write(f'expressions: {len(expressions)}, not translated: {failed}\n'
+                     f'formulas: {calls}, shapes: {info.misses}, hits: {info.hits}, '
+                     f'hit rate: {info.hits / max(calls, 1):.1%}\n')
+
+
+if __name__ == '__main__':
+    main()
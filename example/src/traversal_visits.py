@@ -0,0 +1,577 @@
+import re
+import sys
+import time
+from typing import List, Tuple
+
+import click
+from loguru import logger
+from antlr4 import ParserRuleContext, TerminalNode
+from antlr4.tree.Tree import TerminalNodeImpl
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
+
+from src.translator.passState import PassState
+from src.translator.parseArena import ParseArena
+from src.translator.sourceText import text, sourceOf
+from src.translator.treeFormula import tree, DMNTreeNode, ExpressionDMN, OperatorDMN, FormulaAnalyzer, PassVisitor, treeHeight, \
+    tokenSpan, OPERATOR_TYPES, LOGICAL_OPERATORS
+
+EXPRESSIONS = (
+    "fields['SignFL{i}'] eq true or fields['SignUL'] eq true",
+    "(fields.status{i} eq 'a' or fields.status{i} eq 'b') and fields.flag",
+    "!(fields.a{i} and fields.b) or fields.c",
+    "(fields.a{i} or fields.b) and (fields.c or fields.d) and (fields.e or fields.f)",
+    "(fields.a{i} or fields.b) ? fields.c eq 'x' : !empty (fields.d and fields.e)",
+    "fields.p_ContractTransferType.Code eq '7185643' and !empty fields.ScanNotificationLetterSO{i}",
+)
+
+
+# отдельные проходы по дереву разбора, которые FormulaAnalyzer заменяет одним обходом ParseArena
+def operatorType(operator: TerminalNode) -> int:
+    """
+    Token type of operator, Equality and Relation tokens are resolved by text: eq -> JavaELParser.Equal
+    :param operator: operator terminal
+    :return: token type
+    """
+    return OPERATOR_TYPES.get(operator.getText(), operator.symbol.type)
+
+
+def hasLogicalOperator(ctx: ParserRuleContext) -> bool:
+    """
+    subtree contains and, or or ternary operator
+    :param ctx: root of subtree
+    :return: bool
+    """
+    stack = [ctx]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, TerminalNode):
+            if node.symbol.type in LOGICAL_OPERATORS:
+                return True
+        else:
+            stack.extend(node.getChildren())
+    return False
+
+
+def toParentTernaryDist(ctx: ParserRuleContext) -> int:
+    dist = 0
+    while not isinstance(ctx.parentCtx, JavaELParser.TernaryContext):
+        ctx = ctx.parentCtx
+        dist += 1
+    return dist
+
+
+def isCtxSimple(ctx: ParserRuleContext) -> bool:
+    """
+    subtree is simple operand if
+    max dist to bottom + dist to parent Ternary == 10 (distance to bottom in simple case)
+    and ctx can be fork, not a TerminalNode
+    :param ctx: root of subtree
+    :return: bool
+    """
+    th = treeHeight(ctx)
+    tp = toParentTernaryDist(ctx)
+    return th + tp == 10 and not isinstance(ctx, TerminalNode)
+
+
+class DMNTreeBuilder(PassVisitor):
+    """
+    Extract to DMN node operands of non-logical operators
+    """
+    def __init__(self, node: DMNTreeNode, state: PassState = None):
+        super(DMNTreeBuilder, self).__init__(state)
+        self.node = node
+        # (первый токен, последний токен, dmn id) - части выражения node, вынесенные в детей
+        self.edits = []
+
+    def replaceSpan(self, start: int, stop: int, dmn_id: str):
+        self.edits.append((start, stop, dmn_id))
+
+    def applyEdits(self):
+        """
+        Rewrite node expression once: tokens of node span with extracted parts replaced by dmn ids
+        :return:
+        """
+        if not self.edits:
+            return
+        source = sourceOf(self.node.contexts[0])
+        self.node.expression = source.rewrite(self.node.span[0], self.node.span[1], self.edits)
+        self.edits = []
+
+    def add_binary_children(self, ctx_l: ParserRuleContext, ctx_r: ParserRuleContext, operator: int):
+        # self.node
+        #    |
+        #    |
+        # operator
+        #  |    |
+        #  |    |
+        # left right
+        new_op_node = OperatorDMN(operator)
+
+        new_expr_node_l = ExpressionDMN(text(ctx_l), [ctx_l])
+        new_expr_node_r = ExpressionDMN(text(ctx_r), [ctx_r])
+
+        new_op_node.children.append(new_expr_node_l)
+        new_op_node.children.append(new_expr_node_r)
+
+        self.node.children.append(new_op_node)
+        return id(new_op_node)
+
+    def add_unary_children(self, text: str, ctxs: List[ParserRuleContext], operator: int = None,
+                           span: Tuple[int, int] = None):
+        """
+        Генерирует имя для DMNTreeNode, создает нового ребенка у node,
+        в выражении родителя заменяет выражение ребенка на dmn id вида dmn_{int}
+        :param ctxs:
+        :param text:
+        :param operator:
+        :param span: tokens of child expression, by default tokens of ctxs
+        :return:
+        """
+        # self.node
+        #    |
+        #    |
+        # operator
+        #    |
+        #    |
+        # expression
+        if operator is not None:
+            new_op_node = OperatorDMN(operator)
+            new_expr_node = ExpressionDMN(text, ctxs, span)
+            new_op_node.children.append(new_expr_node)
+            self.node.children.append(new_op_node)
+            return id(new_op_node)
+        else:
+            new_node = ExpressionDMN(text, ctxs, span)
+            self.node.children.append(new_node)
+            return id(new_node)
+
+    def visitTernary(self, ctx: JavaELParser.TernaryContext):
+        if ctx.getChildCount() > 1:
+            self.processTernary(ctx)
+        else:
+            return self.visitChildren(ctx)
+
+    def visitBase(self, ctx: JavaELParser.BaseContext):
+        if ctx.getChildCount() > 1:
+            self.processUnary(ctx)
+        else:
+            return self.visitChildren(ctx)
+
+    def visitMember(self, ctx: JavaELParser.MemberContext):
+        if ctx.getChildCount() > 1:
+            self.processBinary(ctx)
+        else:
+            return self.visitChildren(ctx)
+
+    def visitAlgebraic(self, ctx: JavaELParser.AlgebraicContext):
+        if ctx.getChildCount() > 1:
+            self.processBinary(ctx)
+        else:
+            return self.visitChildren(ctx)
+
+    def visitEquality(self, ctx: JavaELParser.EqualityContext):
+        if ctx.getChildCount() > 1:
+            self.processBinary(ctx)
+        else:
+            return self.visitChildren(ctx)
+
+    def visitRelation(self, ctx: JavaELParser.RelationContext):
+        if ctx.getChildCount() > 1:
+            # пропустить скобки
+            if not (isinstance(ctx.getChild(0), TerminalNode) and ctx.getChild(0).symbol.type == JavaELParser.OpenParen) and not (isinstance(ctx.getChild(2), TerminalNode) and ctx.getChild(2).token.type != JavaELParser.CloseParen):
+                self.processBinary(ctx)
+            else:
+                return self.visitChildren(ctx)
+        else:
+            return self.visitChildren(ctx)
+
+    def processUnary(self, ctx: ParserRuleContext):
+        """
+        Add DMNNode represents unary operator, operator and operand are replaced by its dmn id
+        :param ctx:
+        :return:
+        """
+        children_count = ctx.getChildCount()
+        for i in range(children_count):
+
+            # pass operated
+            if not self.state.isVisited(ctx.getChild(i)):
+                maybe_operator = ctx.getChild(i)
+                maybe_operand = ctx.getChild(i + 1)
+                self.state.markVisited(maybe_operator)
+                operator_index = maybe_operator.symbol.tokenIndex
+
+                # case with chain unary operators
+                if isinstance(maybe_operand, TerminalNode):
+                    # ребенок - остаток цепочки, его операторы разберет DMNTreeBuilder ребенка
+                    span = (operator_index + 1, ctx.stop.tokenIndex)
+                    new_child_text = sourceOf(ctx).text(*span)
+                    new_child_id = 'dmn' + str(self.add_unary_children(new_child_text, [ctx],
+                                                                          operatorType(maybe_operator), span))
+
+                    # все следующие пометить как принадлежащие node
+                    for j in range(i + 1, children_count):
+                        self.state.addColor(ctx.getChild(j), new_child_id)
+                else:
+                    self.state.markVisited(maybe_operand)
+                    new_child_id = 'dmn' + str(self.add_unary_children(text(maybe_operand), [maybe_operand],
+                                                                      operatorType(maybe_operator)))
+                    # пометить операнд как принадлежащий node
+                    self.state.addColor(maybe_operand, new_child_id)
+
+                # редактируем свое выражение
+                self.replaceSpan(operator_index, ctx.stop.tokenIndex, new_child_id)
+                break
+
+    def processTernary(self, ctx: JavaELParser.TernaryContext):
+        """
+        Add DMNNode represents ternary condition if condition has logical operators.
+        A ? B : C lowered to (!A and C) or (A and B), so condition is shared by dmn id, not copied
+        :param ctx:
+        :return:
+        """
+        condition = ctx.getChild(0)
+        if not self.extractCondition(condition):
+            self.visit(condition)
+
+        self.visit(ctx.getChild(2))
+        self.visit(ctx.getChild(4))
+
+    def extractCondition(self, condition: ParserRuleContext) -> bool:
+        """
+        Condition with logical operators becomes child node without operator
+        :param condition: first child of ternary
+        :return: condition is extracted
+        """
+        if not hasLogicalOperator(condition):
+            return False
+        new_child_id = 'dmn' + str(self.add_unary_children(text(condition), [condition]))
+
+        # редактируем свое выражение
+        self.replaceSpan(*tokenSpan(condition), new_child_id)
+        self.state.addColor(condition, new_child_id)
+        return True
+
+    def processBinary(self, ctx: ParserRuleContext) -> bool:
+        """
+        Add DMNNode if at least one operand not simple
+        :param ctx:
+        :return: operator is extracted
+        """
+        children_count = ctx.getChildCount()
+        if children_count > 1:
+            if not isCtxSimple(ctx.getChild(0)) or not isCtxSimple(ctx.getChild(2)):
+                new_child_id = 'dmn' + str(
+                    self.add_binary_children(ctx.getChild(0), ctx.getChild(2), operatorType(ctx.getChild(1))))
+                self.replaceSpan(*tokenSpan(ctx), new_child_id)
+                self.state.addColor(ctx, new_child_id)
+                return True
+                # if not isinstance(ctx.getChild(0), TerminalNode):
+                #     if not isCtxSimple(ctx.getChild(0)):
+                #         self.add_unary_children(ctx.getChild(0), ctx.getChild(1))
+                #         self.state.addColor(ctx.getChild(0), 'dmn_id' + str(id(self.node)))
+                # if not isinstance(ctx.getChild(2), TerminalNode):
+                #     if not isCtxSimple(ctx.getChild(2)):
+                #         self.add_unary_children(ctx.getChild(2), ctx.getChild(1))
+                #         self.state.addColor(ctx.getChild(2), 'dmn_id' + str(id(self.node)))
+        return False
+
+
+class SimpleOperandMarker(PassVisitor):
+    """
+    Find and mark logical operands without other logical operators
+    """
+
+    def _unmarkSimpleAncestor(self, ctx: ParserRuleContext):
+        # убрать простоту у ближайшего помеченного предка
+        ancestor = self.state.simpleAncestor(ctx)
+        if ancestor >= 0:
+            self.state.simple[ancestor] = 0
+
+    def _mark_simple(self, ctx: ParserRuleContext, operator: int):
+        children = list(ctx.getChildren())
+        children_cnt = len(children)
+
+        if isinstance(ctx, (JavaELParser.ExpressionContext, JavaELParser.TermContext)):
+            for i in range(children_cnt):
+                if isinstance(children[i], TerminalNode) and children[i].symbol.type == operator:
+                    # убрать is_simple_operand у прямых родителей
+                    if i - 1 >= 0:
+                        self._unmarkSimpleAncestor(children[i - 1])
+                        self.state.setSimple(children[i - 1])
+
+                    if i + 1 < children_cnt:
+                        self._unmarkSimpleAncestor(children[i + 1])
+                        self.state.setSimple(children[i + 1])
+        elif isinstance(ctx, JavaELParser.BaseContext):
+            for i in range(children_cnt):
+                if not (isinstance(children[i], TerminalNode) and children[i].symbol.type in [JavaELParser.Not,
+                                                                                             JavaELParser.Empty,
+                                                                                             JavaELParser.Minus]):
+                    # operand branch
+                    self._unmarkSimpleAncestor(children[i])
+                    self.state.setSimple(children[i])
+                    return
+
+    def _markIfColored(self, ctx) -> bool:
+        # если нода помечена как dmn, то она простая
+        if self.state.color(ctx) is not None:
+            self.state.setSimple(ctx)
+            return True
+        return False
+
+    def visitTerm(self, ctx: JavaELParser.TermContext):
+        if self._markIfColored(ctx):
+            return
+        self._mark_simple(ctx, JavaELParser.And)
+        return self.visitChildren(ctx)
+
+    def visitExpression(self, ctx: JavaELParser.ExpressionContext):
+        if self._markIfColored(ctx):
+            return
+        self._mark_simple(ctx, JavaELParser.Or)
+        return self.visitChildren(ctx)
+
+    def visitBase(self, ctx: JavaELParser.BaseContext):
+        if self._markIfColored(ctx):
+            return
+        self._mark_simple(ctx, JavaELParser.Not)
+        return self.visitChildren(ctx)
+
+    def visitTernary(self, ctx:JavaELParser.TernaryContext):
+        if self._markIfColored(ctx):
+            return
+        return self.visitChildren(ctx)
+
+    def visitEquality(self, ctx:JavaELParser.EqualityContext):
+        if self._markIfColored(ctx):
+            return
+        return self.visitChildren(ctx)
+
+    def visitRelation(self, ctx:JavaELParser.RelationContext):
+        if self._markIfColored(ctx):
+            return
+        return self.visitChildren(ctx)
+
+    def visitAlgebraic(self, ctx:JavaELParser.AlgebraicContext):
+        if self._markIfColored(ctx):
+            return
+        return self.visitChildren(ctx)
+
+    def visitMember(self, ctx:JavaELParser.MemberContext):
+        if self._markIfColored(ctx):
+            return
+        return self.visitChildren(ctx)
+
+    def visitTerminal(self, node):
+        self._markIfColored(node)
+
+
+class FormulaZipper(PassVisitor):
+    def __init__(self, state: PassState = None):
+        """
+        :param state: state marked by SimpleOperandMarker
+        """
+        super(FormulaZipper, self).__init__(state)
+        self._zipped = []
+
+    @property
+    def result(self):
+        to_ret = ''.join([token for token in self._zipped if token is not None]).replace(' . ', '.')
+        to_ret = re.sub(r'\s+', ' ', to_ret)
+        return to_ret
+
+    def visitTernary(self, ctx: JavaELParser.TernaryContext):
+        """
+        A ? B : C ==
+        (A -> B) and (!A -> C) == (!A or B) and (A or C) ==
+        (!A and A) or (!A and С) or (B and A) or (B and С) ==
+        (!A and С) or (A and B) or (B and С)
+        A переводится один раз и копируется, сложное A уже вынесено в отдельный DMN (DMNTreeBuilder.processTernary)
+        :param ctx:
+        :return:
+        """
+        if ctx.getChildCount() > 1:  # ternary expression here
+            ctx_children = list(ctx.getChildren())
+            condition_expression = ctx_children[0]
+            true_ternary = ctx_children[2]
+            false_ternary = ctx_children[4]
+
+            condition_start = len(self._zipped)
+            self.visit(condition_expression)
+            condition_zipped = self._zipped[condition_start:]
+            del self._zipped[condition_start:]
+
+            # (not (A) and C)
+            self._zipped.append('(! (')
+            self._zipped.extend(condition_zipped)
+            self._zipped.append(') and ')
+            self._zipped.append(self.visit(false_ternary))
+            self._zipped.append(')')
+            # or
+            self._zipped.append(' or ')
+            # (A and B)
+            self._zipped.append('(')
+            self._zipped.extend(condition_zipped)
+            self._zipped.append(' and ')
+            self._zipped.append(self.visit(true_ternary))
+            self._zipped.append(')')
+        else:
+            return self.visitChildren(ctx)
+
+    def visitExpression(self, ctx: JavaELParser.ExpressionContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitTerm(self, ctx: JavaELParser.TermContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitEquality(self, ctx: JavaELParser.EqualityContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitRelation(self, ctx: JavaELParser.RelationContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitAlgebraic(self, ctx: JavaELParser.AlgebraicContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitMember(self, ctx: JavaELParser.MemberContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitBase(self, ctx: JavaELParser.BaseContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitValue(self, ctx: JavaELParser.ValueContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitPrimitive(self, ctx: JavaELParser.PrimitiveContext):
+        return self.addIdIfSimple(ctx)
+
+    def visitTerminal(self, node):
+        self._zipped.append(node.getText() + ' ')
+
+    def addIdIfSimple(self, ctx: ParserRuleContext):
+        if self.state.isSimple(ctx):
+            self._zipped.append('op_' + str(id(ctx)) + ' ')
+        else:
+            return self.visitChildren(ctx)
+
+
+def findDependencies(root: ExpressionDMN, state: PassState):
+    """
+    Find dependent sub DMN expressions and replace to id
+    example: field.first eq field.second and not (field.third or true) ->
+          -> field.first eq field.second and dmn_1
+    :param root: root of DMN tree
+    :param state: marks of parse tree shared by builders of all nodes
+    :return:
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        # только один контекст не терминальный
+        if isinstance(node, ExpressionDMN):
+            builder = DMNTreeBuilder(node, state)
+            for c in node.contexts:
+                if not isinstance(c, TerminalNode):
+                    builder.visit(c)
+            builder.applyEdits()
+        stack.extend(reversed(node.children))
+
+
+_accepts = [0]
+
+
+def _countAccepts():
+    # считаем диспетчеризацию visitor через accept, так ходят DMNTreeBuilder, SimpleOperandMarker, FormulaZipper
+    classes = [c for c in vars(JavaELParser).values() if isinstance(c, type) and 'accept' in vars(c)]
+    for cls in classes + [TerminalNodeImpl]:
+        accept = cls.accept
+
+        def counted(self, visitor, accept=accept):
+            _accepts[0] += 1
+            return accept(self, visitor)
+        cls.accept = counted
+
+
+def _treeSize(ctx) -> int:
+    size, stack = 0, [ctx]
+    while stack:
+        node = stack.pop()
+        size += 1
+        if not isinstance(node, TerminalNode):
+            stack.extend(node.getChildren())
+    return size
+
+
+def referencePasses(expression: str) -> int:
+    """
+    DMNTreeBuilder on the parse tree, then for every node its expression is parsed again,
+    marked by SimpleOperandMarker and zipped by FormulaZipper
+    :return: nodes of parse trees built again
+    """
+    ctx = tree(expression)
+    root = ExpressionDMN(text(ctx), [ctx])
+    findDependencies(root, PassState(ctx))
+    reparsed = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        stack.extend(node.children)
+        if isinstance(node, ExpressionDMN):
+            node_tree = tree(node.expression)
+            reparsed += _treeSize(node_tree)
+            state = PassState(node_tree)
+            SimpleOperandMarker(state).visit(node_tree)
+            FormulaZipper(state).visit(node_tree)
+    return reparsed
+
+
+def fusedPass(expression: str) -> int:
+    """
+    DMNTree construction: FormulaAnalyzer extracts and zips every node in one traversal of ParseArena
+    :return: arena node visits
+    """
+    arena = ParseArena(tree(expression))
+    analyzer = FormulaAnalyzer(arena)
+    stack = [ExpressionDMN(arena.text(0), [0], arena.span(0))]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ExpressionDMN):
+            node.zipped = analyzer.analyze(node)
+        stack.extend(node.children)
+    return analyzer.visits
+
+
+@click.command()
+@click.option('--count', default=600, type=int, help='expressions in batch')
+def main(count):
+    """
+    Parse tree node visits of DMN tree construction and zipping: separate passes against FormulaAnalyzer
+    """
+    logger.remove()
+    expressions = [EXPRESSIONS[i % len(EXPRESSIONS)].format(i=i) for i in range(count)]
+
+    started = time.perf_counter()
+    for e in expressions:
+        referencePasses(e)
+    reference_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for e in expressions:
+        fusedPass(e)
+    fused_time = time.perf_counter() - started
+
+    _countAccepts()
+    _accepts[0] = 0
+    reparsed = sum(referencePasses(e) for e in expressions)
+    reference_visits = _accepts[0]
+    _accepts[0] = 0
+    fused_visits = sum(fusedPass(e) for e in expressions) + _accepts[0]
+
+    sys.stdout.write(f'expressions: {count}\n'
+                     f'separate passes: {reference_visits / count:.1f} visits and {reparsed / count:.1f} parsed again '
+                     f'nodes per expression, {reference_time:.2f} s\n'
+                     f'fused pass: {fused_visits / count:.1f} visits per expression, {fused_time:.2f} s\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,18 @@
 def check_brackets(string, pairs = {'[': ']', '{': '}', '(': ')'}):
 
-    opening = list(pairs.keys())
-
-    closing = list(pairs.values())
+    closing = {close: open for open, close in pairs.items()}
 
     match = list()
 
+    # вершина стека в конце списка: append и pop за O(1)
     for s in string:
-        if s in opening:
-            match.insert(0, s)
+        if s in pairs:
+            match.append(s)
         elif s in closing:
-            if len(match) == 0:
-                return False
-            if match[0] == opening[closing.index(s)]:
-                match.pop(0)
-            else:
+            if len(match) == 0 or match.pop() != closing[s]:
                 return False
 
-    if len(match) == 0:
-        return True
-
-    return False
+    return len(match) == 0
 
 if __name__ == "__main__":
     import time
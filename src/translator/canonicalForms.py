@@ -0,0 +1,281 @@
+import hashlib
+import re
+import sys
+from collections import namedtuple
+from typing import Iterable, List, Set, Tuple, Optional
+
+import click
+from loguru import logger
+from pyeda.boolalg import expr
+
+from src.translator.expressionValidator import InvalidExpression, checkExpression
+from src.translator.toKNF import parseFormula, inputDomains, _prepareForPyeda, _postorder
+from src.translator.treeFormula import tree, DMNTree, ExpressionZipped, equalityDomains, ANTLR_PARSER
+
+# терминальные вершины BDD
+FALSE = 0
+TRUE = 1
+
+_operand_re = re.compile(r'op_(\d+)')
+
+EquivalenceClass = namedtuple('EquivalenceClass', ('key', 'members'))
+
+
+class CanonicalForms:
+    """
+    Reduced ordered BDD of zipped formulas with one unique table for the whole catalog.
+    Variables are texts of atomic operands ordered as strings, so equivalent formulas of different
+    expressions are the same BDD node and have the same key in every build
+    """
+    def __init__(self):
+        # вершина: (текст переменной, низкий потомок, высокий потомок), потомки создаются раньше родителя
+        self.nodes = [(None, FALSE, FALSE), (None, TRUE, TRUE)]
+        self.unique = {}
+        self.computed = {}
+        self.digests = {FALSE: '0', TRUE: '1'}
+        # ключ класса -> выражения класса и готовый перевод FEEL
+        self.members = {}
+        self.translations = {}
+
+    def node(self, text: str, low: int, high: int) -> int:
+        if low == high:
+            return low
+        triple = (text, low, high)
+        node = self.unique.get(triple)
+        if node is None:
+            node = len(self.nodes)
+            self.nodes.append(triple)
+            self.unique[triple] = node
+        return node
+
+    def variable(self, text: str) -> int:
+        return self.node(text, FALSE, TRUE)
+
+    def negate(self, f: int) -> int:
+        if f <= TRUE:
+            return TRUE - f
+        cached = self.computed.get(('not', f))
+        if cached is None:
+            text, low, high = self.nodes[f]
+            cached = self.node(text, self.negate(low), self.negate(high))
+            self.computed[('not', f)] = cached
+        return cached
+
+    def conjoin(self, f: int, g: int) -> int:
+        return self._apply(True, f, g)
+
+    def disjoin(self, f: int, g: int) -> int:
+        return self._apply(False, f, g)
+
+    def _apply(self, is_and: bool, f: int, g: int) -> int:
+        # глубина рекурсии не больше числа переменных формулы
+        absorbing, neutral = (FALSE, TRUE) if is_and else (TRUE, FALSE)
+        if f == absorbing or g == absorbing:
+            return absorbing
+        if f == neutral or f == g:
+            return g
+        if g == neutral:
+            return f
+        if f > g:
+            f, g = g, f
+        cached = self.computed.get((is_and, f, g))
+        if cached is None:
+            f_text, f_low, f_high = self.nodes[f]
+            g_text, g_low, g_high = self.nodes[g]
+            text = min(f_text, g_text)
+            if f_text != text:
+                f_low = f_high = f
+            if g_text != text:
+                g_low = g_high = g
+            cached = self.node(text, self._apply(is_and, f_low, g_low), self._apply(is_and, f_high, g_high))
+            self.computed[(is_and, f, g)] = cached
+        return cached
+
+    def formula(self, zipped: ExpressionZipped) -> int:
+        """
+        BDD of zipped formula. Operands input eq literal of one input exclude each other,
+        so formulas equal for every value of input get one node
+        :param zipped: result of zipFormula or FormulaAnalyzer
+        :return: BDD node
+        """
+        domains = equalityDomains(zipped)
+        texts = {}
+        for variable, (input_name, literal) in domains.items():
+            texts[variable] = input_name + ' eq ' + literal
+
+        def atom(name: str) -> int:
+            if name not in texts:
+                texts[name] = _operand_re.sub(lambda m: zipped.operands.get(m.group(1), m.group()),
+                                              name).replace("'", '"')
+            return self.variable(texts[name])
+
+        values = []
+        for x, count in _postorder(parseFormula(_prepareForPyeda(zipped.expression)).to_nnf()):
+            if count:
+                operands = values[len(values) - count:]
+                del values[len(values) - count:]
+                value = operands[0]
+                for operand in operands[1:]:
+                    value = self._apply(isinstance(x, expr.AndOp), value, operand)
+            elif isinstance(x, expr.Complement):
+                value = self.negate(atom(str(~x)))
+            elif isinstance(x, expr.Variable):
+                value = atom(str(x))
+            else:
+                value = TRUE if x is expr.One else FALSE
+            values.append(value)
+
+        # ограничение только по переменным, от которых функция зависит: a eq 1 or a eq 1 and a eq 2 -> a eq 1
+        result = values[0]
+        support = self.support(result)
+        for literals in inputDomains(domains).values():
+            variables = [self.variable(texts[v]) for v in literals.values() if texts[v] in support]
+            for i, first in enumerate(variables):
+                for second in variables[i + 1:]:
+                    result = self.conjoin(result, self.negate(self.conjoin(first, second)))
+        return result
+
+    def support(self, f: int) -> Set[str]:
+        """
+        :param f: BDD node
+        :return: texts of variables of reachable nodes
+        """
+        texts, visited, stack = set(), set(), [f]
+        while stack:
+            node = stack.pop()
+            if node <= TRUE or node in visited:
+                continue
+            visited.add(node)
+            text, low, high = self.nodes[node]
+            texts.add(text)
+            stack.extend((low, high))
+        return texts
+
+    def digest(self, f: int) -> str:
+        """
+        Hash of BDD structure, the same for the same function in every process
+        :param f: BDD node
+        :return: hex digest
+        """
+        stack = [f]
+        while stack:
+            node = stack[-1]
+            if node in self.digests:
+                stack.pop()
+                continue
+            text, low, high = self.nodes[node]
+            if low in self.digests and high in self.digests:
+                stack.pop()
+                self.digests[node] = hashlib.sha1(
+                    f'{text}\n{self.digests[low]}\n{self.digests[high]}'.encode('utf-8')).hexdigest()
+            else:
+                stack.extend((low, high))
+        return self.digests[f]
+
+    def key(self, zipped: ExpressionZipped) -> Optional[str]:
+        """
+        :param zipped: zipped formula
+        :return: key of equivalence class, None if formula is not boolean
+        """
+        try:
+            return self.digest(self.formula(zipped))
+        except Exception as e:
+            logger.debug(f'no canonical form of {zipped.expression}: {type(e).__name__}: {e}')
+            return None
+
+    def isConstant(self, key: str) -> bool:
+        return key in (self.digests[FALSE], self.digests[TRUE])
+
+    def translation(self, key: str, dnf_budget: int) -> Optional[str]:
+        return self.translations.get((key, dnf_budget))
+
+    def remember(self, key: str, dnf_budget: int, expression: str):
+        """
+        Save FEEL translation of class. Constant formulas have no own inputs,
+        translation of other formula of class would use its inputs, so it is not shared
+        :param key: key of equivalence class
+        :param dnf_budget: budget of translation
+        :param expression: FEEL expression
+        :return:
+        """
+        if not self.isConstant(key):
+            self.translations[(key, dnf_budget)] = expression
+
+    def add(self, key: str, member: str):
+        members = self.members.setdefault(key, [])
+        if member not in members:
+            members.append(member)
+
+    def classes(self) -> List[EquivalenceClass]:
+        """
+        Classes with more than one expression, the biggest first
+        :return:
+        """
+        classes = [EquivalenceClass(key, members) for key, members in self.members.items() if len(members) > 1]
+        return sorted(classes, key=lambda c: -len(c.members))
+
+
+def expressionKey(expression: str, forms: CanonicalForms, parser: str = ANTLR_PARSER) -> Optional[str]:
+    """
+    Key of expression translated as one decision: logical operators over simple operands only
+    :param expression: JavaEL expression
+    :param forms: catalog of canonical forms
+    :param parser: JavaEL parser
+    :return: key of equivalence class or None
+    :raises InvalidExpression: pre-validation or parser found syntax errors
+    """
+    checkExpression(expression)
+    errors = []
+    el_tree = tree(expression, errors, parser)
+    if errors:
+        raise InvalidExpression(expression, errors)
+    root = DMNTree(el_tree).root
+    if root.children:
+        return None
+    key = forms.key(root.zipped)
+    if key is not None:
+        forms.add(key, expression)
+    return key
+
+
+def equivalenceClasses(expressions: Iterable[str], parser: str = ANTLR_PARSER) -> Tuple[List[EquivalenceClass], int]:
+    """
+    :param expressions: JavaEL expressions of catalog
+    :param parser: JavaEL parser
+    :return: classes with more than one expression, count of expressions with canonical form
+    """
+    forms = CanonicalForms()
+    keyed = 0
+    for expression in expressions:
+        try:
+            keyed += expressionKey(expression, forms, parser) is not None
+        except Exception as e:
+            logger.warning(f'{expression}: {type(e).__name__}: {e}')
+    return forms.classes(), keyed
+
+
+@click.command()
+@click.argument('path')
+def main(path):
+    """
+    Report equivalent expressions of file, one JavaEL expression per line
+    """
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, level='INFO', format='{level} {message}')
+
+    with open(path) as corpus:
+        expressions = list(dict.fromkeys(line.strip() for line in corpus if line.strip()))
+
+    classes, keyed = equivalenceClasses(expressions)
+    for equivalence_class in classes:
+        logger.info(f'{equivalence_class.key[:12]}: {len(equivalence_class.members)} expressions')
+        for member in equivalence_class.members:
+            logger.info(f'    {member}')
+
+    duplicates = sum(len(c.members) - 1 for c in classes)
+    logger.info(f'expressions {len(expressions)}, with canonical form {keyed}, classes {len(classes)}, '
+                f'duplicates {duplicates}')
+
+
+if __name__ == '__main__':
+    main()
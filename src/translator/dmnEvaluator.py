@@ -0,0 +1,459 @@
+import re
+from collections import namedtuple
+from typing import Dict, List, Sequence, Callable, Optional
+
+import numpy as np
+from lxml import etree
+from loguru import logger
+
+logger = logger.opt(colors=True)
+
+# значение ячейки "любое"
+ANY_TESTS = ('', '-')
+COMPARISON_RE = re.compile(r'^(!=|<=|>=|=|<|>)\s*(.+)$')
+NOT_RE = re.compile(r'^not\s*\((.*)\)$', re.DOTALL)
+NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+# fields [ "x" ] . y -> ('fields', '"x"', 'y')
+PATH_TOKEN_RE = re.compile(r'\[\s*("[^"]*"|\'[^\']*\'|\d+)\s*\]|([^\s.\[\]]+)')
+
+CompiledRule = namedtuple('CompiledRule', ('inputEntries', 'outputEntry'))
+CompiledDecision = namedtuple('CompiledDecision', ('id', 'name', 'inputs', 'output', 'rules', 'hitPolicy', 'required'))
+
+
+def _local(element: etree.Element) -> str:
+    # после записи в файл теги получают namespace DMN
+    if not isinstance(element.tag, str):
+        return ''
+    return etree.QName(element).localname
+
+
+def _child(element: etree.Element, name: str) -> Optional[etree.Element]:
+    for c in element:
+        if _local(c) == name:
+            return c
+    return None
+
+
+def _children(element: etree.Element, name: str) -> List[etree.Element]:
+    return [c for c in element if _local(c) == name]
+
+
+def _text(element: etree.Element) -> str:
+    text = _child(element, 'text') if element is not None else None
+    if text is None or text.text is None:
+        return ''
+    return text.text.strip()
+
+
+def parseLiteral(text: str):
+    """
+    FEEL literal -> python value
+    "a" -> 'a', 12 -> 12, true -> True, null -> None
+    :param text:
+    :return:
+    """
+    text = text.strip()
+    if len(text) > 1 and text[0] == text[-1] and text[0] in '"\'':
+        return text[1:-1]
+    if text == 'true':
+        return True
+    if text == 'false':
+        return False
+    if text == 'null':
+        return None
+    if NUMBER_RE.match(text):
+        return float(text) if '.' in text else int(text)
+    raise ValueError(f'Not a FEEL literal: {text}')
+
+
+def splitUnaryTests(text: str) -> List[str]:
+    """
+    "a","b" -> ['"a"', '"b"'], commas in strings and brackets are skipped
+    :param text: FEEL unary tests
+    :return:
+    """
+    tests = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, symbol in enumerate(text):
+        if quote:
+            if symbol == quote:
+                quote = None
+        elif symbol in '"\'':
+            quote = symbol
+        elif symbol in '([':
+            depth += 1
+        elif symbol in ')]':
+            depth -= 1
+        elif symbol == ',' and depth == 0:
+            tests.append(text[start:i].strip())
+            start = i + 1
+    tests.append(text[start:].strip())
+    return tests
+
+
+def pathTokens(expression: str) -> List:
+    """
+    fields [ "x" ] . y -> ['fields', 'x', 'y']
+    :param expression: FEEL path of input
+    :return:
+    """
+    tokens = []
+    for bracketed, name in PATH_TOKEN_RE.findall(expression):
+        tokens.append(parseLiteral(bracketed) if bracketed else name)
+    return tokens
+
+
+def resolvePath(record, tokens: List):
+    value = record
+    for token in tokens:
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get(token)
+        elif isinstance(value, (list, tuple)) and isinstance(token, int):
+            value = value[token] if token < len(value) else None
+        else:
+            value = getattr(value, str(token), None)
+    return value
+
+
+def columnsFromRecords(records: Sequence[dict], input_expressions: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    Row records -> columns of input expressions, resolved as paths
+    {'fields': {'x': 'a'}} and 'fields.x' -> {'fields.x': ['a']}
+    :param records: form states
+    :param input_expressions: FEEL inputs of tables
+    :return: {input expression: column}
+    """
+    columns = {}
+    for expression in input_expressions:
+        if expression in columns:
+            continue
+        tokens = pathTokens(expression)
+        column = np.empty(len(records), dtype=object)
+        for i, record in enumerate(records):
+            # готовое значение по тексту выражения, например результат вызова метода
+            if expression in record:
+                column[i] = record[expression]
+            else:
+                column[i] = resolvePath(record, tokens)
+        columns[expression] = column
+    return columns
+
+
+class _Batch:
+    """
+    Per-batch state: columns, memoized test masks and decision outputs
+    """
+    def __init__(self, columns: Dict[str, np.ndarray], size: int):
+        self.columns = columns
+        self.size = size
+        self.masks = {}
+        self.outputs = {}
+        self._numeric = {}
+        self._booleans = {}
+
+    def numeric(self, key: str, column: np.ndarray) -> np.ndarray:
+        if key not in self._numeric:
+            converted = np.full(len(column), np.nan)
+            for i, value in enumerate(column):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    converted[i] = value
+                elif isinstance(value, str) and NUMBER_RE.match(value):
+                    converted[i] = float(value)
+            self._numeric[key] = converted
+        return self._numeric[key]
+
+    def booleans(self, key: str, column: np.ndarray) -> np.ndarray:
+        if key not in self._booleans:
+            self._booleans[key] = np.fromiter((isinstance(v, bool) for v in column), dtype=bool, count=len(column))
+        return self._booleans[key]
+
+
+class DMNEvaluator:
+    """
+    Local evaluator of DRD built by DMN_XML.
+    Input entries are compiled to column-wise matchers, a batch of records is evaluated at once.
+    FIRST gives output of the first matched rule, UNIQUE fails if rules overlap on a record,
+    ANY fails if overlapping rules have different outputs
+    """
+    SUPPORTED_HIT_POLICIES = ('UNIQUE', 'FIRST', 'ANY')
+
+    def __init__(self, definitions: etree.Element):
+        self.decisions = {}
+        self._by_reference = {}
+        # одинаковые тесты компилируются один раз и вычисляются один раз на колонку
+        self._tests = {}
+
+        for decision in definitions:
+            if _local(decision) != 'decision':
+                continue
+            compiled = self._compileDecision(decision)
+            self.decisions[compiled.id] = compiled
+            self._by_reference[compiled.id] = compiled
+            self._by_reference[compiled.name] = compiled
+
+        if not self.decisions:
+            raise ValueError('DRD has no decisions')
+
+        # DMN_XML добавляет решения обходом на возврате, корень последний
+        self.root = list(self.decisions.values())[-1].id
+
+    @classmethod
+    def from_file(cls, xml_path: str) -> 'DMNEvaluator':
+        return cls(etree.parse(xml_path).getroot())
+
+    def _compileDecision(self, decision: etree.Element) -> CompiledDecision:
+        table = _child(decision, 'decisionTable')
+        if table is None:
+            raise ValueError(f"Decision {decision.get('id')} has no decisionTable")
+
+        hit_policy = table.get('hitPolicy', 'UNIQUE')
+        if hit_policy not in self.SUPPORTED_HIT_POLICIES:
+            raise ValueError(f'Hit policy {hit_policy} is not supported')
+
+        required = []
+        for requirement in _children(decision, 'informationRequirement'):
+            for link in requirement:
+                if _local(link) in ('requiredInput', 'requiredDecision'):
+                    required.append(link.get('href', '').lstrip('#'))
+
+        inputs = [_text(_child(i, 'inputExpression')) for i in _children(table, 'input')]
+        output = _child(table, 'output')
+        output_name = output.get('name') if output is not None else decision.get('name')
+
+        rules = []
+        for rule in _children(table, 'rule'):
+            entries = [_text(e) for e in _children(rule, 'inputEntry')]
+            if len(entries) != len(inputs):
+                raise ValueError(f"Rule {rule.get('id')} has {len(entries)} input entries, expected {len(inputs)}")
+            rules.append(CompiledRule(
+                inputEntries=[self._compiledTest(e) for e in entries],
+                outputEntry=self._outputValue(_text(_child(rule, 'outputEntry')))
+            ))
+
+        return CompiledDecision(
+            id=decision.get('id'),
+            name=decision.get('name'),
+            inputs=inputs,
+            output=output_name,
+            rules=rules,
+            hitPolicy=hit_policy,
+            required=required
+        )
+
+    def _compiledTest(self, text: str) -> Optional[Callable]:
+        if text not in self._tests:
+            self._tests[text] = self.compileUnaryTests(text)
+        return self._tests[text]
+
+    @staticmethod
+    def _outputValue(text: str):
+        try:
+            return parseLiteral(text)
+        except ValueError:
+            return text
+
+    @classmethod
+    def compileUnaryTests(cls, text: str) -> Optional[Callable]:
+        """
+        FEEL unary tests -> matcher(batch, key, column) -> bool mask, None matches everything
+        :param text: input entry text
+        :return:
+        """
+        text = text.strip()
+        if text in ANY_TESTS:
+            return None
+
+        tests = splitUnaryTests(text)
+        if len(tests) > 1:
+            matchers = [cls.compileUnaryTests(t) for t in tests]
+            if any(m is None for m in matchers):
+                return None
+
+            def any_matcher(batch, key, column):
+                mask = np.zeros(batch.size, dtype=bool)
+                for m in matchers:
+                    mask |= m(batch, key, column)
+                return mask
+            return any_matcher
+
+        negated = NOT_RE.match(text)
+        if negated:
+            inner = cls.compileUnaryTests(negated.group(1))
+            if inner is None:
+                return lambda batch, key, column: np.zeros(batch.size, dtype=bool)
+            return lambda batch, key, column: ~inner(batch, key, column)
+
+        comparison = COMPARISON_RE.match(text)
+        operator, literal_text = comparison.groups() if comparison else ('=', text)
+
+        try:
+            literal = parseLiteral(literal_text)
+        except ValueError:
+            # не литерал: вычисленное значение по тексту теста, например fields.x.call()
+            return lambda batch, key, column: cls._truthy(batch, text)
+
+        if operator in ('=', '!='):
+            def equal_matcher(batch, key, column):
+                if literal is None:
+                    mask = np.equal(column, None)
+                else:
+                    mask = np.asarray(column == literal, dtype=bool)
+                    # true == 1 в python, для FEEL это разные типы
+                    booleans = batch.booleans(key, column)
+                    mask &= booleans if isinstance(literal, bool) else ~booleans
+                return mask if operator == '=' else ~mask
+            return equal_matcher
+
+        if not isinstance(literal, (int, float)) or isinstance(literal, bool):
+            raise ValueError(f'Comparison {text} needs number literal')
+
+        compare = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}[operator]
+
+        def compare_matcher(batch, key, column):
+            with np.errstate(invalid='ignore'):
+                return compare(batch.numeric(key, column), literal)
+        return compare_matcher
+
+    @staticmethod
+    def _truthy(batch: _Batch, expression: str) -> np.ndarray:
+        column = batch.columns.get(expression)
+        if column is None:
+            raise ValueError(f'No column for {expression}')
+        return np.fromiter((v is True for v in column), dtype=bool, count=batch.size)
+
+    def inputExpressions(self) -> List[str]:
+        """
+        Inputs which are not other decisions: they must be given as columns
+        :return:
+        """
+        expressions = []
+        for decision in self.decisions.values():
+            for expression in decision.inputs:
+                if expression not in self._by_reference and expression not in expressions:
+                    expressions.append(expression)
+        return expressions
+
+    def evaluate(self, columns: Dict[str, Sequence], decision: str = None, size: int = None) -> np.ndarray:
+        """
+        Evaluate decision for batch of records given by columns
+        :param columns: {input expression: values}
+        :param decision: decision id or name, root by default
+        :param size: records count, required when decision has no inputs
+        :return: column of decision outputs, None where no rule matched
+        """
+        return self._evaluate(self._decision(decision or self.root), self._batch(columns, size))
+
+    def ruleMasks(self, columns: Dict[str, Sequence]) -> Dict[str, List[List[Optional[np.ndarray]]]]:
+        """
+        Result of every input entry of every decision for batch of records given by columns
+        :param columns: {input expression: values}
+        :return: {decision id: masks of entries of each rule, None for entries matching everything}
+        """
+        batch = self._batch(columns)
+        masks = {}
+        for decision in self.decisions.values():
+            input_columns = self._inputColumns(decision, batch)
+            masks[decision.id] = [
+                [None if matcher is None else self._mask(batch, matcher, key, column)
+                 for matcher, (key, column) in zip(rule.inputEntries, input_columns)]
+                for rule in decision.rules
+            ]
+        return masks
+
+    @staticmethod
+    def _batch(columns: Dict[str, Sequence], size: int = None) -> _Batch:
+        sizes = {len(c) for c in columns.values()} | ({size} if size is not None else set())
+        if len(sizes) > 1:
+            raise ValueError('Columns have different length')
+        size = sizes.pop() if sizes else 0
+        return _Batch({k: np.asarray(v, dtype=object) for k, v in columns.items()}, size)
+
+    @staticmethod
+    def _mask(batch: _Batch, matcher: Callable, key: str, column: np.ndarray) -> np.ndarray:
+        mask_key = (key, id(matcher))
+        if mask_key not in batch.masks:
+            batch.masks[mask_key] = matcher(batch, key, column)
+        return batch.masks[mask_key]
+
+    def evaluateRecords(self, records: Sequence[dict], decision: str = None) -> np.ndarray:
+        """
+        Evaluate decision for list of records like {'fields': {'x': 'a'}}
+        :param records:
+        :param decision: decision id or name, root by default
+        :return: column of decision outputs
+        """
+        return self.evaluate(columnsFromRecords(records, self.inputExpressions()), decision, len(records))
+
+    def _decision(self, reference: str) -> CompiledDecision:
+        if reference not in self._by_reference:
+            raise ValueError(f'Unknown decision {reference}')
+        return self._by_reference[reference]
+
+    def _evaluate(self, decision: CompiledDecision, batch: _Batch) -> np.ndarray:
+        if decision.id in batch.outputs:
+            return batch.outputs[decision.id]
+
+        input_columns = self._inputColumns(decision, batch)
+        result = np.full(batch.size, None, dtype=object)
+        unmatched = np.ones(batch.size, dtype=bool)
+        first = decision.hitPolicy == 'FIRST'
+
+        for rule in decision.rules:
+            # UNIQUE и ANY проверяют все строки: пересечения нарушают hit policy
+            mask = unmatched.copy() if first else np.ones(batch.size, dtype=bool)
+            for matcher, (key, column) in zip(rule.inputEntries, input_columns):
+                if matcher is None:
+                    continue
+                mask &= self._mask(batch, matcher, key, column)
+                if not mask.any():
+                    break
+
+            if not first:
+                self._checkHitPolicy(decision, mask & ~unmatched, result, rule.outputEntry)
+            result[mask] = rule.outputEntry
+            unmatched &= ~mask
+            if first and not unmatched.any():
+                break
+
+        batch.outputs[decision.id] = result
+        return result
+
+    @staticmethod
+    def _checkHitPolicy(decision: CompiledDecision, overlap: np.ndarray, result: np.ndarray, output):
+        """
+        :param decision:
+        :param overlap: records matched by this rule and by rules before it
+        :param result: outputs of rules before it
+        :param output: output of this rule
+        """
+        if not overlap.any():
+            return
+        if decision.hitPolicy == 'UNIQUE':
+            record = int(np.flatnonzero(overlap)[0])
+            raise ValueError(f'Hit policy UNIQUE of decision {decision.id} is violated: '
+                             f'several rules match record {record}')
+        # true == 1 в python, для FEEL это разные значения
+        for record in np.flatnonzero(overlap):
+            if type(result[record]) is not type(output) or result[record] != output:
+                raise ValueError(f'Hit policy ANY of decision {decision.id} is violated: '
+                                 f'rules with different outputs match record {int(record)}')
+
+    def _inputColumns(self, decision: CompiledDecision, batch: _Batch) -> List[tuple]:
+        # зависимые решения вычисляются один раз на батч
+        for reference in decision.required:
+            if reference in self._by_reference:
+                self._evaluate(self._by_reference[reference], batch)
+
+        input_columns = []
+        for expression in decision.inputs:
+            if expression in self._by_reference:
+                input_columns.append((expression, self._evaluate(self._by_reference[expression], batch)))
+            elif expression in batch.columns:
+                input_columns.append((expression, batch.columns[expression]))
+            else:
+                raise ValueError(f'No column for input {expression} of decision {decision.id}')
+        return input_columns
@@ -0,0 +1,446 @@
+import random
+import re
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple, Optional
+
+import click
+from antlr4 import ParserRuleContext, TerminalNode
+from loguru import logger
+from lxml import etree
+
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
+from src.translator.dmnEvaluator import DMNEvaluator, parseLiteral, pathTokens
+from src.translator.javaELEvaluator import compileExpression
+from src.translator.toKNF import toDMNReadyBounded, DNF_SIZE_BUDGET
+from src.translator.translate import translate
+from src.translator.treeFormula import tree, DMNTree, ExpressionDMN, DMN_XML, zipFormula, unpack, concatWithOr, \
+    replaceAux, equalityDomain, equalityDomains
+
+# больше операндов - случайные наборы вместо полной таблицы истинности
+MAX_EXHAUSTIVE_OPERANDS = 24
+SAMPLE_BITS = 4096
+SAMPLE_ROUNDS = 16
+# DRD вычисляется по записям: полная таблица истинности только для малого числа операндов
+MAX_EXHAUSTIVE_RECORDS_OPERANDS = 12
+# значение входа, не равное ни одному литералу выражения
+OTHER_VALUE = '\x00other'
+BARE_OPERAND_RE = re.compile(r'^[A-Za-z_$][\w$]*(\.[A-Za-z_$][\w$]*|\[("[^"]*"|\d+)\])*$')
+EMPTY_OPERAND_RE = re.compile(r'^empty\s+(.+)$')
+
+# в ключе операнда одинаково записываются операторы разного вида
+CANONICAL_OPERATORS = {'==': 'eq', '!=': 'ne', '>': 'gt', '<': 'lt', '>=': 'ge', '<=': 'le', '&&': 'and', '||': 'or'}
+
+PREFIX_OPERATORS = {JavaELParser.Not: '!', JavaELParser.Empty: 'empty', JavaELParser.Minus: '-'}
+
+EquivalenceReport = namedtuple('EquivalenceReport', ('expression', 'operands', 'exhaustive', 'equivalent',
+                                                     'counterexample', 'error'))
+Counterexample = namedtuple('Counterexample', ('node_expression', 'normalized', 'assignment', 'expected', 'actual',
+                                               'record'), defaults=(None,))
+
+
+def operandKey(ctx: ParserRuleContext) -> str:
+    """
+    Key of atomic operand, equal for both sides of translation
+    fields . x == 'a' -> fields.x eq "a"
+    :param ctx:
+    :return:
+    """
+    terminals = []
+    stack = [ctx]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, TerminalNode):
+            text = node.getText()
+            terminals.append(CANONICAL_OPERATORS.get(text, text).replace("'", '"'))
+        else:
+            stack.extend(reversed(list(node.getChildren())))
+
+    key = ' '.join(terminals)
+    return key.replace(' . ', '.').replace(' [ ', '[').replace(' ]', ']')
+
+
+class TruthTable:
+    """
+    Packed truth tables: bit k of operand value is the operand value in k-th assignment.
+    Logical operators are bitwise operators over python int
+    """
+    def __init__(self, width: int, exhaustive: bool):
+        self.width = width
+        self.exhaustive = exhaustive
+        self.mask = (1 << width) - 1
+        self.operands = {}
+        self.domains = {}
+
+    @classmethod
+    def exhaustiveFor(cls, operands_count: int) -> 'TruthTable':
+        return cls(1 << operands_count, True)
+
+    def operand(self, key: str) -> int:
+        if key not in self.operands:
+            index = len(self.operands)
+            if self.exhaustive:
+                period = 1 << index
+                # 0..0 1..1 повторяется с периодом 2 * period
+                value = ((1 << period) - 1) << period
+                length = period * 2
+                while length < self.width:
+                    value |= value << length
+                    length *= 2
+                self.operands[key] = value & self.mask
+            else:
+                self.operands[key] = random.getrandbits(self.width)
+        return self.operands[key]
+
+    def care(self) -> int:
+        """
+        Assignments possible for inputs: input has only one value,
+        so input eq "a" and input eq "b" can not be true both
+        :return: bit mask of assignments
+        """
+        care = self.mask
+        by_input = {}
+        for key, (input_name, literal) in self.domains.items():
+            by_input.setdefault(input_name, []).append((literal, key))
+        for values in by_input.values():
+            for i in range(len(values)):
+                for j in range(i + 1, len(values)):
+                    if values[i][0] != values[j][0]:
+                        care &= ~(self.operands[values[i][1]] & self.operands[values[j][1]])
+        return care & self.mask
+
+    def assignment(self, bit: int) -> Dict[str, bool]:
+        return {key: bool((value >> bit) & 1) for key, value in self.operands.items()}
+
+    def evaluate(self, ctx: ParserRuleContext, javael_precedence: bool = False, negations: int = 0,
+                 prefixes: tuple = ()) -> int:
+        """
+        Truth table of JavaEL logical skeleton, non logical subtrees are atomic operands.
+        Grammar parses ! as (Not)+ ternary, so !a and b is !(a and b) in tree, as ToFEELConverter translates it.
+        With javael_precedence prefix operators are applied to the nearest operand: (!a) and b, (empty a) or b
+        :param ctx: JavaEL tree
+        :param javael_precedence: evaluate as JavaEL, not as tree
+        :param negations: pending ! for the nearest operand
+        :param prefixes: pending empty and - with operators inside them for the nearest operand
+        :return: packed truth table
+        """
+        while True:
+            if isinstance(ctx, TerminalNode):
+                return self._negate(self._atom(ctx, prefixes), negations)
+
+            children = list(ctx.getChildren())
+            if len(children) == 1:
+                ctx = children[0]
+            elif isinstance(ctx, JavaELParser.TernaryContext):
+                condition = self.evaluate(children[0], javael_precedence, negations, prefixes)
+                return (condition & self.evaluate(children[2], javael_precedence)) | \
+                       (~condition & self.evaluate(children[4], javael_precedence) & self.mask)
+            elif isinstance(ctx, JavaELParser.ExpressionContext):
+                result = self.evaluate(children[0], javael_precedence, negations, prefixes)
+                for c in children[2::2]:
+                    result |= self.evaluate(c, javael_precedence)
+                return result
+            elif isinstance(ctx, JavaELParser.TermContext):
+                result = self.evaluate(children[0], javael_precedence, negations, prefixes)
+                for c in children[2::2]:
+                    result &= self.evaluate(c, javael_precedence)
+                return result
+            elif isinstance(ctx, JavaELParser.RelationContext) and isinstance(children[0], TerminalNode):
+                # скобки
+                if prefixes:
+                    return self._negate(self._atom(ctx, prefixes), negations)
+                return self._negate(self.evaluate(children[1], javael_precedence), negations)
+            elif javael_precedence and isinstance(ctx, JavaELParser.BaseContext) \
+                    and isinstance(children[0], TerminalNode) and children[0].symbol.type in PREFIX_OPERATORS:
+                for c in children[:-1]:
+                    if c.symbol.type == JavaELParser.Not and not prefixes:
+                        negations += 1
+                    else:
+                        prefixes += (c.symbol.type,)
+                ctx = children[-1]
+            elif isinstance(ctx, JavaELParser.BaseContext) and children[0].symbol.type == JavaELParser.Not:
+                not_count = 0
+                while isinstance(children[not_count], TerminalNode) and children[not_count].symbol.type == JavaELParser.Not:
+                    not_count += 1
+                tail = children[not_count:]
+
+                if len(tail) > 1:
+                    # empty, - : не логический оператор, операнд целиком
+                    atom = self.operand(' '.join(operandKey(c) for c in tail))
+                    return self._negate(atom, negations + not_count)
+                return self._negate(self.evaluate(tail[0], javael_precedence), negations + not_count)
+            else:
+                return self._negate(self._atom(ctx, prefixes), negations)
+
+    def _negate(self, value: int, negations: int) -> int:
+        return ~value & self.mask if negations % 2 else value
+
+    def _atom(self, ctx: ParserRuleContext, prefixes: tuple = ()) -> int:
+        if prefixes:
+            # empty a: операнд целиком
+            return self.operand(' '.join([PREFIX_OPERATORS[p] for p in prefixes] + [operandKey(ctx)]))
+        key = operandKey(ctx)
+        value = self.operand(key)
+        if isinstance(ctx, JavaELParser.EqualityContext) and ctx.getChildCount() == 3 \
+                and ctx.getChild(1).getText() in ('eq', '=='):
+            domain = equalityDomain(ctx.getChild(0), ctx.getChild(2))
+            if domain:
+                self.domains[key] = (operandKey(ctx.getChild(0)), domain[1])
+        return value
+
+
+def normalizeExpression(expression: str, dnf_budget: int = DNF_SIZE_BUDGET) -> str:
+    """
+    The same normalization as translateDMNReadyinDMNTree: zip, DNF with budget and domains, unpack.
+    Intermediate decisions are substituted back as sub formulas
+    :param expression: JavaEL expression of ExpressionDMN
+    :param dnf_budget:
+    :return: JavaEL DNF
+    """
+    zipped = zipFormula(tree(expression))
+    dmn_ready = toDMNReadyBounded(zipped.expression, dnf_budget, equalityDomains(zipped))
+
+    # промежуточные решения создаются изнутри наружу
+    aux_formulas = {}
+    for aux_name, formula in dmn_ready.intermediates.items():
+        aux_formulas[aux_name] = '(' + replaceAux(formula, aux_formulas) + ')'
+
+    normalized = unpack(concatWithOr({replaceAux(row, aux_formulas) for row in dmn_ready.rows}), zipped.operands)
+    return normalized
+
+
+def _operandsCount(*trees: ParserRuleContext) -> int:
+    table = TruthTable(1, False)
+    for t in trees:
+        if t is not None:
+            table.evaluate(t)
+    return len(table.operands)
+
+
+def _firstDifference(table: TruthTable, expected_tree, actual_tree) -> Optional[Tuple[int, int, int]]:
+    # исходное выражение по правилам JavaEL, результат - как его переводит ToFEELConverter
+    expected = table.evaluate(expected_tree, javael_precedence=True)
+    # None - постоянная ложь: все строки DNF сокращены
+    actual = table.evaluate(actual_tree) if actual_tree is not None else 0
+    difference = (expected ^ actual) & table.care()
+    if not difference:
+        return None
+    bit = (difference & -difference).bit_length() - 1
+    return bit, (expected >> bit) & 1, (actual >> bit) & 1
+
+
+def checkNode(expression: str, dnf_budget: int = DNF_SIZE_BUDGET, max_exhaustive: int = MAX_EXHAUSTIVE_OPERANDS,
+              sample_rounds: int = SAMPLE_ROUNDS) -> Tuple[int, bool, Optional[Counterexample]]:
+    """
+    Compare truth tables of ExpressionDMN expression and its normalized DNF
+    :param expression: JavaEL expression
+    :param dnf_budget:
+    :param max_exhaustive: max operands for full truth table
+    :param sample_rounds: rounds of SAMPLE_BITS random assignments otherwise
+    :return: operands count, is exhaustive, first counterexample or None
+    """
+    normalized = normalizeExpression(expression, dnf_budget)
+    expected_tree = tree(expression)
+    # CONSTANT_FALSE: строк нет, дерево пустого выражения не разбирается
+    actual_tree = tree(normalized) if normalized.strip() else None
+
+    operands = _operandsCount(expected_tree, actual_tree)
+    exhaustive = operands <= max_exhaustive
+    rounds = 1 if exhaustive else sample_rounds
+
+    for _ in range(rounds):
+        table = TruthTable.exhaustiveFor(operands) if exhaustive else TruthTable(SAMPLE_BITS, False)
+        difference = _firstDifference(table, expected_tree, actual_tree)
+        if difference:
+            bit, expected, actual = difference
+            return operands, exhaustive, Counterexample(
+                node_expression=expression,
+                normalized=normalized,
+                assignment=table.assignment(bit),
+                expected=bool(expected),
+                actual=bool(actual)
+            )
+    return operands, exhaustive, None
+
+
+def assignmentRecord(table: TruthTable, bit: int) -> Optional[dict]:
+    """
+    Record of input values which gives operands their values in assignment: true equality sets its literal,
+    bare operand is its value, empty operand is null, other inputs get value not equal to any literal
+    :param table: truth table of expression
+    :param bit: number of assignment
+    :return: record like {'fields': {'x': 'a'}}, None if operands can not take these values together
+    """
+    assignment = table.assignment(bit)
+    values = {}
+    for key, value in assignment.items():
+        empty = EMPTY_OPERAND_RE.match(key)
+        if key in table.domains:
+            path, literal = table.domains[key]
+            if value:
+                values[path] = parseLiteral(literal)
+            else:
+                values.setdefault(path, OTHER_VALUE)
+        elif empty and BARE_OPERAND_RE.match(empty.group(1)):
+            if values.get(empty.group(1), OTHER_VALUE) == OTHER_VALUE:
+                values[empty.group(1)] = None if value else OTHER_VALUE
+        elif BARE_OPERAND_RE.match(key):
+            values[key] = value
+        else:
+            return None
+
+    record = {}
+    for path, value in values.items():
+        tokens = pathTokens(path)
+        node = record
+        for token in tokens[:-1]:
+            node = node.setdefault(token, {})
+            if not isinstance(node, dict):
+                return None
+        node[tokens[-1]] = value
+
+    # значения одного входа могут противоречить друг другу
+    try:
+        if any(bool(compileExpression(key)(record)) != value for key, value in assignment.items()):
+            return None
+    except Exception:
+        return None
+    return record
+
+
+def checkDecisions(expression: str, dnf_budget: int = DNF_SIZE_BUDGET,
+                   max_exhaustive: int = MAX_EXHAUSTIVE_RECORDS_OPERANDS) -> Tuple[int, Optional[Counterexample]]:
+    """
+    Compare translated DRD, evaluated by DMNEvaluator, with JavaEL evaluation of expression
+    on records built from assignments of expression operands
+    :param expression: JavaEL expression
+    :param dnf_budget:
+    :param max_exhaustive: max operands for full truth table, SAMPLE_BITS random assignments otherwise
+    :return: records checked, first counterexample or None
+    """
+    definitions = DMN_XML.visit(translate(expression, dnf_budget=dnf_budget))
+    # после записи теги в namespace DMN
+    evaluator = DMNEvaluator(etree.fromstring(etree.tostring(definitions)))
+
+    expression_tree = tree(expression)
+    counter = TruthTable(1, False)
+    counter.evaluate(expression_tree, javael_precedence=True)
+    operands = len(counter.operands)
+    table = TruthTable.exhaustiveFor(operands) if operands <= max_exhaustive else TruthTable(SAMPLE_BITS, False)
+    table.evaluate(expression_tree, javael_precedence=True)
+    care = table.care()
+
+    bits, records = [], []
+    for bit in range(table.width):
+        if (care >> bit) & 1:
+            record = assignmentRecord(table, bit)
+            if record is not None:
+                bits.append(bit)
+                records.append(record)
+    if not records:
+        return 0, None
+
+    expected = compileExpression(expression).evaluateRecords(records)
+    actual = evaluator.evaluateRecords(records)
+    for bit, record, e, a in zip(bits, records, expected, actual):
+        if bool(e) != bool(a):
+            return len(records), Counterexample(
+                node_expression=expression,
+                normalized=None,
+                assignment=table.assignment(bit),
+                expected=bool(e),
+                actual=bool(a),
+                record=record
+            )
+    return len(records), None
+
+
+def checkExpression(expression: str, dnf_budget: int = DNF_SIZE_BUDGET,
+                    max_exhaustive: int = MAX_EXHAUSTIVE_OPERANDS,
+                    sample_rounds: int = SAMPLE_ROUNDS) -> EquivalenceReport:
+    """
+    Check DNF of every ExpressionDMN of expression DMN tree, then translated DRD against JavaEL evaluation,
+    report first counterexample
+    :param expression: JavaEL expression
+    :param dnf_budget:
+    :param max_exhaustive:
+    :param sample_rounds:
+    :return: EquivalenceReport
+    """
+    operands_total = 0
+    exhaustive_all = True
+    try:
+        nodes = [DMNTree(tree(expression)).root]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.children)
+            if not isinstance(node, ExpressionDMN):
+                continue
+
+            operands, exhaustive, counterexample = checkNode(node.expression, dnf_budget, max_exhaustive,
+                                                             sample_rounds)
+            operands_total += operands
+            exhaustive_all = exhaustive_all and exhaustive
+            if counterexample:
+                return EquivalenceReport(expression, operands_total, exhaustive_all, False, counterexample, None)
+
+        _, counterexample = checkDecisions(expression, dnf_budget)
+        if counterexample:
+            return EquivalenceReport(expression, operands_total, exhaustive_all, False, counterexample, None)
+    except Exception as e:
+        return EquivalenceReport(expression, operands_total, exhaustive_all, False, None, f'{type(e).__name__}: {e}')
+
+    return EquivalenceReport(expression, operands_total, exhaustive_all, True, None, None)
+
+
+def checkCorpus(expressions: Iterable[str], workers: int = None, dnf_budget: int = DNF_SIZE_BUDGET,
+                max_exhaustive: int = MAX_EXHAUSTIVE_OPERANDS) -> List[EquivalenceReport]:
+    """
+    Check expressions in parallel processes
+    :param expressions: JavaEL expressions
+    :param workers: processes count, cpu count by default
+    :param dnf_budget:
+    :param max_exhaustive:
+    :return: reports in order of expressions
+    """
+    expressions = list(expressions)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            checkExpression,
+            expressions,
+            [dnf_budget] * len(expressions),
+            [max_exhaustive] * len(expressions),
+            chunksize=max(1, len(expressions) // 64)
+        ))
+
+
+@click.command()
+@click.argument('path')
+@click.option('--workers', default=None, type=int, help='processes count')
+@click.option('--budget', default=DNF_SIZE_BUDGET, type=int, help='DNF size budget of translation')
+def main(path, workers, budget):
+    """
+    Check translation of expressions from file, one JavaEL expression per line
+    """
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, level='INFO', format='{level} {message}')
+
+    with open(path) as corpus:
+        expressions = [line.strip() for line in corpus if line.strip()]
+
+    failed = 0
+    for report in checkCorpus(expressions, workers, budget):
+        if report.equivalent:
+            continue
+        failed += 1
+        if report.error:
+            logger.error(f'{report.expression}: {report.error}')
+        else:
+            logger.warning(f'{report.expression}: {report.counterexample}')
+
+    logger.info(f'checked {len(expressions)}, not equivalent {failed}')
+
+
+if __name__ == '__main__':
+    main()
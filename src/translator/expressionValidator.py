@@ -0,0 +1,222 @@
+import re
+import sys
+from collections import namedtuple
+from typing import List, Optional
+
+import click
+from antlr4.error.ErrorListener import ErrorListener
+
+ExpressionError = namedtuple('ExpressionError', ('offset', 'message'))
+
+# лексемы JavaEL в порядке JavaELLexer: самая длинная лексема впереди
+_token_re = re.compile(r'''
+    (?P<space>[ \t\r\n]+)
+  | (?P<string>"(?:[^"\\\r\n]|\\[\s\S])*"|'(?:[^'\\\r\n]|\\[\s\S])*')
+  | (?P<quote>["'])
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>[0-9]+)
+  | (?P<operator>&&|\|\||==|!=|>=|<=|[!<>+\-*/%?:.])
+  | (?P<open>[(\[])
+  | (?P<close>[)\]])
+  | (?P<other>[^ \t\r\n"'A-Za-z0-9_()\[\]!<>+\-*/%?:.&|=]+|.)
+''', re.VERBOSE | re.DOTALL)
+
+_BINARY, _PREFIX, _QUESTION, _COLON, _DOT = range(5)
+
+_operators = {
+    '&&': _BINARY, '||': _BINARY, 'and': _BINARY, 'or': _BINARY,
+    '==': _BINARY, '!=': _BINARY, 'eq': _BINARY, 'ne': _BINARY,
+    '>': _BINARY, '<': _BINARY, '>=': _BINARY, '<=': _BINARY, 'gt': _BINARY, 'lt': _BINARY, 'ge': _BINARY, 'le': _BINARY,
+    '+': _BINARY, '*': _BINARY, '/': _BINARY, '%': _BINARY, 'div': _BINARY, 'mod': _BINARY,
+    '!': _PREFIX, 'not': _PREFIX, 'empty': _PREFIX,
+    '?': _QUESTION, ':': _COLON, '.': _DOT,
+}
+_closing = {')': '(', ']': '['}
+
+
+class InvalidExpression(ValueError):
+    """
+    Expression rejected by pre-validation or by parser, errors keep offsets in expression
+    """
+    def __init__(self, expression: str, errors: List[ExpressionError]):
+        super(InvalidExpression, self).__init__(expression, errors)
+        self.expression = expression
+        self.errors = errors
+
+    def __str__(self):
+        return '; '.join(f'{e.offset}: {e.message}' for e in self.errors)
+
+
+class _Frame:
+    __slots__ = ('bracket', 'offset', 'questions', 'call')
+
+    def __init__(self, bracket: Optional[str], offset: int, call: bool = False):
+        self.bracket = bracket
+        self.offset = offset
+        # '?' без своего ':'
+        self.questions = 0
+        self.call = call
+
+
+def validate(expression: str) -> List[ExpressionError]:
+    """
+    One pass over characters of JavaEL expression: brackets, string literals and placement of operators.
+    Valid for JavaELParser expression is never rejected, the rest of grammar is checked by parser
+    :param expression:
+    :return: errors sorted by offset, empty list for valid expression
+    """
+    errors = []
+    frames = [_Frame(None, 0)]
+    expect_operand = True
+    # оператор, после которого ожидается операнд: (смещение, текст)
+    pending = None
+    after_dot = False
+    opened_call = False
+
+    for m in _token_re.finditer(expression):
+        kind = m.lastgroup
+        if kind == 'space':
+            continue
+        offset = m.start()
+        value = m.group()
+        if kind == 'quote':
+            # строка не закрыта до конца выражения, остальное не разбирается
+            errors.append(ExpressionError(offset, 'string literal is not closed'))
+            return errors
+        if kind == 'other':
+            errors.append(ExpressionError(offset, f"unexpected characters '{value}'"))
+            continue
+
+        operator = None
+        if kind == 'name' or kind == 'operator':
+            operator = _operators.get(value)
+            if value == '-':
+                operator = _PREFIX if expect_operand else _BINARY
+
+        if kind == 'open':
+            if value == '[' or not expect_operand:
+                # вызов функции или индекс после операнда
+                if expect_operand:
+                    errors.append(ExpressionError(offset, f"unexpected '{value}', operand expected"))
+                frames.append(_Frame(value, offset, call=value == '('))
+            else:
+                if after_dot:
+                    errors.append(ExpressionError(offset, "name expected after '.'"))
+                frames.append(_Frame(value, offset))
+            expect_operand, pending, after_dot = True, (offset, value), False
+            opened_call = frames[-1].call
+            continue
+
+        if kind == 'close':
+            frame = frames[-1]
+            if frame.bracket != _closing[value]:
+                errors.append(ExpressionError(offset, f"'{value}' does not close "
+                                                      + (f"'{frame.bracket}' at {frame.offset}" if frame.bracket else 'any bracket')))
+                opened_call = False
+                continue
+            if expect_operand and not opened_call:
+                errors.append(_missingOperand(pending))
+            if frame.questions:
+                errors.append(ExpressionError(frame.offset, "'?' without ':'"))
+            frames.pop()
+            expect_operand, pending, after_dot, opened_call = False, None, False, False
+            continue
+
+        opened_call = False
+        if operator is None:
+            # имя, строка, число, true, false, null
+            if not expect_operand:
+                errors.append(ExpressionError(offset, f"unexpected '{value}', operator expected"))
+            expect_operand, pending, after_dot = False, None, False
+        elif operator == _PREFIX:
+            if after_dot:
+                errors.append(ExpressionError(offset, "name expected after '.'"))
+            elif not expect_operand:
+                errors.append(ExpressionError(offset, f"unexpected '{value}', operator expected"))
+            expect_operand, pending, after_dot = True, (offset, value), False
+        else:
+            if expect_operand:
+                errors.append(ExpressionError(offset, f"unexpected '{value}', operand expected"))
+            if operator == _QUESTION:
+                frames[-1].questions += 1
+            elif operator == _COLON:
+                if frames[-1].questions:
+                    frames[-1].questions -= 1
+                else:
+                    errors.append(ExpressionError(offset, "':' without '?'"))
+            expect_operand, pending, after_dot = True, (offset, value), operator == _DOT
+
+    if expect_operand:
+        errors.append(_missingOperand(pending) if pending else ExpressionError(0, 'empty expression'))
+    for frame in frames[1:]:
+        errors.append(ExpressionError(frame.offset, f"'{frame.bracket}' is not closed"))
+    if frames[0].questions:
+        errors.append(ExpressionError(len(expression), "'?' without ':'"))
+    errors.sort()
+    return errors
+
+
+def _missingOperand(pending: tuple) -> ExpressionError:
+    offset, value = pending
+    return ExpressionError(offset, f"operand expected after '{value}'")
+
+
+def checkExpression(expression: str) -> str:
+    """
+    Raise InvalidExpression if pre-validation finds errors
+    :param expression:
+    :return: expression
+    """
+    errors = validate(expression)
+    if errors:
+        raise InvalidExpression(expression, errors)
+    return expression
+
+
+class CollectingErrorListener(ErrorListener):
+    """
+    ANTLR error listener: syntax errors are kept with offsets in expression instead of printing to stderr
+    """
+    def __init__(self, expression: str, errors: List[ExpressionError] = None):
+        super(CollectingErrorListener, self).__init__()
+        self.expression = expression
+        self.errors = [] if errors is None else errors
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append(ExpressionError(self._offset(line, column), msg))
+
+    def _offset(self, line: int, column: int) -> int:
+        offset = 0
+        for _ in range(line - 1):
+            offset = self.expression.find('\n', offset) + 1
+        return offset + column
+
+
+def listenErrors(recognizers: tuple, listener: ErrorListener):
+    for recognizer in recognizers:
+        recognizer.removeErrorListeners()
+        recognizer.addErrorListener(listener)
+
+
+@click.command()
+@click.argument('path', type=click.File('r'))
+def main(path):
+    """
+    Pre-validate JavaEL expressions of file, one per line: line, offset and message of each error
+    """
+    invalid = 0
+    for number, line in enumerate(path, 1):
+        expression = line.rstrip('\n')
+        if not expression.strip():
+            continue
+        errors = validate(expression)
+        if errors:
+            invalid += 1
+        for error in errors:
+            sys.stdout.write(f'{number}:{error.offset}: {error.message}\n')
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+import re
+import sys
+from collections import namedtuple
+from typing import Dict, Iterable, List, Set, Optional, Tuple
+
+import click
+from antlr4 import Token
+from lxml import etree
+from ANTLR_FEELParser.feelParser import feelParser
+
+from src.translator.expressionValidator import ExpressionError
+from src.translator.feel_analizer import tree, unaryTestsTree, FEELInputExtractor, FEELRuleExtractor
+from src.translator.prattParser import LexedToken
+from src.translator.sourceText import SourceText
+
+# FEEL, который пишет xmlPacker: сравнения, not(...), null, вызов функции на пути, пути с фильтром.
+# Разбор повторяет правила feel.g4 на этом подмножестве, остальное разбирает полная грамматика
+
+_NAME_START = (r'?A-Za-z_\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u02FF\u0370-\u037D\u037F-\u1FFF\u200C-\u200D'
+               r'\u2070-\u218F\u2C00-\u2FEF\u3001-\uD7FF\uF900-\uFDCF\uFDF0-\uFFFD\U00010000-\U000EFFFF')
+_NAME_PART = _NAME_START + r'0-9\u00B7\u0300-\u036F\u203F-\u2040'
+
+# лексемы feelLexer подмножества: без комментариев и ', числа с экспонентой, суффиксом, '_' и
+# шестнадцатеричные не входят в него
+_token_re = re.compile(rf'''
+    (?P<space>[ \t\r\n\f\u00A0]+)
+  | (?P<string>"(?:[^"\\]|\\u[0-9a-fA-F]{{4}}|\\[^u])*")
+  | (?P<number>[0-9]+(?:\.[0-9]+)?(?![0-9A-Za-z_?])|\.[0-9]+(?![0-9A-Za-z_?]))
+  | (?P<name>[{_NAME_START}][{_NAME_PART}]*)
+  | (?P<operator>\.\.|<=|>=|!=|->|\*\*|/(?![/*])|[.=<>!:+\-*@(){{}}\[\],])
+''', re.VERBOSE)
+
+_KEYWORDS = {
+    'for': feelParser.FOR, 'return': feelParser.RETURN, 'in': feelParser.IN, 'if': feelParser.IF,
+    'then': feelParser.THEN, 'else': feelParser.ELSE, 'some': feelParser.SOME, 'every': feelParser.EVERY,
+    'satisfies': feelParser.SATISFIES, 'instance': feelParser.INSTANCE, 'of': feelParser.OF,
+    'function': feelParser.FUNCTION, 'external': feelParser.EXTERNAL, 'or': feelParser.OR, 'and': feelParser.AND,
+    'between': feelParser.BETWEEN, 'null': feelParser.NULL, 'true': feelParser.BooleanLiteral,
+    'false': feelParser.BooleanLiteral, 'not': feelParser.NOT,
+}
+_OPERATORS = {
+    '..': feelParser.ELIPSIS, '<=': feelParser.LE, '>=': feelParser.GE, '!=': feelParser.NOTEQUAL,
+    '->': feelParser.RARROW, '**': feelParser.POW, '.': feelParser.DOT, '=': feelParser.EQUAL, '<': feelParser.LT,
+    '>': feelParser.GT, '!': feelParser.BANG, ':': feelParser.COLON, '+': feelParser.ADD, '-': feelParser.SUB,
+    '*': feelParser.MUL, '/': feelParser.DIV, '@': feelParser.AT, '(': feelParser.LPAREN, ')': feelParser.RPAREN,
+    '{': feelParser.LBRACE, '}': feelParser.RBRACE, '[': feelParser.LBRACK, ']': feelParser.RBRACK,
+    ',': feelParser.COMMA,
+}
+
+_LITERALS = (feelParser.IntegerLiteral, feelParser.FloatingPointLiteral, feelParser.StringLiteral,
+             feelParser.BooleanLiteral, feelParser.NULL)
+_NUMBERS = (feelParser.IntegerLiteral, feelParser.FloatingPointLiteral)
+_COMPARISONS = (feelParser.EQUAL, feelParser.NOTEQUAL, feelParser.LT, feelParser.GT, feelParser.LE, feelParser.GE)
+_LOGICAL = (feelParser.AND, feelParser.OR)
+# nameRef: Identifier или not и все следующие токены кроме nameRefOtherToken исключений
+_NAME_STOPS = (feelParser.LPAREN, feelParser.RPAREN, feelParser.LBRACK, feelParser.RBRACK, feelParser.LBRACE,
+               feelParser.RBRACE, feelParser.LT, feelParser.GT, feelParser.EQUAL, feelParser.BANG, feelParser.COMMA,
+               Token.EOF)
+# токены, которые nameRef забирает в подмножестве: без ключевых слов, ':', '..' и '@',
+# от которых зависит выбор альтернатив выше nameRef
+_NAME_TOKENS = frozenset(_LITERALS + (feelParser.Identifier, feelParser.NOT, feelParser.DOT, feelParser.NOTEQUAL,
+                                      feelParser.LE, feelParser.GE, feelParser.ADD, feelParser.SUB, feelParser.MUL,
+                                      feelParser.DIV, feelParser.AND, feelParser.OR))
+
+# вершины разбора: вид, первый и последний токен, дети
+FeelNode = namedtuple('FeelNode', ('kind', 'start', 'stop', 'children'))
+NAME, LITERAL, PARENS, CALL, FILTER, MEMBER, COMPARISON, LOGICAL = range(8)
+
+
+class _Unsupported(Exception):
+    """
+    Expression is outside of subset or is not valid, it is left to full grammar
+    """
+
+
+def lex(expression: str) -> Optional[List[LexedToken]]:
+    """
+    :param expression: FEEL expression
+    :return: tokens ending with EOF, None if expression has tokens outside of subset
+    """
+    tokens = []
+    position = 0
+    for m in _token_re.finditer(expression):
+        if m.start() != position:
+            return None
+        position = m.end()
+        kind = m.lastgroup
+        if kind == 'space':
+            continue
+        value = m.group()
+        if kind == 'string':
+            token_type = feelParser.StringLiteral
+        elif kind == 'number':
+            token_type = feelParser.FloatingPointLiteral if '.' in value else feelParser.IntegerLiteral
+        elif kind == 'name':
+            token_type = _KEYWORDS.get(value, feelParser.Identifier)
+        else:
+            token_type = _OPERATORS[value]
+        tokens.append(LexedToken(token_type, value, m.start()))
+    if position != len(expression):
+        return None
+    tokens.append(LexedToken(Token.EOF, '<EOF>', len(expression)))
+    return tokens
+
+
+class CellParser:
+    """
+    Recursive descent over tokens of FEEL subset. Result of every rule is the node which feelParser builds for it,
+    so visitors over FeelNode find the same identifiers and rules as FEELInputExtractor and FEELRuleExtractor
+    """
+    __slots__ = ('tokens', 'types', 'position')
+
+    def __init__(self, tokens: List[LexedToken]):
+        self.tokens = tokens
+        self.types = [t.type for t in tokens]
+        self.position = 0
+
+    def parseCell(self) -> FeelNode:
+        node = self.parseExpression()
+        self._expect(Token.EOF)
+        return node
+
+    def parseUnaryTests(self) -> List[FeelNode]:
+        """
+        unaryTests: not( tests ) | tests | -, test is expression or comparison operator and endpoint
+        :return: nodes of tests
+        """
+        types = self.types
+        if types[0] == feelParser.SUB and types[1] == Token.EOF:
+            return []
+        if types[0] == feelParser.NOT and types[1] == feelParser.LPAREN:
+            start = self.position
+            try:
+                self.position += 2
+                tests = self._parseTests()
+                self._expect(feelParser.RPAREN)
+                self._expect(Token.EOF)
+                return tests
+            except _Unsupported:
+                # not(...) как вызов функции в positiveUnaryTest
+                self.position = start
+        tests = self._parseTests()
+        self._expect(Token.EOF)
+        return tests
+
+    def _parseTests(self) -> List[FeelNode]:
+        tests = [self._parseTest()]
+        while self.types[self.position] == feelParser.COMMA:
+            self.position += 1
+            tests.append(self._parseTest())
+        return tests
+
+    def _parseTest(self) -> FeelNode:
+        if self.types[self.position] in _COMPARISONS:
+            self.position += 1
+            return self.parseOperand()
+        return self.parseExpression()
+
+    def parseExpression(self) -> FeelNode:
+        start = self.position
+        node = self.parseComparison()
+        # and и or не меняют порядок обхода, цепочка хранится списком
+        operands = [node]
+        while self.types[self.position] in _LOGICAL:
+            self.position += 1
+            operands.append(self.parseComparison())
+        if len(operands) == 1:
+            return node
+        return FeelNode(LOGICAL, start, self.position - 1, operands)
+
+    def parseComparison(self) -> FeelNode:
+        start = self.position
+        node = self.parseOperand()
+        while self.types[self.position] in _COMPARISONS:
+            self.position += 1
+            right = self.parseOperand()
+            node = FeelNode(COMPARISON, start, self.position - 1, (node, right))
+        return node
+
+    def parseOperand(self) -> FeelNode:
+        """
+        r_filterPathExpression over unaryExpression
+        """
+        types = self.types
+        start = self.position
+        token_type = types[start]
+        if token_type == feelParser.SUB and types[start + 1] in _NUMBERS:
+            self.position += 2
+            return FeelNode(LITERAL, start, start + 1, ())
+        if token_type in (feelParser.Identifier, feelParser.NOT):
+            node = self._parseName()
+        elif token_type in _LITERALS:
+            self.position += 1
+            node = FeelNode(LITERAL, start, start, ())
+        elif token_type == feelParser.LPAREN:
+            self.position += 1
+            inner = self.parseExpression()
+            self._expect(feelParser.RPAREN)
+            node = FeelNode(PARENS, start, self.position - 1, (inner,))
+        else:
+            raise _Unsupported()
+
+        called = False
+        while types[self.position] == feelParser.LPAREN:
+            arguments = self._parseArguments()
+            node = FeelNode(CALL, start, self.position - 1, (node,) + arguments)
+            called = True
+        if not called and node.kind != NAME and types[self.position] == feelParser.DOT:
+            # primary . qualifiedName неоднозначно с r_filterPathExpression . qualifiedName
+            raise _Unsupported()
+
+        while types[self.position] in (feelParser.LBRACK, feelParser.DOT):
+            if types[self.position] == feelParser.LBRACK:
+                self.position += 1
+                index = self.parseExpression()
+                self._expect(feelParser.RBRACK)
+                node = FeelNode(FILTER, start, self.position - 1, (node, index))
+            else:
+                self.position += 1
+                if types[self.position] not in (feelParser.Identifier, feelParser.NOT):
+                    raise _Unsupported()
+                name = self._parseName()
+                node = FeelNode(MEMBER, start, self.position - 1, (node, name))
+        if node.kind in (FILTER, MEMBER) and types[self.position] == feelParser.LPAREN:
+            raise _Unsupported()
+        return node
+
+    def _parseName(self) -> FeelNode:
+        types = self.types
+        start = self.position
+        self.position += 1
+        while True:
+            token_type = types[self.position]
+            if token_type in _NAME_TOKENS:
+                self.position += 1
+            elif token_type in _NAME_STOPS:
+                return FeelNode(NAME, start, self.position - 1, ())
+            else:
+                raise _Unsupported()
+
+    def _parseArguments(self) -> tuple:
+        self.position += 1
+        if self.types[self.position] == feelParser.RPAREN:
+            self.position += 1
+            return ()
+        arguments = [self.parseExpression()]
+        while self.types[self.position] == feelParser.COMMA:
+            self.position += 1
+            arguments.append(self.parseExpression())
+        self._expect(feelParser.RPAREN)
+        return tuple(arguments)
+
+    def _expect(self, token_type: int):
+        if self.types[self.position] != token_type:
+            raise _Unsupported()
+        self.position += 1
+
+
+def _parse(expression: str, unary_tests: bool = False):
+    tokens = lex(expression)
+    if tokens is None:
+        return None, None
+    parser = CellParser(tokens)
+    try:
+        return (parser.parseUnaryTests() if unary_tests else parser.parseCell()), tokens
+    except (_Unsupported, RecursionError):
+        return None, tokens
+
+
+def parseCell(expression: str) -> Optional[Tuple[FeelNode, List[LexedToken]]]:
+    """
+    :param expression: FEEL expression
+    :return: root node and tokens, None if expression is not in subset
+    """
+    node, tokens = _parse(expression)
+    if node is None:
+        return None
+    return node, tokens
+
+
+def inputs(expression: str) -> Set[str]:
+    """
+    Names found by FEELInputExtractor: first identifier of name, path with filter as text of its tokens
+    :param expression: FEEL expression
+    :return:
+    """
+    parsed = parseCell(expression)
+    if parsed is None:
+        extractor = FEELInputExtractor()
+        extractor.visit(tree(expression))
+        return extractor.result
+
+    root, tokens = parsed
+    source = SourceText(tokens)
+    names = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.kind == FILTER:
+            names.add(source.text(node.start, node.stop))
+        elif node.kind == NAME:
+            # not в начале имени - не Identifier
+            if tokens[node.start].type == feelParser.Identifier:
+                names.add(tokens[node.start].text)
+        else:
+            stack.extend(node.children)
+    return names
+
+
+def operandPath(expression: str) -> Optional[str]:
+    """
+    Whole path of operand or whole left operand of comparison, unlike inputs it keeps members of name:
+    fields.a = "x" -> fields.a, fields [ "a" ] -> fields [ "a" ], fields.a.size() = 1 -> fields.a.size()
+    :param expression: FEEL expression
+    :return: None if expression is not in subset or is not operand or comparison of operand
+    """
+    parsed = parseCell(expression)
+    if parsed is None:
+        return None
+    root, tokens = parsed
+    while root.kind == PARENS:
+        root = root.children[0]
+    if root.kind == COMPARISON:
+        root = root.children[0]
+        if root.kind == LITERAL:
+            return None
+    elif root.kind not in (NAME, FILTER, MEMBER):
+        return None
+    source = SourceText(tokens)
+    if root.kind == CALL:
+        return source.compactText(root.start, root.stop)
+    return source.text(root.start, root.stop).replace(' . ', '.')
+
+
+def rule(expression: str) -> str:
+    """
+    Rule found by FEELRuleExtractor: operator and right operand of comparisons, text of function calls
+    :param expression: FEEL expression
+    :return:
+    """
+    parsed = parseCell(expression)
+    if parsed is None:
+        extractor = FEELRuleExtractor()
+        extractor.visit(tree(expression))
+        return extractor.result
+
+    root, tokens = parsed
+    source = SourceText(tokens)
+    parts = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.kind == COMPARISON:
+            right = node.children[1]
+            parts.append(tokens[right.start - 1].text)
+            parts.append(source.compactText(right.start, right.stop))
+        elif node.kind == CALL:
+            parts.append(source.compactText(node.start, node.stop))
+        else:
+            stack.extend(reversed(node.children))
+    return ' '.join(parts)
+
+
+def unaryTestErrors(entry: Optional[str]) -> List[ExpressionError]:
+    """
+    Syntax errors of input entry of decision table, empty entry matches any input
+    :param entry: unary tests
+    :return: errors of full grammar, empty list for valid entry
+    """
+    if entry is None or not entry.strip():
+        return []
+    tests, _ = _parse(entry, unary_tests=True)
+    if tests is not None:
+        return []
+    errors = []
+    unaryTestsTree(entry, errors)
+    return errors
+
+
+def invalidEntries(entries: Iterable[str]) -> Dict[str, List[ExpressionError]]:
+    """
+    Validate input entries in bulk, each distinct entry is parsed once
+    :param entries: unary tests
+    :return: invalid entry -> its errors
+    """
+    invalid = {}
+    for entry in set(entries):
+        errors = unaryTestErrors(entry)
+        if errors:
+            invalid[entry] = errors
+    return invalid
+
+
+@click.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def main(path):
+    """
+    Validate input entries of decision tables in DMN file: id, offset and message of each error
+    """
+    entries = {}
+    for element in etree.parse(path).iter('{*}inputEntry'):
+        entries.setdefault(element.findtext('{*}text', ''), []).append(element.get('id'))
+    invalid = invalidEntries(entries)
+    for entry, errors in invalid.items():
+        for entry_id in entries[entry]:
+            for error in errors:
+                sys.stdout.write(f'{entry_id}:{error.offset}: {error.message}\n')
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,40 @@
+from typing import List
+
 from antlr4 import *
 from ANTLR_FEELParser.feelParser import feelParser
 from ANTLR_FEELParser.feelLexer import feelLexer
 from ANTLR_FEELParser.feelVisitor import feelVisitor
+from src.translator.sourceText import text, compactText
+from src.translator.expressionValidator import CollectingErrorListener, listenErrors
 
 
-def tree(expression: str) -> ParserRuleContext:
+def tree(expression: str, errors: List = None) -> ParserRuleContext:
     """
     Create AST from expression and return root node
     :param expression:
+    :param errors: list to collect syntax errors of lexer and parser as ExpressionError
     :return:
     """
+    return _parser(expression, errors).compilation_unit()
+
+
+def unaryTestsTree(expression: str, errors: List = None) -> ParserRuleContext:
+    """
+    Parse input entry of decision table: unary tests as in DMN decision table cells
+    :param expression:
+    :param errors: list to collect syntax errors of lexer and parser as ExpressionError
+    :return: root node
+    """
+    return _parser(expression, errors).unaryTestsRoot()
+
+
+def _parser(expression: str, errors: List = None) -> feelParser:
     input_stream = InputStream(expression)
     lexer = feelLexer(input_stream)
-    tree_returned = feelParser(CommonTokenStream(lexer))
-    return tree_returned.compilation_unit()
+    parser = feelParser(CommonTokenStream(lexer))
+    # ошибки разбора не печатаются в stderr
+    listenErrors((lexer, parser), CollectingErrorListener(expression, errors))
+    return parser
 
 
 class FEELInputExtractor(feelVisitor):
@@ -35,9 +56,7 @@ class FEELInputExtractor(feelVisitor):
                 rbrack_found = True
 
         if lbrack_found and rbrack_found:
-            p = SyntaxTreePrinter()
-            p.visit(ctx)
-            self.identifiers.add(p.tree_expression)
+            self.identifiers.add(text(ctx))
         else:
             self.visitChildren(ctx)
 
@@ -65,19 +84,5 @@ class FEELRuleExtractor(feelVisitor):
 
     def visitFnInvocation(self, ctx:feelParser.FnInvocationContext):
         self.rule.append(
-            ctx.getText()
+            compactText(ctx)
         )
-
-
-class SyntaxTreePrinter(feelVisitor):
-    def __init__(self):
-        super(SyntaxTreePrinter, self).__init__()
-        self.result = []
-
-    def visitTerminal(self, node):
-        self.result.append(node.getText())
-
-    @property
-    def tree_expression(self):
-        return ' '.join(self.result)
-
@@ -0,0 +1,334 @@
+"""
+Fork-server for command line tools.
+
+Server imports pyeda, lxml, ANTLR parsers and tools once and warms ANTLR DFA caches on sample expressions,
+then forks a child for each client command. Child gets stdin, stdout, stderr of client, its cwd, env and argv.
+
+    python -m src.translator.forkServer serve [--socket PATH] [--corpus FILE]
+    python -m src.translator.forkServer run translate "fields.a eq true"
+    python -m src.translator.forkServer stop
+
+Client imports only standard library modules, without server it runs the command in its own process
+"""
+import importlib
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+from typing import List, Optional
+
+
+def _runtimeDir() -> str:
+    # каталог только пользователя: имя в общем временном каталоге может занять другой пользователь
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return runtime
+    return os.path.join(tempfile.gettempdir(), f'javael-to-feel-{os.getuid()}')
+
+
+DEFAULT_SOCKET = os.path.join(_runtimeDir(), 'javael-to-feel.sock')
+MAX_MESSAGE = 1 << 20
+# клиент, не закончивший запрос, не держит сервер
+RECEIVE_TIMEOUT = 10.0
+STOP_COMMAND = '__stop__'
+
+# имя команды: (модуль, click команда)
+COMMANDS = {
+    'translate': ('src.translator.translate', 'main'),
+    'check': ('src.translator.equivalenceChecker', 'main'),
+    'build': ('src.translator.incrementalBuild', 'main'),
+    'dependencies': ('src.dependencyTable.buildPropDependency', 'main'),
+    'validate': ('src.translator.expressionValidator', 'main'),
+}
+# buildPropDependency импортирует JavaEL_tokenize как скрипт из своей директории
+PRELOAD_PATHS = (os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dependencyTable'),)
+PRELOAD_MODULES = ('pyeda.inter', 'lxml.etree', 'numpy', 'click', 'loguru', 'pandas')
+SAMPLE_EXPRESSIONS = (
+    "fields['SignFL'] eq true or fields['SignUL'] eq true",
+    "(fields.status eq 'a' or fields.status eq 'b') and fields.flag",
+    "!(fields.a and fields.b) or fields.c",
+    "(fields.a or fields.b) and (fields.c or fields.d) and (fields.e or fields.f)",
+)
+
+
+def _loadCommand(name: str):
+    module_name, attribute = COMMANDS[name]
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def runCommand(name: str, args: List[str]) -> int:
+    """
+    Run click command as standalone program
+    :param name: key of COMMANDS
+    :param args: command arguments
+    :return: exit code
+    """
+    if name not in COMMANDS:
+        sys.stderr.write(f'Unknown command {name}, expected one of {", ".join(COMMANDS)}\n')
+        return 2
+    try:
+        _loadCommand(name)(args=args, prog_name=name, standalone_mode=True)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def preload(corpus: List[str] = SAMPLE_EXPRESSIONS):
+    """
+    Import modules of commands and translate corpus to fill ANTLR DFA caches, they are shared by forked children
+    :param corpus: sample JavaEL expressions
+    """
+    from loguru import logger
+
+    for path in PRELOAD_PATHS:
+        if path not in sys.path:
+            sys.path.append(path)
+    for module_name in PRELOAD_MODULES + tuple(m for m, _ in COMMANDS.values()):
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning(f'{module_name} is not preloaded: {e}')
+
+    from src.translator.translate import translate
+    from src.translator.treeFormula import DMN_XML
+
+    logger.remove()
+    for expression in corpus:
+        try:
+            DMN_XML.visit(translate(expression))
+        except Exception as e:
+            sys.stderr.write(f'Warm up failed on {expression}: {type(e).__name__}: {e}\n')
+
+
+def _child(connection: socket.socket, listener: socket.socket, request: dict, fds: List[int]):
+    listener.close()
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for target, fd in enumerate(fds[:3]):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    code = 1
+    try:
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        sys.argv = [request['command']] + request['args']
+        code = runCommand(request['command'], request['args'])
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        try:
+            connection.sendall(json.dumps({'exit': code}).encode('utf-8'))
+        except OSError:
+            pass
+        os._exit(code)
+
+
+def _receive(connection: socket.socket) -> (dict, List[int]):
+    """
+    Read request until client shuts down writing, descriptors come with the first part of message
+    :param connection: accepted client connection
+    :return: request, descriptors of client stdin, stdout, stderr
+    """
+    connection.settimeout(RECEIVE_TIMEOUT)
+    part, fds, _, _ = socket.recv_fds(connection, MAX_MESSAGE, 3)
+    try:
+        message = part
+        while part:
+            part = connection.recv(MAX_MESSAGE)
+            message += part
+            if len(message) > MAX_MESSAGE:
+                raise ValueError(f'Request is longer than {MAX_MESSAGE} bytes')
+        request = json.loads(message)
+        if not isinstance(request, dict):
+            raise ValueError(f'Request is not an object: {request!r:.80}')
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+    connection.settimeout(None)
+    return request, fds
+
+
+def isPrivate(path: str) -> bool:
+    """
+    Path belongs to user and nobody else can write into it
+    :param path: directory of socket
+    :return:
+    """
+    try:
+        status = os.stat(path)
+    except OSError:
+        return False
+    return status.st_uid == os.getuid() and not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _peerUid(connection: socket.socket, socket_path: str) -> int:
+    if hasattr(socket, 'SO_PEERCRED'):
+        # pid, uid, gid процесса сервера
+        credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        return struct.unpack('3i', credentials)[1]
+    return os.stat(socket_path).st_uid
+
+
+def _connect(socket_path: str) -> Optional[socket.socket]:
+    """
+    Connect to server of user. Client sends its environment and descriptors, so server in directory
+    writable by others or of other user is not trusted
+    :param socket_path:
+    :return: connected socket, None if server is not running or is not trusted
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    if not isPrivate(os.path.dirname(os.path.abspath(socket_path))) or _peerUid(client, socket_path) != os.getuid():
+        sys.stderr.write(f'Socket {socket_path} is not private to user, server is not used\n')
+        client.close()
+        return None
+    return client
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, corpus: List[str] = SAMPLE_EXPRESSIONS):
+    """
+    Preload and fork a child for each client request
+    :param socket_path: unix socket path in directory of user, which nobody else can write into
+    :param corpus: warm up expressions
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not isPrivate(directory):
+        raise PermissionError(f'{directory} must belong to user and be writable only by user')
+    preload(corpus)
+    # зомби дочерних процессов собирает ядро
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # сокет появляется под своим именем только когда сервер готов
+    tmp_path = f'{socket_path}.{os.getpid()}'
+    umask = os.umask(0o077)
+    try:
+        listener.bind(tmp_path)
+    finally:
+        os.umask(umask)
+    listener.listen(64)
+    os.replace(tmp_path, socket_path)
+
+    try:
+        while True:
+            connection, _ = listener.accept()
+            try:
+                request, fds = _receive(connection)
+            except (OSError, ValueError) as e:
+                # ошибка одного клиента не останавливает сервер
+                sys.stderr.write(f'Bad request: {type(e).__name__}: {e}\n')
+                connection.close()
+                continue
+            if request.get('command') == STOP_COMMAND:
+                connection.close()
+                break
+            if os.fork() == 0:
+                _child(connection, listener, request, fds)
+            for fd in fds:
+                os.close(fd)
+            connection.close()
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def run(command: str, args: List[str], socket_path: str = DEFAULT_SOCKET) -> int:
+    """
+    Run command in forked child of server, in this process if server is not running
+    :param command: key of COMMANDS
+    :param args:
+    :param socket_path:
+    :return: exit code
+    """
+    client = _connect(socket_path)
+    if client is None:
+        return runCommand(command, args)
+
+    with client:
+        request = {'command': command, 'args': args, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+        socket.send_fds(client, [json.dumps(request).encode('utf-8')], [0, 1, 2])
+        client.shutdown(socket.SHUT_WR)
+        reply = b''
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    if not reply:
+        return 1
+    return json.loads(reply)['exit']
+
+
+def stop(socket_path: str = DEFAULT_SOCKET):
+    client = _connect(socket_path)
+    if client is None:
+        raise ConnectionRefusedError(f'Server of user is not running on {socket_path}')
+    with client:
+        socket.send_fds(client, [json.dumps({'command': STOP_COMMAND}).encode('utf-8')], [])
+        client.shutdown(socket.SHUT_WR)
+
+
+def _option(args: List[str], name: str, default: str = None) -> str:
+    if name in args:
+        index = args.index(name)
+        value = args[index + 1]
+        del args[index:index + 2]
+        return value
+    return default
+
+
+def main(argv: List[str] = None) -> int:
+    # без click: клиент не должен импортировать ничего лишнего
+    args = list(sys.argv[1:] if argv is None else argv)
+    if not args or args[0] not in ('serve', 'run', 'stop'):
+        sys.stderr.write(__doc__)
+        return 2
+
+    action = args.pop(0)
+    if action == 'run':
+        # опции сервера только до имени команды
+        socket_path = DEFAULT_SOCKET
+        if args and args[0] == '--socket':
+            socket_path = args[1]
+            args = args[2:]
+        if not args:
+            sys.stderr.write(__doc__)
+            return 2
+        return run(args[0], args[1:], socket_path)
+
+    socket_path = _option(args, '--socket', DEFAULT_SOCKET)
+    if action == 'stop':
+        stop(socket_path)
+        return 0
+
+    corpus_path = _option(args, '--corpus')
+    corpus = SAMPLE_EXPRESSIONS
+    if corpus_path:
+        with open(corpus_path) as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    serve(socket_path, corpus)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from typing import Callable, Dict, Iterable, List, Optional
+
+import click
+from lxml import etree
+from loguru import logger
+
+from src.translator.canonicalForms import CanonicalForms, expressionKey
+from src.translator.toKNF import DNF_SIZE_BUDGET
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+from src.translator.typeInference import InputTypes
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 3
+DMN_EXTENSION = '.dmn'
+# период опроса файлов форм в режиме watch, секунды
+WATCH_INTERVAL = 1.0
+# buildPropDependency импортирует JavaEL_tokenize как скрипт из своей директории
+DEPENDENCY_TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dependencyTable')
+
+BuildReport = namedtuple('BuildReport', ('changed_files', 'translated', 'removed', 'failed'))
+
+
+def _defaultExtractor(xml_file_path: str):
+    # buildPropDependency тянет pandas, networkx и matplotlib, импортируется только при использовании
+    if DEPENDENCY_TABLE_PATH not in sys.path:
+        sys.path.append(DEPENDENCY_TABLE_PATH)
+    from src.dependencyTable.buildPropDependency import extract_prop_dependency_from_file
+    return extract_prop_dependency_from_file(xml_file_path)
+
+
+def expressionHash(expression: str, dnf_budget: int) -> str:
+    """
+    Key of translated expression in manifest, translation depends on DNF budget too
+    :param expression: JavaEL expression
+    :param dnf_budget:
+    :return: hex digest
+    """
+    return hashlib.sha1(f'{dnf_budget}\n{expression}'.encode('utf-8')).hexdigest()
+
+
+def fileHash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decisionIds(definitions: etree.Element) -> List[str]:
+    return [
+        e.get('id') for e in definitions.iter()
+        if isinstance(e.tag, str) and etree.QName(e).localname == 'decision'
+    ]
+
+
+class IncrementalTranslator:
+    """
+    Translates expressions of form files into DMN files of out_dir, one DMN file per unique expression.
+    Manifest keeps file hash -> expressions and expression hash -> DMN file and decision ids,
+    so only new or changed expressions are translated and unchanged DMN files are not rewritten.
+    With canonical forms equivalent expressions share one DMN file.
+    Types of inputs are common for the catalog and kept in manifest, when a new expression widens type of input,
+    DMN files of expressions with this input are rewritten
+    """
+    def __init__(self, out_dir: str, dnf_budget: int = DNF_SIZE_BUDGET,
+                 extractor: Callable[[str], Dict[str, list]] = _defaultExtractor, canonical: bool = False):
+        """
+        :param out_dir: directory of DMN files and manifest
+        :param dnf_budget: max DNF size estimate of one decision
+        :param extractor: extract_prop_dependency_from_file compatible: path -> {form: [ExpressionDependency]}
+        :param canonical: share translation of equivalent expressions and decisions
+        """
+        self.out_dir = out_dir
+        self.dnf_budget = dnf_budget
+        self.extractor = extractor
+        self.forms = CanonicalForms() if canonical else None
+        self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        self.manifest = self._loadManifest()
+        self.types = InputTypes(self.manifest['types'])
+        self._indexManifest()
+
+    def _loadManifest(self) -> dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+            logger.info('Manifest version changed, full rebuild')
+        return {'version': MANIFEST_VERSION, 'files': {}, 'expressions': {}, 'types': {}}
+
+    def _indexManifest(self):
+        """
+        Indexes of manifest, so build walks only expressions of changed files:
+        references count of expression, expressions by canonical key, by DMN file and by input of own DMN file
+        """
+        self.references = Counter(entry[3] for f in self.manifest['files'].values() for entry in f['entries'])
+        self.by_canonical, self.by_file, self.by_input = {}, {}, {}
+        for key, result in self.manifest['expressions'].items():
+            self._index(key, result)
+
+    def _index(self, key: str, result: dict):
+        if result['dmn_file'] is None:
+            return
+        if result.get('canonical') is not None:
+            self.by_canonical.setdefault(result['canonical'], set()).add(key)
+        self.by_file.setdefault(result['dmn_file'], set()).add(key)
+        if result['dmn_file'] == key + DMN_EXTENSION:
+            for name in result['inputs']:
+                self.by_input.setdefault(name, set()).add(key)
+
+    def _unindex(self, key: str, result: dict):
+        for index, names in ((self.by_canonical, [result.get('canonical')]),
+                             (self.by_file, [result['dmn_file']]),
+                             (self.by_input, result['inputs'])):
+            for name in names:
+                keys = index.get(name)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del index[name]
+
+    def _saveManifest(self):
+        self.manifest['types'] = self.types.toDict()
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=1, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def changedFiles(self, paths: Iterable[str]) -> List[str]:
+        """
+        Files with content other than in manifest, mtime is checked first
+        :param paths: form files
+        :return:
+        """
+        changed = []
+        for path in paths:
+            path = os.path.abspath(path)
+            entry = self.manifest['files'].get(path)
+            mtime = os.stat(path).st_mtime_ns
+            if entry is not None and entry['mtime'] == mtime:
+                continue
+            if entry is not None and entry['hash'] == fileHash(path):
+                entry['mtime'] = mtime
+                continue
+            changed.append(path)
+        return changed
+
+    def build(self, paths: Iterable[str]) -> BuildReport:
+        """
+        Translate new and changed expressions of paths, remove DMN files not referenced anymore
+        :param paths: all form files of catalog
+        :return: BuildReport
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        paths = [os.path.abspath(p) for p in paths]
+        changed = self.changedFiles(paths)
+
+        translated, failed, widened, released = [], [], [], set()
+        # выражение, переведенное в этой сборке -> число измененных типов при записи его файла
+        written = {}
+        for path in changed:
+            entries = []
+            for form, dependencies in self.extractor(path).items():
+                for dependency in dependencies:
+                    key = expressionHash(dependency.expression, self.dnf_budget)
+                    entries.append([form, dependency.property, dependency.condition_type, key])
+                    if key in self.manifest['expressions']:
+                        continue
+                    result = self._translate(key, dependency.expression, widened)
+                    written[key] = len(widened)
+                    (translated if result['error'] is None else failed).append(key)
+
+            released.update(self._release(path))
+            self.references.update(entry[3] for entry in entries)
+            self.manifest['files'][path] = {
+                'mtime': os.stat(path).st_mtime_ns,
+                'hash': fileHash(path),
+                'entries': entries,
+            }
+
+        # удаленные из каталога файлы
+        for path in set(self.manifest['files']) - set(paths):
+            released.update(self._release(path))
+            del self.manifest['files'][path]
+            changed.append(path)
+
+        if widened:
+            self._retranslate(widened, written)
+        removed = self._removeUnreferenced(released)
+        if changed:
+            self._saveManifest()
+        return BuildReport(changed, translated, removed, failed)
+
+    def _release(self, path: str) -> List[str]:
+        """
+        Drop references of previous entries of path
+        :param path: form file
+        :return: expression keys referenced by path before
+        """
+        previous = self.manifest['files'].get(path)
+        keys = [entry[3] for entry in previous['entries']] if previous is not None else []
+        self.references.subtract(keys)
+        return keys
+
+    def _canonicalKey(self, expression: str) -> Optional[str]:
+        if self.forms is None:
+            return None
+        try:
+            return expressionKey(expression, self.forms)
+        except Exception:
+            # ошибку сообщит перевод
+            return None
+
+    def _sharedResult(self, canonical_key: Optional[str]) -> Optional[dict]:
+        if canonical_key is None or self.forms.isConstant(canonical_key):
+            return None
+        for key in self.by_canonical.get(canonical_key, ()):
+            return self.manifest['expressions'][key]
+        return None
+
+    def _translate(self, key: str, expression: str, widened: List[str]) -> dict:
+        canonical_key = self._canonicalKey(expression)
+        result = {'expression': expression, 'dmn_file': None, 'decisions': [], 'error': None,
+                  'canonical': canonical_key, 'inputs': []}
+        shared = self._sharedResult(canonical_key)
+        if shared is not None:
+            # эквивалентное выражение уже переведено, его DMN файл общий
+            result['dmn_file'], result['decisions'] = shared['dmn_file'], shared['decisions']
+            result['inputs'] = shared['inputs']
+        else:
+            self._write(key, result, widened)
+        self.manifest['expressions'][key] = result
+        self._index(key, result)
+        return result
+
+    def _write(self, key: str, result: dict, widened: List[str]):
+        expression = result['expression']
+        try:
+            dmn_tree = translate(expression, self.dnf_budget, canonical=self.forms)
+            widened.extend(i for i in DMN_XML.observeTypes(dmn_tree, self.types) if i not in widened)
+            result['inputs'] = sorted(DMN_XML.inputs(dmn_tree))
+            definitions = DMN_XML.visit(dmn_tree, self.types)
+            dmn_file = key + DMN_EXTENSION
+            etree.ElementTree(definitions).write(os.path.join(self.out_dir, dmn_file), pretty_print=True)
+            result['dmn_file'] = dmn_file
+            result['decisions'] = decisionIds(definitions)
+        except Exception as e:
+            # ошибка сохраняется, выражение не переводится повторно до изменения
+            logger.warning(f'{expression}: {type(e).__name__}: {e}')
+            result['error'] = f'{type(e).__name__}: {e}'
+
+    def _retranslate(self, widened: List[str], written: Dict[str, int]):
+        """
+        Rewrite DMN files with inputs of changed type, expressions sharing a file get its new decisions
+        :param widened: inputs with changed type in order of change
+        :param written: expressions written in this build -> count of widened inputs at write,
+            file already has types changed before its write
+        :return:
+        """
+        expressions = self.manifest['expressions']
+        owners = set()
+        for position, name in enumerate(widened):
+            owners.update(key for key in self.by_input.get(name, ()) if written.get(key, 0) <= position)
+        for key in sorted(owners):
+            result = expressions[key]
+            logger.debug(f'type of input changed, retranslate {result["expression"]}')
+            self._unindex(key, result)
+            # повторный перевод не меняет типы: значения входов уже учтены
+            self._write(key, result, [])
+            self._index(key, result)
+            for shared in self.by_file.get(result['dmn_file'], ()):
+                expressions[shared]['decisions'] = result['decisions']
+
+    def _removeUnreferenced(self, released: Iterable[str]) -> List[str]:
+        """
+        Remove expressions not referenced by files anymore and their DMN files
+        :param released: expression keys which lost references in this build
+        :return: removed expression keys
+        """
+        removed = []
+        for key in sorted(released):
+            if self.references[key] > 0 or key not in self.manifest['expressions']:
+                continue
+            del self.references[key]
+            result = self.manifest['expressions'].pop(key)
+            self._unindex(key, result)
+            removed.append(key)
+            # файл эквивалентных выражений удаляется вместе с последним из них
+            dmn_file = result['dmn_file']
+            if dmn_file and dmn_file not in self.by_file and os.path.exists(os.path.join(self.out_dir, dmn_file)):
+                os.remove(os.path.join(self.out_dir, dmn_file))
+        return removed
+
+    def watch(self, paths: List[str], interval: float = WATCH_INTERVAL, iterations: int = None):
+        """
+        Poll form files and rebuild changed ones
+        :param paths: form files
+        :param interval: seconds between polls
+        :param iterations: polls count, None - forever
+        :return:
+        """
+        while iterations is None or iterations > 0:
+            report = self.build(paths)
+            if report.changed_files:
+                logger.info(f'changed {len(report.changed_files)}, translated {len(report.translated)}, '
+                            f'removed {len(report.removed)}, failed {len(report.failed)}')
+            if iterations is not None:
+                iterations -= 1
+            time.sleep(interval)
+
+
+@click.command()
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--out', required=True, help='directory of DMN files and manifest')
+@click.option('--budget', default=DNF_SIZE_BUDGET, type=int, help='DNF size budget of translation')
+@click.option('--watch', is_flag=True, help='rebuild on changes of form files')
+@click.option('--interval', default=WATCH_INTERVAL, type=float, help='seconds between polls in watch mode')
+@click.option('--canonical', is_flag=True, help='one DMN file for equivalent expressions')
+def main(paths, out, budget, watch, interval, canonical):
+    """
+    Translate expressions of form xml files, only new or changed since the last build
+    """
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, level='INFO', format='{level} {message}')
+
+    translator = IncrementalTranslator(out, budget, canonical=canonical)
+    if watch:
+        translator.watch(list(paths), interval)
+    else:
+        report = translator.build(paths)
+        logger.info(f'changed {len(report.changed_files)}, translated {len(report.translated)}, '
+                    f'removed {len(report.removed)}, failed {len(report.failed)}')
+
+
+if __name__ == '__main__':
+    main()
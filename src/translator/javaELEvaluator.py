@@ -0,0 +1,333 @@
+import operator
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from antlr4 import ParserRuleContext, TerminalNode
+
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
+from src.translator.treeFormula import tree
+
+# значение отсутствующего поля
+MISSING = None
+
+EQUALITY_OPERATORS = {'==': operator.eq, 'eq': operator.eq, '!=': operator.ne, 'ne': operator.ne}
+RELATION_OPERATORS = {
+    '>': operator.gt, 'gt': operator.gt,
+    '<': operator.lt, 'lt': operator.lt,
+    '>=': operator.ge, 'ge': operator.ge,
+    '<=': operator.le, 'le': operator.le,
+}
+ARITHMETIC_OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul,
+    '/': operator.truediv, 'div': operator.truediv, '%': operator.mod, 'mod': operator.mod,
+}
+
+Compiled = Callable[[dict], object]
+
+
+def isEmpty(value) -> bool:
+    """
+    JavaEL empty: null, "" and empty collections
+    :param value:
+    :return:
+    """
+    if value is None:
+        return True
+    if isinstance(value, (str, list, tuple, dict, set)):
+        return len(value) == 0
+    return False
+
+
+def toBoolean(value) -> bool:
+    # JavaEL: null -> false, "true" -> true
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+
+def toNumber(value):
+    # JavaEL: null -> 0
+    if value is None or value == '':
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value)
+    return float(text) if '.' in text else int(text)
+
+
+def _coercePair(left, right):
+    # сравнение числа со строкой - как чисел, bool со строкой - как bool
+    if type(left) is type(right) or left is None or right is None:
+        return left, right
+    try:
+        if isinstance(left, bool) or isinstance(right, bool):
+            return toBoolean(left), toBoolean(right)
+        if isinstance(left, (int, float)) or isinstance(right, (int, float)):
+            return toNumber(left), toNumber(right)
+    except ValueError:
+        pass
+    return left, right
+
+
+def equals(left, right) -> bool:
+    left, right = _coercePair(left, right)
+    return left == right
+
+
+def compare(compare_operator: Callable, left, right) -> bool:
+    # null не больше и не меньше ничего
+    if left is None or right is None:
+        return False
+    left, right = _coercePair(left, right)
+    try:
+        return compare_operator(left, right)
+    except TypeError:
+        return False
+
+
+def _item(value, key):
+    if isinstance(value, dict):
+        return value.get(key, MISSING)
+    if value is None:
+        return MISSING
+    try:
+        return value[key]
+    except (KeyError, IndexError, TypeError):
+        return getattr(value, key, MISSING) if isinstance(key, str) else MISSING
+
+
+def _stringLiteral(text: str) -> str:
+    return text[1:-1].encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+def _literal(terminal: TerminalNode):
+    token_type = terminal.symbol.type
+    text = terminal.getText()
+    if token_type == JavaELParser.StringLiteral:
+        return _stringLiteral(text)
+    if token_type == JavaELParser.IntegerLiteral:
+        return int(text)
+    if token_type == JavaELParser.BooleanLiteral:
+        return text == 'true'
+    if token_type == JavaELParser.NullLiteral:
+        return None
+    raise ValueError(f'Not a literal: {text}')
+
+
+def _constant(value) -> Compiled:
+    return lambda record: value
+
+
+def _applyPrefixes(prefixes: List[int], compiled: Compiled) -> Compiled:
+    # ближний к операнду оператор применяется первым
+    for prefix in reversed(prefixes):
+        if prefix == JavaELParser.Not:
+            compiled = (lambda c: lambda record: not toBoolean(c(record)))(compiled)
+        elif prefix == JavaELParser.Empty:
+            compiled = (lambda c: lambda record: isEmpty(c(record)))(compiled)
+        else:
+            compiled = (lambda c: lambda record: -toNumber(c(record)))(compiled)
+    return compiled
+
+
+class JavaELCompiler:
+    """
+    JavaEL tree -> python closure over record: record -> value.
+    Grammar parses prefix operators as (Empty | Not | Minus)+ ternary, so !a and b is !(a and b) in tree.
+    Compiler applies them to the nearest operand as JavaEL does: (!a) and b
+    """
+    def __init__(self, functions: Dict[str, Callable] = None):
+        """
+        :param functions: name -> callable for calls f(x) and x.f()
+        """
+        self.functions = functions or {}
+
+    def compile(self, ctx: ParserRuleContext, prefixes: List[int] = None) -> Compiled:
+        """
+        :param ctx: JavaEL tree
+        :param prefixes: pending prefix operators of the nearest operand
+        :return: closure record -> value
+        """
+        prefixes = prefixes or []
+        while isinstance(ctx, ParserRuleContext) and ctx.getChildCount() == 1 \
+                and not isinstance(ctx, (JavaELParser.ValueContext, JavaELParser.PrimitiveContext)):
+            ctx = ctx.getChild(0)
+
+        if isinstance(ctx, TerminalNode):
+            return _applyPrefixes(prefixes, _constant(_literal(ctx)))
+        if isinstance(ctx, JavaELParser.TernaryContext):
+            return self.compileTernary(ctx, prefixes)
+        if isinstance(ctx, JavaELParser.ExpressionContext):
+            return self.compileLogical(ctx, prefixes, is_and=False)
+        if isinstance(ctx, JavaELParser.TermContext):
+            return self.compileLogical(ctx, prefixes, is_and=True)
+        if isinstance(ctx, (JavaELParser.EqualityContext, JavaELParser.RelationContext)):
+            return self.compileComparison(ctx, prefixes)
+        if isinstance(ctx, (JavaELParser.AlgebraicContext, JavaELParser.MemberContext)):
+            return self.compileArithmetic(ctx, prefixes)
+        if isinstance(ctx, JavaELParser.BaseContext):
+            return self.compileBase(ctx, prefixes)
+        if isinstance(ctx, JavaELParser.ValueContext):
+            return _applyPrefixes(prefixes, self.compileValue(ctx))
+        if isinstance(ctx, JavaELParser.PrimitiveContext):
+            return _applyPrefixes(prefixes, self.compilePrimitive(ctx))
+        raise ValueError(f'Unsupported JavaEL node: {ctx.getText()}')
+
+    def compileTernary(self, ctx: JavaELParser.TernaryContext, prefixes: List[int]) -> Compiled:
+        condition = self.compile(ctx.getChild(0), prefixes)
+        if_true = self.compile(ctx.getChild(2))
+        if_false = self.compile(ctx.getChild(4))
+
+        def ternary(record):
+            return if_true(record) if toBoolean(condition(record)) else if_false(record)
+        return ternary
+
+    def compileLogical(self, ctx: ParserRuleContext, prefixes: List[int], is_and: bool) -> Compiled:
+        operands = [self.compile(ctx.getChild(0), prefixes)]
+        operands.extend(self.compile(c) for c in list(ctx.getChildren())[2::2])
+        operands = tuple(operands)
+
+        if is_and:
+            def logical(record):
+                for o in operands:
+                    if not toBoolean(o(record)):
+                        return False
+                return True
+        else:
+            def logical(record):
+                for o in operands:
+                    if toBoolean(o(record)):
+                        return True
+                return False
+        return logical
+
+    def compileComparison(self, ctx: ParserRuleContext, prefixes: List[int]) -> Compiled:
+        if isinstance(ctx.getChild(0), TerminalNode):
+            # скобки: префиксные операторы применяются ко всему выражению в скобках
+            return _applyPrefixes(prefixes, self.compile(ctx.getChild(1)))
+
+        left = self.compile(ctx.getChild(0), prefixes)
+        right = self.compile(ctx.getChild(2))
+        text = ctx.getChild(1).getText()
+        if text in EQUALITY_OPERATORS:
+            if EQUALITY_OPERATORS[text] is operator.eq:
+                return lambda record: equals(left(record), right(record))
+            return lambda record: not equals(left(record), right(record))
+
+        compare_operator = RELATION_OPERATORS[text]
+        return lambda record: compare(compare_operator, left(record), right(record))
+
+    def compileArithmetic(self, ctx: ParserRuleContext, prefixes: List[int]) -> Compiled:
+        children = list(ctx.getChildren())
+        compiled = self.compile(children[0], prefixes)
+        for i in range(1, len(children), 2):
+            arithmetic_operator = ARITHMETIC_OPERATORS[children[i].getText()]
+            right = self.compile(children[i + 1])
+            compiled = (lambda o, l, r: lambda record: o(toNumber(l(record)), toNumber(r(record))))(
+                arithmetic_operator, compiled, right
+            )
+        return compiled
+
+    def compileBase(self, ctx: JavaELParser.BaseContext, prefixes: List[int]) -> Compiled:
+        children = list(ctx.getChildren())
+        own = [c.symbol.type for c in children[:-1]]
+        return self.compile(children[-1], prefixes + own)
+
+    def compileValue(self, ctx: JavaELParser.ValueContext) -> Compiled:
+        """
+        fields.x, fields['x'], fields[name] -> lookup in record
+        :param ctx:
+        :return:
+        """
+        children = list(ctx.getChildren())
+        compiled = self.compilePrimitive(children[0])
+        i = 1
+        while i < len(children):
+            if children[i].symbol.type == JavaELParser.Dot:
+                member = children[i + 1]
+                if member.getChildCount() > 1:
+                    compiled = self._methodCall(compiled, member)
+                else:
+                    compiled = self._getItem(compiled, _constant(member.getText()))
+                i += 2
+            else:
+                # [ primitive ]
+                key = children[i + 1]
+                if key.getChildCount() == 1 and key.getChild(0).symbol.type != JavaELParser.Identifyer:
+                    compiled = self._getItem(compiled, _constant(_literal(key.getChild(0))))
+                else:
+                    compiled = self._getItem(compiled, self.compilePrimitive(key))
+                i += 3
+        return compiled
+
+    def compilePrimitive(self, ctx: JavaELParser.PrimitiveContext) -> Compiled:
+        if ctx.getChildCount() > 1:
+            name = ctx.getChild(0).getText()
+            function = self._function(name)
+            if ctx.getChildCount() == 3:
+                return lambda record: function()
+            argument = self.compileValue(ctx.getChild(2))
+            return lambda record: function(argument(record))
+
+        terminal = ctx.getChild(0)
+        if terminal.symbol.type == JavaELParser.Identifyer:
+            name = terminal.getText()
+            return lambda record: _item(record, name)
+        return _constant(_literal(terminal))
+
+    def _function(self, name: str) -> Callable:
+        if name not in self.functions:
+            raise ValueError(f'Unknown JavaEL function: {name}')
+        return self.functions[name]
+
+    @staticmethod
+    def _getItem(compiled: Compiled, key: Compiled) -> Compiled:
+        def get_item(record):
+            value = compiled(record)
+            if value.__class__ is dict:
+                return value.get(key(record), MISSING)
+            return _item(value, key(record))
+        return get_item
+
+    def _methodCall(self, compiled: Compiled, member: JavaELParser.PrimitiveContext) -> Compiled:
+        # x.f() -> f(x), x.f(y) -> f(x, y)
+        function = self._function(member.getChild(0).getText())
+        if member.getChildCount() == 3:
+            return lambda record: function(compiled(record))
+        argument = self.compileValue(member.getChild(2))
+        return lambda record: function(compiled(record), argument(record))
+
+
+class CompiledExpression:
+    """
+    Compiled JavaEL condition, evaluated over dict-like records: {'fields': {...}}
+    """
+    def __init__(self, expression: str, functions: Dict[str, Callable] = None):
+        self.expression = expression
+        self.function = JavaELCompiler(functions).compile(tree(expression))
+
+    def __call__(self, record: dict):
+        return self.function(record)
+
+    def evaluateRecords(self, records: Sequence[dict]) -> np.ndarray:
+        """
+        :param records: batch of form states
+        :return: values in order of records
+        """
+        function = self.function
+        return np.array([function(r) for r in records], dtype=object)
+
+
+@lru_cache(maxsize=4096)
+def compileExpression(expression: str) -> CompiledExpression:
+    """
+    Cached compilation of JavaEL expression without functions
+    :param expression:
+    :return:
+    """
+    return CompiledExpression(expression)
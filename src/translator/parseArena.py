@@ -0,0 +1,213 @@
+from array import array
+from typing import List, Tuple
+
+from antlr4 import ParserRuleContext, TerminalNode, Token
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
+
+from src.translator.sourceText import SourceText, sourceOf
+
+# вид вершины - правило нижнего контекста цепочки, TERMINAL - отдельный токен
+TERMINAL = -1
+
+# признаки свернутой цепочки контекстов
+PRIMITIVE_CHAIN = 1   # в цепочке есть primitive: вершина переводится своим текстом без пробелов
+UNIT_BASE = 2         # в цепочке есть base с одним ребенком: простым операндом помечается value под ним
+ZIPPABLE = 4          # в цепочке есть контекст кроме ternary: простая вершина сжимается в op_ id
+SIMPLE_OPERAND = 8    # верхний контекст цепочки - простой операнд по высоте, см. SIMPLE_OPERAND_HEIGHT
+
+# класс контекста -> номер правила
+_RULES = {getattr(JavaELParser, name[0].upper() + name[1:] + 'Context'): i for i, name in enumerate(JavaELParser.ruleNames)}
+# признаки, которые контекст правила дает цепочке
+_CHAIN_FLAGS = [ZIPPABLE] * len(JavaELParser.ruleNames)
+_CHAIN_FLAGS[JavaELParser.RULE_ternary] = 0
+_CHAIN_FLAGS[JavaELParser.RULE_primitive] = ZIPPABLE | PRIMITIVE_CHAIN
+
+# высота простого операнда от ternary до терминала
+SIMPLE_OPERAND_HEIGHT = 10
+
+
+class ParseArena:
+    """
+    ANTLR parse tree copied to flat arrays indexed by node number, nodes are numbered in preorder, root is 0.
+    Chain of contexts with one child (ternary -> expression -> term -> ... -> value -> primitive -> token)
+    becomes one node: its kind is the rule of the lowest context, its span is the span of the chain
+    """
+    __slots__ = ('kinds', 'parents', 'first_child', 'next_sibling', 'starts', 'stops', 'flags', 'types', 'source')
+
+    def __init__(self, root: ParserRuleContext = None):
+        """
+        :param root: parsed expression, usually ternary context returned by tree().
+                     Without root the arena is filled by ArenaBuilder
+        """
+        if root is not None:
+            self._build(root)
+
+    def _build(self, root: ParserRuleContext):
+        builder = ArenaBuilder()
+        rules = _RULES
+        # без синтаксических ошибок у каждого контекста есть токены
+        recovered = root.parser is not None and root.parser.getNumberOfSyntaxErrors() > 0
+
+        stack = [(root, -1, 0)]
+        while stack:
+            ctx, parent, distance = stack.pop()
+            top_distance = distance
+            length = 1
+            kind = TERMINAL
+            node_flags = 0
+            children = ()
+            if isinstance(ctx, TerminalNode):
+                start = stop = ctx.symbol.tokenIndex
+            else:
+                start, stop = (ctx.start.tokenIndex, ctx.stop.tokenIndex) if ctx.start and ctx.stop else (0, -1)
+                while True:
+                    kind = rules[type(ctx)]
+                    node_flags |= _CHAIN_FLAGS[kind]
+                    children = ctx.children
+                    if children is None:
+                        children = ()
+                        break
+                    if recovered:
+                        children = [c for c in children if _hasTokens(c)]
+                    if len(children) != 1:
+                        break
+                    if kind == JavaELParser.RULE_base:
+                        node_flags |= UNIT_BASE
+                    distance = 0 if kind == JavaELParser.RULE_ternary else distance + 1
+                    length += 1
+                    ctx = children[0]
+                    children = ()
+                    if isinstance(ctx, TerminalNode):
+                        break
+
+            node = builder.add(kind, parent, start, stop, node_flags, top_distance, length)
+            if children:
+                child_distance = 0 if kind == JavaELParser.RULE_ternary else distance + 1
+                stack.extend([(child, node, child_distance) for child in reversed(children)])
+
+        tokens = root.parser.getTokenStream().tokens if root.parser else []
+        builder.build(sourceOf(root), array('h', [t.type for t in tokens]), self)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def children(self, node: int):
+        child = self.first_child[node]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def childList(self, node: int) -> List[int]:
+        return list(self.children(node))
+
+    def span(self, node: int) -> Tuple[int, int]:
+        return self.starts[node], self.stops[node]
+
+    def text(self, node: int) -> str:
+        """
+        Tokens of node separated by one space, the same as sourceText.text of its contexts
+        """
+        return self.source.text(self.starts[node], self.stops[node])
+
+    def compactText(self, node: int) -> str:
+        return self.source.compactText(self.starts[node], self.stops[node])
+
+    def tokenType(self, node: int) -> int:
+        """
+        Token type of node ending with one token: terminal or chain down to literal or identifier
+        """
+        return self.types[self.starts[node]]
+
+    def hasTokenType(self, node: int, token_types: tuple) -> bool:
+        types = self.types
+        return any(types[i] in token_types for i in range(self.starts[node], self.stops[node] + 1))
+
+
+def _hasTokens(ctx) -> bool:
+    # токены, вставленные при восстановлении после ошибки, и EOF в арену не попадают
+    if isinstance(ctx, TerminalNode):
+        return ctx.symbol.tokenIndex >= 0 and ctx.symbol.type != Token.EOF
+    return ctx.start is not None and ctx.stop is not None and 0 <= ctx.start.tokenIndex <= ctx.stop.tokenIndex
+
+
+class ArenaBuilder:
+    """
+    Nodes of ParseArena added in preorder: parent before its children, children left to right
+    """
+    __slots__ = ('kinds', 'parents', 'first_child', 'next_sibling', 'starts', 'stops', 'flags',
+                 'distances', 'lengths', '_last_child')
+
+    def __init__(self):
+        self.kinds, self.parents, self.first_child, self.next_sibling = [], [], [], []
+        self.starts, self.stops, self.flags = [], [], []
+        # расстояние верхнего контекста цепочки до родительского ternary и число контекстов в цепочке
+        self.distances, self.lengths = [], []
+        self._last_child = []
+
+    def add(self, kind: int, parent: int, start: int, stop: int, flags: int, distance: int, length: int) -> int:
+        """
+        :param kind: rule of the lowest context of chain or TERMINAL
+        :param parent: parent node, -1 for root
+        :param start: first token
+        :param stop: last token
+        :param flags: PRIMITIVE_CHAIN, UNIT_BASE, ZIPPABLE of chain
+        :param distance: distance of the top context to parent ternary
+        :param length: contexts and terminal in chain
+        :return: node number
+        """
+        node = len(self.kinds)
+        self.kinds.append(kind)
+        self.parents.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self._last_child.append(-1)
+        self.starts.append(start)
+        self.stops.append(stop)
+        self.flags.append(flags)
+        self.distances.append(distance)
+        self.lengths.append(length)
+        if parent >= 0:
+            last = self._last_child[parent]
+            if last < 0:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[last] = node
+            self._last_child[parent] = node
+        return node
+
+    def build(self, source: SourceText, types: array, arena: ParseArena = None) -> ParseArena:
+        """
+        :param source: text of token stream
+        :param types: token types of stream
+        :param arena: arena to fill, new by default
+        :return:
+        """
+        arena = arena if arena is not None else ParseArena()
+        arena.source = source
+        arena.types = types
+        arena.kinds = array('b', self.kinds)
+        arena.parents = array('i', self.parents)
+        arena.first_child = array('i', self.first_child)
+        arena.next_sibling = array('i', self.next_sibling)
+        arena.starts = array('i', self.starts)
+        arena.stops = array('i', self.stops)
+        arena.flags = bytearray(self.flags)
+        self._markSimpleOperands(arena)
+        return arena
+
+    def _markSimpleOperands(self, arena: ParseArena):
+        # высота верхнего контекста цепочки по терминалам, дети нумеруются после родителя
+        kinds, first_child, next_sibling = self.kinds, self.first_child, self.next_sibling
+        heights = [0] * len(kinds)
+        for node in reversed(range(len(kinds))):
+            if kinds[node] == TERMINAL:
+                heights[node] = 1
+                continue
+            height = 1 if first_child[node] < 0 and self.starts[node] <= self.stops[node] else 0
+            child = first_child[node]
+            while child >= 0:
+                height = max(height, heights[child] + 1)
+                child = next_sibling[child]
+            heights[node] = height + self.lengths[node] - 1 if height else 0
+            if node and heights[node] + self.distances[node] == SIMPLE_OPERAND_HEIGHT:
+                arena.flags[node] |= SIMPLE_OPERAND
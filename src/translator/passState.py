@@ -0,0 +1,123 @@
+from array import array
+from typing import Dict, Optional
+
+
+class PassState:
+    """
+    Marks of visitor passes over one parse tree, kept outside of ANTLR contexts.
+    Nodes are numbered once: whole tree in level order or one by one as a pass reaches them,
+    flags are bytes indexed by node number,
+    so passes do not grow dicts of contexts and can be rerun on the same tree with a new state
+    """
+    __slots__ = ('nodes', 'parents', '_index', 'simple', 'visited', 'colors')
+
+    def __init__(self, root=None):
+        """
+        :param root: ParserRuleContext, all visited nodes must be in its subtree.
+                     Without root nodes are numbered by add as a pass reaches them
+        """
+        self.nodes = []
+        self.parents = array('i')
+        self._index = {}
+        self.simple = bytearray()
+        self.visited = bytearray()
+        # номер вершины: dmn id последнего вынесенного в нее поддерева
+        self.colors: Dict[int, str] = {}
+        if root is not None:
+            self._addTree(root)
+
+    def _addTree(self, root):
+        # обход по уровням: дети вершины добавляются в конец уже обходимого списка
+        nodes = [root]
+        parents = [-1]
+        for i, node in enumerate(nodes):
+            children = getattr(node, 'children', None)
+            if children:
+                nodes.extend(children)
+                parents.extend([i] * len(children))
+        self.nodes = nodes
+        self.parents = array('i', parents)
+        self._index = {id(node): i for i, node in enumerate(nodes)}
+        self.simple = bytearray(len(nodes))
+        self.visited = bytearray(len(nodes))
+
+    @classmethod
+    def ofArena(cls, arena) -> 'PassState':
+        """
+        Marks of ParseArena passes: arena node numbers are the node numbers of state
+        :param arena: ParseArena
+        :return:
+        """
+        state = cls()
+        state.nodes = range(len(arena))
+        state.parents = arena.parents
+        state.simple = bytearray(len(arena))
+        state.visited = bytearray(len(arena))
+        return state
+
+    def add(self, node, parent: int = -1) -> int:
+        """
+        Number node if it is not numbered yet
+        :param node: ParserRuleContext or TerminalNode
+        :param parent: number of parent node
+        :return: node number
+        """
+        i = self._index.get(id(node))
+        if i is None:
+            i = len(self.nodes)
+            self._index[id(node)] = i
+            self.nodes.append(node)
+            self.parents.append(parent)
+            self.simple.append(0)
+            self.visited.append(0)
+        return i
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def index(self, ctx) -> int:
+        return self._index[id(ctx)]
+
+    def isSimple(self, ctx) -> bool:
+        return self.simple[self._index[id(ctx)]] == 1
+
+    def setSimple(self, ctx, value: bool = True):
+        self.simple[self._index[id(ctx)]] = value
+
+    def isVisited(self, ctx) -> bool:
+        i = self._index.get(id(ctx))
+        return i is not None and self.visited[i] == 1
+
+    def markVisited(self, ctx):
+        self.visited[self._index[id(ctx)]] = 1
+
+    def addColor(self, ctx, dmn_id: str):
+        """
+        Root of subtree extracted to DMN node is colored by its dmn id
+        :param ctx:
+        :param dmn_id:
+        :return:
+        """
+        self.colors[self._index[id(ctx)]] = dmn_id
+
+    def color(self, ctx) -> Optional[str]:
+        if not self.colors:
+            return None
+        return self.colors.get(self._index.get(id(ctx)))
+
+    def simpleAncestor(self, ctx, boundary: int = -1) -> int:
+        """
+        Nearest marked as simple operand node on the way to root, root itself is not checked
+        :param ctx:
+        :param boundary: number of pass root, the way stops on it
+        :return: node number or -1
+        """
+        return self.simpleAncestorOf(self._index[id(ctx)], boundary)
+
+    def simpleAncestorOf(self, i: int, boundary: int = -1) -> int:
+        parents, simple = self.parents, self.simple
+        while i != boundary and parents[i] >= 0:
+            if simple[i]:
+                return i
+            i = parents[i]
+        return -1
@@ -0,0 +1,365 @@
+import re
+from array import array
+from collections import namedtuple
+from typing import List, Optional
+
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
+
+from src.translator.expressionValidator import ExpressionError
+from src.translator.parseArena import ParseArena, ArenaBuilder, TERMINAL, PRIMITIVE_CHAIN, UNIT_BASE, ZIPPABLE
+from src.translator.sourceText import SourceText
+
+# токен потока: type и text как у antlr4.Token, offset - смещение в выражении
+LexedToken = namedtuple('LexedToken', ('type', 'text', 'offset'))
+
+EOF = -1
+
+TERNARY = JavaELParser.RULE_ternary
+EXPRESSION = JavaELParser.RULE_expression
+EQUALITY = JavaELParser.RULE_equality
+RELATION = JavaELParser.RULE_relation
+MEMBER = JavaELParser.RULE_member
+BASE = JavaELParser.RULE_base
+VALUE = JavaELParser.RULE_value
+PRIMITIVE = JavaELParser.RULE_primitive
+
+# escape последовательности StringLiteral JavaELLexer: \1..\9 недопустимы, HexDigit включает '_'
+_escape = r'''\\(?:[^0-9xu]|0|x[_0-9a-fA-F]{2}|u[_0-9a-fA-F]{4}|u\{[_0-9a-fA-F]+\})'''
+
+# лексемы JavaELLexer, ключевые слова отделяются от имен по тексту
+_token_re = re.compile(rf'''
+    (?P<space>[ \t\r\n]+)
+  | (?P<string>"(?:[^"\\\r\n]|{_escape})*"|'(?:[^'\\\r\n]|{_escape})*')
+  | (?P<name>[A-Za-z_]+[0-9]*[A-Za-z_]*)
+  | (?P<number>0|[1-9][0-9]*)
+  | (?P<operator>&&|\|\||==|!=|>=|<=|[()\[\]!<>.,?:+\-*/%])
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+_TOKEN_TYPES = {
+    '(': JavaELParser.OpenParen, ')': JavaELParser.CloseParen,
+    '[': JavaELParser.OpenBracket, ']': JavaELParser.CloseBracket,
+    'and': JavaELParser.And, '&&': JavaELParser.And,
+    'or': JavaELParser.Or, '||': JavaELParser.Or,
+    'not': JavaELParser.Not, '!': JavaELParser.Not,
+    '==': JavaELParser.Equality, 'eq': JavaELParser.Equality, '!=': JavaELParser.Equality, 'ne': JavaELParser.Equality,
+    '>': JavaELParser.Relation, 'gt': JavaELParser.Relation, '<': JavaELParser.Relation, 'lt': JavaELParser.Relation,
+    '>=': JavaELParser.Relation, 'ge': JavaELParser.Relation, '<=': JavaELParser.Relation, 'le': JavaELParser.Relation,
+    '.': JavaELParser.Dot, ',': JavaELParser.Comma, '?': JavaELParser.Question, ':': JavaELParser.DoubleDots,
+    '+': JavaELParser.Plus, '-': JavaELParser.Minus, '*': JavaELParser.Mul,
+    '/': JavaELParser.Div, 'div': JavaELParser.Div, '%': JavaELParser.Mod, 'mod': JavaELParser.Mod,
+    'empty': JavaELParser.Empty,
+    'true': JavaELParser.BooleanLiteral, 'false': JavaELParser.BooleanLiteral,
+    'null': JavaELParser.NullLiteral,
+}
+
+# тип токена бинарного оператора -> уровень: правило, которое он связывает
+_BINARY_LEVELS = {
+    JavaELParser.Or: JavaELParser.RULE_expression,
+    JavaELParser.And: JavaELParser.RULE_term,
+    JavaELParser.Equality: JavaELParser.RULE_equality,
+    JavaELParser.Relation: JavaELParser.RULE_relation,
+    JavaELParser.Plus: JavaELParser.RULE_algebraic, JavaELParser.Minus: JavaELParser.RULE_algebraic,
+    JavaELParser.Mul: JavaELParser.RULE_member, JavaELParser.Div: JavaELParser.RULE_member,
+    JavaELParser.Mod: JavaELParser.RULE_member,
+}
+# у equality и relation один оператор: a eq b eq c не разбирается
+_SINGLE_OPERATOR_LEVELS = (EQUALITY, RELATION)
+
+_PREFIX_OPERATORS = (JavaELParser.Empty, JavaELParser.Not, JavaELParser.Minus)
+
+_ATOMS = (JavaELParser.StringLiteral, JavaELParser.BooleanLiteral, JavaELParser.NullLiteral,
+          JavaELParser.IntegerLiteral, JavaELParser.Identifyer)
+
+# разборов выражения с разными выборами ternary и цепочек префиксных операторов
+MAX_PARSE_ATTEMPTS = 64
+
+# решения разбора в порядке токенов: цепочка префиксных операторов продолжается (0) или начинает вложенный base (1),
+# ternary забирает ? : (0) или нет (1)
+_PREFIX_RUN, _TERNARY = range(2)
+
+
+class _SyntaxError(Exception):
+    def __init__(self, error: ExpressionError):
+        super(_SyntaxError, self).__init__(error)
+        self.error = error
+
+
+def lex(expression: str, errors: List[ExpressionError]) -> List[LexedToken]:
+    """
+    Tokens of JavaEL expression as JavaELLexer splits it, EOF token is the last.
+    Unknown character or not valid string literal is skipped by one character, as ANTLR lexer does
+    :param expression:
+    :param errors: list for lexer errors
+    :return:
+    """
+    tokens = []
+    position = 0
+    while position < len(expression):
+        m = _token_re.match(expression, position)
+        kind = m.lastgroup
+        value = m.group()
+        position = m.end()
+        if kind == 'space':
+            continue
+        if kind == 'other':
+            errors.append(ExpressionError(m.start(), f"token recognition error at: '{value}'"))
+        elif kind == 'string':
+            tokens.append(LexedToken(JavaELParser.StringLiteral, value, m.start()))
+        elif kind == 'number':
+            tokens.append(LexedToken(JavaELParser.IntegerLiteral, value, m.start()))
+        else:
+            tokens.append(LexedToken(_TOKEN_TYPES.get(value, JavaELParser.Identifyer), value, m.start()))
+    tokens.append(LexedToken(EOF, '<EOF>', len(expression)))
+    return tokens
+
+
+class PrattParser:
+    """
+    Precedence climbing parser of JavaEL: the same rules as JavaELParser, one n-ary node per operator level.
+    Unlike ANTLR parser it requires the whole expression to be parsed:
+    a b, (a) + b, a eq b eq c are errors, not silently truncated expressions.
+    Parse result is emitted to ParseArena equal to ParseArena of ANTLR tree of expression
+    """
+    __slots__ = ('tokens', 'types', 'position', 'plain', 'nested', 'decisions', 'choices', 'runs')
+
+    # промежуточная вершина: (правило нижнего контекста, первый токен, последний токен, дети или None для токена),
+    # ребенок - номер токена или (правило верхнего контекста цепочки, вершина)
+
+    def __init__(self, tokens: List[LexedToken]):
+        self.tokens = tokens
+        self.types = [token.type for token in tokens]
+        self.position = 0
+        # выбор разбора: первые токены ternary, которые не забирают следующий ? :,
+        # префиксные операторы, которые начинают вложенный base вместо продолжения цепочки
+        self.plain = frozenset()
+        self.nested = frozenset()
+        # решения разбора и точки, где возможен другой выбор
+        self.decisions = []
+        self.choices = []
+        self.runs = []
+
+    def parse(self) -> tuple:
+        """
+        ANTLR makes decisions in order of tokens and takes the first alternative whenever the rest
+        of expression can still be parsed: ! a ? b : c is (! a) ? b : c, ! a ? b : c ? d : e is (! (a ? b : c)) ? d : e.
+        Only a ternary at the end of condition of outer ternary (operand of prefix operator or its else branch)
+        may leave ? : to the outer one, such choices are searched and the best parse is kept.
+        Prefix operators ! ! a are split to nested bases only if expression is not parsed otherwise
+        :return: root node of expression
+        :raises _SyntaxError: syntax error of the first attempt
+        """
+        first_error = None
+        best = best_key = None
+        pending = [(frozenset(), frozenset())]
+        # вложенные base пробуются, только если разбор без них не найден
+        deferred = []
+        seen = set(pending)
+        attempts = 0
+        while attempts < MAX_PARSE_ATTEMPTS:
+            if not pending:
+                if best is not None or not deferred:
+                    break
+                pending, deferred = deferred, []
+            attempts += 1
+            self.plain, self.nested = pending.pop()
+            self.decisions, self.choices, self.runs = [], [], []
+            self.position = 0
+            try:
+                root = self.parseTernary()
+                if self.types[self.position] != EOF:
+                    raise self._unexpected('end of expression expected')
+                key = tuple(sorted(self.decisions))
+                if best_key is None or key < best_key:
+                    best, best_key = root, key
+            except RecursionError:
+                raise _SyntaxError(ExpressionError(0, 'expression is too deeply nested'))
+            except _SyntaxError as e:
+                first_error = first_error or e
+            for choice in self.choices:
+                self._addChoice((self.plain | {choice}, self.nested), pending, seen)
+            for run in self.runs:
+                self._addChoice((self.plain, self.nested | {run}), deferred, seen)
+        if best is None:
+            raise first_error
+        return best
+
+    @staticmethod
+    def _addChoice(choice: tuple, queue: list, seen: set):
+        if choice not in seen:
+            seen.add(choice)
+            queue.append(choice)
+
+    def parseTernary(self, linked: bool = False) -> tuple:
+        """
+        :param linked: ternary ends together with condition of outer ternary, ? after it can be taken by outer one
+        :return:
+        """
+        start = self.position
+        condition = self.parseBinary(EXPRESSION)
+        if self.types[self.position] != JavaELParser.Question or start in self.plain:
+            self.decisions.append((start, _TERNARY, 1))
+            return condition
+        self.decisions.append((start, _TERNARY, 0))
+        if linked:
+            self.choices.append(start)
+        children = [(EXPRESSION, condition), self._advance()]
+        children.append((TERNARY, self.parseTernary()))
+        children.append(self._expect(JavaELParser.DoubleDots, "':'"))
+        children.append((TERNARY, self.parseTernary(linked)))
+        return TERNARY, start, self.position - 1, children
+
+    def parseBinary(self, min_level: int) -> tuple:
+        """
+        Operand of operator of level min_level - 1: operators of levels >= min_level and their operands
+        :param min_level: rule of the top context of result
+        :return:
+        """
+        start = self.position
+        types = self.types
+        if types[start] == JavaELParser.OpenParen and min_level <= RELATION:
+            node = self.parseGroup()
+        else:
+            node = self.parseUnary()
+        while True:
+            level = _BINARY_LEVELS.get(types[self.position])
+            # оператор связывает только операнд более глубокого правила
+            if level is None or level < min_level or level >= node[0]:
+                return node
+            children = [(level + 1, node)]
+            while _BINARY_LEVELS.get(types[self.position]) == level:
+                children.append(self._advance())
+                children.append((level + 1, self.parseBinary(level + 1)))
+                if level in _SINGLE_OPERATOR_LEVELS:
+                    break
+            node = level, start, self.position - 1, children
+
+    def parseGroup(self) -> tuple:
+        # relation: ( ternary )
+        start = self.position
+        children = [self._advance(), (TERNARY, self.parseTernary()), self._expect(JavaELParser.CloseParen, "')'")]
+        return RELATION, start, self.position - 1, children
+
+    def parseUnary(self) -> tuple:
+        # base: (empty | not | -)+ ternary - оператор относится ко всему ternary справа
+        start = self.position
+        if self.types[start] not in _PREFIX_OPERATORS:
+            return self.parseValue()
+        children = [self._advance()]
+        while self.types[self.position] in _PREFIX_OPERATORS:
+            if self.position in self.nested:
+                # ! ! a eq b ne c: второй оператор начинает ternary вложенного base
+                self.decisions.append((self.position, _PREFIX_RUN, 1))
+                break
+            self.decisions.append((self.position, _PREFIX_RUN, 0))
+            self.runs.append(self.position)
+            children.append(self._advance())
+        children.append((TERNARY, self.parseTernary(linked=True)))
+        return BASE, start, self.position - 1, children
+
+    def parseValue(self) -> tuple:
+        # value: primitive (. primitive | [ primitive ])*
+        start = self.position
+        types = self.types
+        node = self.parsePrimitive()
+        children = [(PRIMITIVE, node)]
+        while types[self.position] in (JavaELParser.Dot, JavaELParser.OpenBracket):
+            if types[self.position] == JavaELParser.Dot:
+                children.append(self._advance())
+                children.append((PRIMITIVE, self.parsePrimitive()))
+            else:
+                children.append(self._advance())
+                children.append((PRIMITIVE, self.parsePrimitive()))
+                children.append(self._expect(JavaELParser.CloseBracket, "']'"))
+        if len(children) == 1:
+            return node
+        return VALUE, start, self.position - 1, children
+
+    def parsePrimitive(self) -> tuple:
+        # primitive: literal | name | primitive ( value? )
+        start = self.position
+        if self.types[start] not in _ATOMS:
+            raise self._unexpected('operand expected')
+        self.position += 1
+        node = PRIMITIVE, start, start, None
+        while self.types[self.position] == JavaELParser.OpenParen:
+            children = [(PRIMITIVE, node), self._advance()]
+            if self.types[self.position] != JavaELParser.CloseParen:
+                children.append((VALUE, self.parseValue()))
+            children.append(self._expect(JavaELParser.CloseParen, "')'"))
+            node = PRIMITIVE, start, self.position - 1, children
+        return node
+
+    def _advance(self) -> int:
+        self.position += 1
+        return self.position - 1
+
+    def _expect(self, token_type: int, expected: str) -> int:
+        if self.types[self.position] != token_type:
+            raise self._unexpected(f'{expected} expected')
+        return self._advance()
+
+    def _unexpected(self, message: str) -> _SyntaxError:
+        token = self.tokens[self.position]
+        found = 'end of expression' if token.type == EOF else f"'{token.text}'"
+        return _SyntaxError(ExpressionError(token.offset, f'unexpected {found}, {message}'))
+
+    def emit(self, root: tuple) -> ParseArena:
+        """
+        ParseArena of parsed expression, without recursion
+        :param root: node returned by parse
+        :return:
+        """
+        builder = ArenaBuilder()
+        # (правило верхнего контекста, вершина или номер токена, родитель в арене, расстояние верхнего контекста до ternary)
+        stack = [(TERNARY, root, -1, 0)]
+        while stack:
+            top, node, parent, distance = stack.pop()
+            if isinstance(node, int):
+                builder.add(TERMINAL, parent, node, node, 0, distance, 1)
+                continue
+            bottom, start, stop, children = node
+            # цепочка контекстов top..bottom, лист заканчивается токеном
+            length = bottom - top + 1 + (children is None)
+            if top == TERNARY < bottom:
+                bottom_distance = bottom - 1
+            else:
+                bottom_distance = distance + bottom - top
+            flags = 0
+            if bottom > TERNARY:
+                flags |= ZIPPABLE
+            if bottom == PRIMITIVE:
+                flags |= PRIMITIVE_CHAIN
+            if top <= BASE < bottom:
+                flags |= UNIT_BASE
+            arena_node = builder.add(bottom, parent, start, stop, flags, distance, length)
+            if children:
+                child_distance = 0 if bottom == TERNARY else bottom_distance + 1
+                for child in reversed(children):
+                    if isinstance(child, int):
+                        stack.append((TERMINAL, child, arena_node, child_distance))
+                    else:
+                        stack.append((child[0], child[1], arena_node, child_distance))
+        return builder.build(SourceText(self.tokens), array('h', self.types))
+
+
+def parse(expression: str, errors: List[ExpressionError] = None) -> Optional[ParseArena]:
+    """
+    Parse JavaEL expression without ANTLR
+    :param expression:
+    :param errors: list for lexer errors and the first syntax error with offsets
+    :return: ParseArena of expression, None if expression has errors
+    """
+    errors = [] if errors is None else errors
+    lexer_errors = []
+    tokens = lex(expression, lexer_errors)
+    if lexer_errors:
+        errors.extend(lexer_errors)
+        return None
+    parser = PrattParser(tokens)
+    try:
+        root = parser.parse()
+    except _SyntaxError as e:
+        errors.append(e.error)
+        return None
+    return parser.emit(root)
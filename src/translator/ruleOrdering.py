@@ -0,0 +1,253 @@
+import json
+import sys
+from collections import namedtuple
+from typing import Dict, List, Sequence, Optional
+
+import click
+import numpy as np
+from lxml import etree
+from loguru import logger
+
+from src.translator.dmnEvaluator import DMNEvaluator, columnsFromRecords, splitUnaryTests
+from src.translator.rulePruning import RuleSpace, literalOf
+
+FIRST, UNIQUE, ANY = 'FIRST', 'UNIQUE', 'ANY'
+
+# вычисления ячеек на запись до и после оптимизации таблицы
+TableOrdering = namedtuple('TableOrdering', ('decision', 'hitPolicy', 'before', 'after'))
+# маски ячеек строки на выборке, None - ячейка "любое"
+RuleMasks = List[Optional[np.ndarray]]
+
+
+def _localName(element: etree.Element) -> str:
+    return etree.QName(element).localname if isinstance(element.tag, str) else ''
+
+
+def _childrenNamed(element: etree.Element, name: str) -> List[etree.Element]:
+    return [c for c in element if _localName(c) == name]
+
+
+def _entryText(element: etree.Element) -> str:
+    texts = _childrenNamed(element, 'text')
+    return (texts[0].text or '').strip() if texts else ''
+
+
+def ruleClauses(space: RuleSpace, inputs: Sequence[str], entries: Sequence[str]) -> List[tuple]:
+    """
+    Rule as CNF over cells of RuleSpace: one clause of alternatives per tested input.
+    Tests unknown to RuleSpace are free variables, so rules are exclusive only if it follows from literals
+    :param space: variables of table
+    :param inputs: input expressions
+    :param entries: input entries of rule
+    :return: clauses
+    """
+    clauses = []
+    for input_name, entry in zip(inputs, entries):
+        if entry in ('', '-'):
+            continue
+        alternatives = []
+        for test in splitUnaryTests(entry):
+            literal = literalOf(test)
+            alternatives.append(space.variable(input_name, literal) if literal is not None
+                                else space.cellLiteral((input_name, test)))
+        clauses.append(tuple(alternatives))
+    return clauses
+
+
+def expectedEvaluations(masks: Sequence[RuleMasks], rules: Sequence[int], columns: Sequence[int],
+                        first: bool) -> float:
+    """
+    Mean count of evaluated input entries per record: entries of rule are evaluated in columns order
+    until one fails, FIRST stops at the first matched rule, other hit policies evaluate all rules
+    :param masks: masks of entries of rules on sample records
+    :param rules: order of rules
+    :param columns: order of inputs
+    :param first: FIRST hit policy
+    :return:
+    """
+    size = next((len(m) for rule in masks for m in rule if m is not None), 0)
+    if not size:
+        return 0.0
+    alive = np.ones(size, dtype=bool)
+    evaluations = 0
+    for rule in rules:
+        passing = alive.copy()
+        for column in columns:
+            mask = masks[rule][column]
+            if mask is not None:
+                evaluations += int(passing.sum())
+                passing &= mask
+        if first:
+            alive &= ~passing
+    return evaluations / size
+
+
+def selectiveColumns(masks: Sequence[RuleMasks], count: int) -> List[int]:
+    """
+    Inputs ordered by mean pass rate of their tested entries, the most selective first,
+    inputs without tests are the last
+    :param masks: masks of entries of rules on sample records
+    :param count: inputs count
+    :return: order of inputs
+    """
+    def passRate(column: int) -> float:
+        rates = [rule[column].mean() for rule in masks if rule[column] is not None and len(rule[column])]
+        return float(np.mean(rates)) if rates else 2.0
+    return sorted(range(count), key=lambda column: (passRate(column), column))
+
+
+def orderRules(masks: Sequence[RuleMasks], columns: Sequence[int], before: Dict[int, set]) -> List[int]:
+    """
+    Rules by match probability per evaluated entry, the best available rule first.
+    Rule goes only after all rules of before[rule]
+    :param masks: masks of entries of rules on sample records
+    :param columns: order of inputs
+    :param before: rule -> rules which must stay before it
+    :return: order of rules
+    """
+    scores = []
+    for rule in range(len(masks)):
+        cost = expectedEvaluations(masks, [rule], columns, True)
+        matched = np.ones(1, dtype=bool)
+        for mask in masks[rule]:
+            if mask is not None:
+                matched = matched & mask
+        probability = float(matched.mean())
+        scores.append(probability / cost if cost else probability)
+
+    order, placed = [], set()
+    while len(order) < len(masks):
+        available = [r for r in range(len(masks)) if r not in placed and before[r] <= placed]
+        rule = max(available, key=lambda r: (scores[r], -r))
+        order.append(rule)
+        placed.add(rule)
+    return order
+
+
+class TableOptimizer:
+    """
+    Hit policy and order of rules and inputs of one decision table.
+    Rules with different outputs which can match together keep their order under FIRST,
+    other rules are reordered freely; without such pairs UNIQUE or ANY is kept if FIRST does not save evaluations
+    """
+    def __init__(self, inputs: Sequence[str], rules: Sequence[tuple], masks: Sequence[RuleMasks]):
+        """
+        :param inputs: input expressions
+        :param rules: (input entries, output entry) of rules in table order
+        :param masks: masks of entries of rules on sample records
+        """
+        self.inputs = list(inputs)
+        self.rules = list(rules)
+        self.masks = masks
+
+        space = RuleSpace()
+        clauses = [ruleClauses(space, self.inputs, entries) for entries, _ in self.rules]
+        self.exclusive = set()
+        self.before = {i: set() for i in range(len(self.rules))}
+        for i in range(len(self.rules)):
+            for j in range(i + 1, len(self.rules)):
+                if not space.satisfiable([], clauses[i] + clauses[j]):
+                    self.exclusive.add((i, j))
+                elif self.rules[i][1] != self.rules[j][1]:
+                    # порядок строк с разным результатом определяет результат FIRST
+                    self.before[j].add(i)
+
+    def hitPolicy(self, first_cost: float, all_cost: float) -> str:
+        if any(self.before.values()):
+            return FIRST
+        pairs = len(self.rules) * (len(self.rules) - 1) // 2
+        declarative = UNIQUE if len(self.exclusive) == pairs else ANY
+        return FIRST if first_cost < all_cost else declarative
+
+    def optimize(self, hit_policy: str) -> tuple:
+        """
+        :param hit_policy: current hit policy of table
+        :return: hit policy, order of rules, order of inputs, evaluations before and after
+        """
+        identity_rules, identity_columns = list(range(len(self.rules))), list(range(len(self.inputs)))
+        before = expectedEvaluations(self.masks, identity_rules, identity_columns, hit_policy == FIRST)
+
+        columns = selectiveColumns(self.masks, len(self.inputs))
+        rules = orderRules(self.masks, columns, self.before)
+        first_cost = expectedEvaluations(self.masks, rules, columns, True)
+        all_cost = expectedEvaluations(self.masks, rules, columns, False)
+        policy = self.hitPolicy(first_cost, all_cost)
+        after = first_cost if policy == FIRST else all_cost
+        if after > before:
+            # выборка не подтверждает выигрыш, порядок не меняется
+            if any(self.before.values()):
+                # пересекающиеся строки с разным результатом верны только при FIRST
+                return FIRST, identity_rules, identity_columns, before, \
+                    expectedEvaluations(self.masks, identity_rules, identity_columns, True)
+            return hit_policy, identity_rules, identity_columns, before, before
+        return policy, rules, columns, before, after
+
+
+def optimizeTables(definitions: etree.Element, columns: Dict[str, Sequence]) -> List[TableOrdering]:
+    """
+    Choose hit policy and reorder rules and inputs of every decision table of DRD by sample records,
+    result of every decision stays the same. Definitions are changed in place
+    :param definitions: DRD built by DMN_XML
+    :param columns: {input expression: values} of sample records, see columnsFromRecords
+    :return: TableOrdering of decisions
+    """
+    evaluator = DMNEvaluator(definitions)
+    masks = evaluator.ruleMasks(columns)
+    report = []
+    for decision in _childrenNamed(definitions, 'decision'):
+        table = _childrenNamed(decision, 'decisionTable')[0]
+        inputs = _childrenNamed(table, 'input')
+        rule_tags = _childrenNamed(table, 'rule')
+        rules = []
+        for rule in rule_tags:
+            outputs = _childrenNamed(rule, 'outputEntry')
+            rules.append(([_entryText(e) for e in _childrenNamed(rule, 'inputEntry')],
+                          _entryText(outputs[0]) if outputs else ''))
+        expressions = [_entryText(_childrenNamed(i, 'inputExpression')[0]) for i in inputs]
+
+        optimizer = TableOptimizer(expressions, rules, masks[decision.get('id')])
+        policy, rule_order, column_order, before, after = optimizer.optimize(table.get('hitPolicy', UNIQUE))
+        table.set('hitPolicy', policy)
+        _reorder(table, inputs, column_order)
+        _reorder(table, rule_tags, rule_order)
+        for rule in rule_tags:
+            _reorder(rule, _childrenNamed(rule, 'inputEntry'), column_order)
+        report.append(TableOrdering(decision.get('id'), policy, before, after))
+        logger.debug(f'{decision.get("id")}: {policy}, evaluations {before:.2f} -> {after:.2f}')
+    return report
+
+
+def _reorder(parent: etree.Element, children: List[etree.Element], order: Sequence[int]):
+    # элементы занимают те же места среди остальных детей
+    positions = [parent.index(c) for c in children]
+    for c in children:
+        parent.remove(c)
+    for position, index in sorted(zip(positions, order)):
+        parent.insert(position, children[index])
+
+
+@click.command()
+@click.argument('dmn_path')
+@click.argument('records_path')
+@click.option('--out', default=None, help='optimized DMN file, by default dmn_path is rewritten')
+def main(dmn_path, records_path, out):
+    """
+    Order rules and inputs and choose hit policies of DMN file by sample records, one JSON record per line
+    """
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, level='INFO', format='{level} {message}')
+
+    definitions = etree.parse(dmn_path).getroot()
+    with open(records_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    columns = columnsFromRecords(records, DMNEvaluator(definitions).inputExpressions())
+    report = optimizeTables(definitions, columns)
+    for table in report:
+        logger.info(f'{table.decision}: {table.hitPolicy}, evaluations per record {table.before:.2f} -> '
+                    f'{table.after:.2f}')
+    etree.ElementTree(definitions).write(out or dmn_path, pretty_print=True)
+
+
+if __name__ == '__main__':
+    main()
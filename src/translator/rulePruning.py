@@ -0,0 +1,198 @@
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Tuple, Optional
+
+from pyeda.boolalg import picosat
+
+# ячейка строки до сборки таблицы: вход и его unary test
+RowCell = Tuple[str, str]
+Row = Tuple[List[RowCell], Optional[str]]
+
+EQUALITY_TEST_RE = re.compile(r'^=\s*(.+)$')
+NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+STRING_RE = re.compile(r'^"(?:[^"\\]|\\.)*"$')
+SPACES_RE = re.compile(r'("(?:[^"\\]|\\.)*")|\s+')
+
+# значение литерала: (тип, значение), типы сравниваются по правилам JavaEL
+Literal = namedtuple('Literal', ('kind', 'value'))
+NULL = Literal('null', None)
+TRUE = Literal('boolean', True)
+
+PruneStats = namedtuple('PruneStats', ('rows', 'unsatisfiable', 'subsumed', 'cells'))
+
+
+def literalOf(text: str) -> Optional[Literal]:
+    """
+    FEEL literal of cell -> Literal, other expressions -> None
+    "a" -> ('string', 'a'), 1.50 -> ('number', Decimal('1.5')), true -> ('boolean', True)
+    :param text:
+    :return:
+    """
+    text = text.strip()
+    if text == 'null':
+        return NULL
+    if text in ('true', 'false'):
+        return Literal('boolean', text == 'true')
+    if NUMBER_RE.match(text):
+        return Literal('number', Decimal(text).normalize())
+    if STRING_RE.match(text):
+        return Literal('string', text[1:-1])
+    return None
+
+
+def _asNumber(value: str) -> Optional[Decimal]:
+    try:
+        return Decimal(value.strip()).normalize()
+    except InvalidOperation:
+        return None
+
+
+def compatible(first: Literal, second: Literal) -> bool:
+    """
+    Input can be equal to both literals. JavaEL eq returns false for null and other value,
+    coerces string to number or boolean, number and boolean are not comparable
+    :param first:
+    :param second:
+    :return:
+    """
+    if first == second:
+        return True
+    if first.kind == second.kind or NULL in (first, second):
+        return False
+    kinds = {first.kind: first.value, second.kind: second.value}
+    if 'string' not in kinds:
+        return False
+    if 'number' in kinds:
+        return _asNumber(kinds['string']) == kinds['number']
+    return kinds['string'].lower() == str(kinds['boolean']).lower()
+
+
+class RuleSpace:
+    """
+    Cells of decision table rows as SAT variables. Variable is input equal to literal or other test of input,
+    equality variables of one input with incompatible literals exclude each other
+    """
+    def __init__(self):
+        self.variables = {}
+        self.literals = {}
+        self.clauses = []
+
+    def variable(self, input_name: str, test) -> int:
+        key = (input_name, test)
+        if key not in self.variables:
+            variable = len(self.variables) + 1
+            self.variables[key] = variable
+            if isinstance(test, Literal):
+                # новое значение входа исключает несовместимые с ним значения
+                literals = self.literals.setdefault(input_name, {})
+                for other, other_variable in literals.items():
+                    if not compatible(test, other):
+                        self.clauses.append((-variable, -other_variable))
+                literals[test] = variable
+        return self.variables[key]
+
+    def cellLiteral(self, cell: RowCell) -> int:
+        """
+        :param cell: input and unary test
+        :return: SAT literal of cell
+        """
+        input_name, test = cell
+        compact, name = normalizedTest(test), _compact(input_name)
+        if isBare(input_name, compact):
+            # одиночный операнд в логическом выражении приводится к true
+            return self.variable(input_name, TRUE)
+        if compact in ('not(' + name + ')', 'not((' + name + '))'):
+            return -self.variable(input_name, TRUE)
+        equality = EQUALITY_TEST_RE.match(compact)
+        literal = literalOf(equality.group(1)) if equality else None
+        if literal is not None:
+            return self.variable(input_name, literal)
+        return self.variable(input_name, compact)
+
+    def satisfiable(self, assumptions: List[int], clauses: List[tuple] = ()) -> bool:
+        return picosat.satisfy_one(len(self.variables), self.clauses + list(clauses),
+                                   assumptions=assumptions) is not None
+
+
+def _compact(text: str) -> str:
+    # пробелы внутри строковых литералов сохраняются
+    return SPACES_RE.sub(lambda m: m.group(1) or '', text)
+
+
+def _balanced(test: str) -> str:
+    # ячейки строки делятся по тексту, скобки строки остаются у первой и последней ячейки
+    while test.startswith('(') and test.count('(') > test.count(')'):
+        test = test[1:]
+    while test.endswith(')') and test.count(')') > test.count('('):
+        test = test[:-1]
+    return test
+
+
+def normalizedTest(test: str) -> str:
+    """
+    Unary test of row cell without spaces outside strings and without unmatched brackets
+    :param test:
+    :return:
+    """
+    return _balanced(_compact(test))
+
+
+def isBare(input_name: str, test: str) -> bool:
+    """
+    Cell is the input itself: operand of logical operator, its value is coerced to boolean
+    :param input_name:
+    :param test: normalizedTest of cell
+    :return:
+    """
+    return not test or test == _compact(input_name)
+
+
+def _rowInputs(literals: Dict[int, RowCell]) -> set:
+    return {cell[0] for cell in literals.values()}
+
+
+def pruneRows(rows: List[Row], stats: list = None) -> List[Row]:
+    """
+    Drop rows which are false for every value of inputs and rows implied by an earlier row with the same output:
+    empty x and x eq "Y", x eq "a" and x eq "b" -> removed.
+    Cells implied by other cells of row are removed too: x eq "a" and !(x eq "b") -> x eq "a"
+    :param rows: cells and output of rows in table order
+    :param stats: list to append PruneStats of table
+    :return: rows
+    """
+    space = RuleSpace()
+    encoded = []
+    removed_cells = 0
+    for cells, output in rows:
+        literals = {}
+        for cell in cells:
+            literals.setdefault(space.cellLiteral(cell), cell)
+        removed_cells += len(cells) - len(literals)
+        encoded.append((literals, output))
+
+    kept = []
+    unsatisfiable = subsumed = 0
+    for literals, output in encoded:
+        assumptions = list(literals)
+        if not space.satisfiable(assumptions):
+            unsatisfiable += 1
+            continue
+        # строка следует из более ранней: row and not earlier невыполнимо
+        inputs = _rowInputs(literals)
+        if any(earlier_output == output and _rowInputs(earlier) <= inputs
+               and not space.satisfiable(assumptions, [tuple(-x for x in earlier)])
+               for earlier, earlier_output in kept):
+            subsumed += 1
+            continue
+        # ячейка лишняя, если следует из остальных ячеек строки
+        for literal in list(literals):
+            others = [x for x in literals if x != literal]
+            if not space.satisfiable(others + [-literal]):
+                del literals[literal]
+                removed_cells += 1
+        kept.append((literals, output))
+
+    if stats is not None:
+        stats.append(PruneStats(len(rows), unsatisfiable, subsumed, removed_cells))
+    return [(list(literals.values()), output) for literals, output in kept]
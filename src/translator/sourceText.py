@@ -0,0 +1,138 @@
+import weakref
+from typing import List, Tuple, Optional
+
+from antlr4 import ParserRuleContext, TerminalNode, Token
+
+# поток токенов: SourceText, строится один раз на разобранное выражение
+_sources = weakref.WeakKeyDictionary()
+
+
+class SourceText:
+    """
+    Text of token stream built once: tokens joined by space and without separators,
+    with offsets of each token, so text of any context is one slice
+    """
+    def __init__(self, tokens: List[Token]):
+        spaced, compact = [], []
+        self.spaced_starts, self.spaced_ends = [], []
+        self.compact_starts, self.compact_ends = [], []
+
+        spaced_position = compact_position = 0
+        for token in tokens:
+            if token.type == Token.EOF:
+                break
+            text = token.text
+            self.spaced_starts.append(spaced_position)
+            self.compact_starts.append(compact_position)
+            spaced_position += len(text)
+            compact_position += len(text)
+            self.spaced_ends.append(spaced_position)
+            self.compact_ends.append(compact_position)
+            # разделитель
+            spaced_position += 1
+            spaced.append(text)
+            compact.append(text)
+
+        self.spaced = ' '.join(spaced)
+        self.compact = ''.join(compact)
+
+    def __len__(self):
+        return len(self.spaced_starts)
+
+    def text(self, start: int, stop: int) -> str:
+        return self.spaced[self.spaced_starts[start]:self.spaced_ends[stop]]
+
+    def compactText(self, start: int, stop: int) -> str:
+        return self.compact[self.compact_starts[start]:self.compact_ends[stop]]
+
+    def rewrite(self, start: int, stop: int, edits: List[Tuple[int, int, str]]) -> str:
+        """
+        Text of tokens start..stop with token ranges replaced, one pass over edits
+        :param start: first token index
+        :param stop: last token index
+        :param edits: not overlapping (first token, last token, replacement)
+        :return: tokens and replacements separated by one space
+        """
+        parts = []
+        current = start
+        for edit_start, edit_stop, replacement in sorted(edits):
+            if edit_start > current:
+                parts.append(self.text(current, edit_start - 1))
+            parts.append(replacement)
+            current = edit_stop + 1
+        if current <= stop:
+            parts.append(self.text(current, stop))
+        return ' '.join(parts)
+
+
+def sourceOf(ctx) -> Optional[SourceText]:
+    """
+    SourceText of token stream of context
+    :param ctx: ParserRuleContext or TerminalNode
+    :return: None if context has no parser
+    """
+    interval = _interval(ctx)
+    return interval[0] if interval else None
+
+
+def _interval(ctx) -> Optional[tuple]:
+    """
+    Token indexes of context and its SourceText, None if context has not contiguous tokens of stream
+    :param ctx: ParserRuleContext or TerminalNode
+    :return: (SourceText, start, stop) or None
+    """
+    if isinstance(ctx, TerminalNode):
+        start = stop = ctx.symbol
+        owner = ctx.parentCtx
+    else:
+        start, stop = ctx.start, ctx.stop
+        owner = ctx
+    parser = getattr(owner, 'parser', None)
+    if parser is None or start is None or stop is None or start.tokenIndex < 0 \
+            or stop.tokenIndex < start.tokenIndex or stop.type == Token.EOF:
+        return None
+
+    stream = parser.getTokenStream()
+    source = _sources.get(stream)
+    if source is None or len(source) <= stop.tokenIndex:
+        source = SourceText(stream.tokens)
+        _sources[stream] = source
+    return source, start.tokenIndex, stop.tokenIndex
+
+
+def _terminals(ctx) -> List[str]:
+    result = []
+    stack = [ctx]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, TerminalNode):
+            result.append(node.getText())
+        else:
+            stack.extend(reversed(list(node.getChildren())))
+    return result
+
+
+def text(ctx) -> str:
+    """
+    Tokens of context separated by one space: fields [ 'a' ] eq true
+    :param ctx: ParserRuleContext or TerminalNode
+    :return:
+    """
+    interval = _interval(ctx)
+    if interval is None:
+        return ' '.join(_terminals(ctx))
+    source, start, stop = interval
+    return source.text(start, stop)
+
+
+def compactText(ctx) -> str:
+    """
+    Tokens of context without separators, the same as ctx.getText(): fields['a']eqtrue
+    :param ctx: ParserRuleContext or TerminalNode
+    :return:
+    """
+    interval = _interval(ctx)
+    if interval is None:
+        return ''.join(_terminals(ctx))
+    source, start, stop = interval
+    return source.compactText(start, stop)
@@ -1,6 +1,8 @@
-from typing import Dict, Set
+from typing import Dict, List, Set, Tuple, Optional
+from collections import namedtuple
+from functools import lru_cache
 
-from src.dependencyTable.checkBrackets import *
+from src.translator.expressionValidator import checkExpression
 import re
 from pyeda.boolalg import expr
 
@@ -14,78 +16,402 @@ from pyeda.boolalg import expr
 # result = re.split(r"\s+", text) # Разделение строки на элементы
 dirty_operands_01 = []
 
+# максимальная оценка числа конъюнкций ДНФ, после которой формула дробится на промежуточные решения
+DNF_SIZE_BUDGET = 256
+AUX_VARIABLE_PREFIX = 'aux'
+
+DMNReady = namedtuple('DMNReady', ('rows', 'intermediates'))
+
+# формы формул с готовыми ДНФ, переменные формы нумеруются по первому вхождению
+SHAPE_CACHE_SIZE = 4096
+SHAPE_VARIABLE_PREFIX = 'op_'
+
+
+def _operatorOperands(formula: expr.Expression) -> tuple:
+    if isinstance(formula, (expr.OrOp, expr.AndOp)):
+        return formula.xs
+    return ()
+
+
+def _postorder(formula: expr.Expression):
+    """
+    Operators of formula after their operands, without recursion
+    :param formula: pyeda expression
+    :return: generator of (expression, its operands count)
+    """
+    stack = [(formula, False)]
+    while stack:
+        node, expanded = stack.pop()
+        operands = _operatorOperands(node)
+        if expanded or not operands:
+            yield node, len(operands)
+        else:
+            stack.append((node, True))
+            stack.extend((x, False) for x in reversed(operands))
+
+
+def estimateDNFSize(formula: expr.Expression) -> int:
+    """
+    Upper bound of conjunctions count in DNF of formula, computed without expansion
+    (a or b) and (c or d) -> 2 * 2 = 4
+    :param formula: pyeda expression in NNF
+    :return: int
+    """
+    sizes = []
+    for node, count in _postorder(formula):
+        operand_sizes = sizes[len(sizes) - count:]
+        del sizes[len(sizes) - count:]
+        if isinstance(node, expr.OrOp):
+            sizes.append(sum(operand_sizes))
+        elif isinstance(node, expr.AndOp):
+            size = 1
+            for s in operand_sizes:
+                size *= s
+            sizes.append(size)
+        else:
+            sizes.append(1)
+    return sizes[0]
+
+
+def _combineSizes(is_and: bool, sizes: List[int]) -> int:
+    if is_and:
+        total = 1
+        for s in sizes:
+            total *= s
+        return total
+    return sum(sizes)
+
+
+def _boundDNFSize(formula: expr.Expression, budget: int, intermediates: Dict[str, expr.Expression]) -> Tuple[expr.Expression, int]:
+    """
+    Replace the biggest operands by auxiliary variables (Tseitin-style) until DNF estimate fits budget.
+    Each replaced operand is saved in intermediates and is computed by its own decision,
+    so the result stays equivalent and total size stays linear
+    :param formula: pyeda expression in NNF
+    :param budget: max DNF size estimate
+    :param intermediates: aux variable name -> replaced operand
+    :return: bounded formula and its DNF size estimate
+    """
+    # стек ограниченных операндов: (выражение, оценка), операнды оператора лежат на вершине
+    bounded = []
+    for node, count in _postorder(formula):
+        is_and = isinstance(node, expr.AndOp)
+        if not is_and and not isinstance(node, expr.OrOp):
+            bounded.append((node, 1))
+            continue
+
+        operands = [x for x, _ in bounded[len(bounded) - count:]]
+        sizes = [size for _, size in bounded[len(bounded) - count:]]
+        del bounded[len(bounded) - count:]
+
+        total = _combineSizes(is_and, sizes)
+        # операнды размера 1 не дают экспоненциального роста, их не выносим
+        while total > budget and max(sizes) > 1:
+            i = sizes.index(max(sizes))
+            aux_name = AUX_VARIABLE_PREFIX + str(len(intermediates))
+            intermediates[aux_name] = operands[i]
+            operands[i] = expr.exprvar(aux_name)
+            sizes[i] = 1
+            total = _combineSizes(is_and, sizes)
+
+        if is_and:
+            bounded.append((expr.And(*operands, simplify=False), total))
+        else:
+            bounded.append((expr.Or(*operands, simplify=False), total))
+    return bounded[0]
+
+
+def toInfix(formula: expr.Expression) -> str:
+    """
+    pyeda expression in NNF -> formula with and, or, ~ (format of toDMNReady rows)
+    :param formula:
+    :return: str
+    """
+    texts = []
+    for node, count in _postorder(formula):
+        if isinstance(node, (expr.OrOp, expr.AndOp)):
+            operand_texts = texts[len(texts) - count:]
+            del texts[len(texts) - count:]
+            separator = ' or ' if isinstance(node, expr.OrOp) else ' and '
+            texts.append(separator.join('(' + x + ')' for x in operand_texts))
+        else:
+            texts.append(str(node))
+    return texts[0]
+
+
+def _prepareForPyeda(el: str) -> str:
+    # Форматируем выражение: добавляем отступы, заменяем операнды на совместимые с билиотекой EDA
+    el = el.replace('!', ' ~ ')
+    el = el.replace(' not ', ' ~ ')
+    el = el.replace(' and ', ' & ')
+    el = el.replace(')and', ') & ')
+    el = el.replace('and(', '& (')
+    el = el.replace('&&', ' & ')
+    el = el.replace(' or ', ' | ')
+    el = el.replace(')or', ') | ')
+    el = el.replace('or(', '| (')
+    el = el.replace('||', ' | ')
+    el = el.replace(' eq ', '_eq_')
+    el = el.replace(' == ', '_eq_')
+    el = el.replace(' empty ', ' empty_')
+    # null склеить с операндом
+    el = el.replace(' null', '_null')
+    el = re.sub(r"^empty ", "empty_", el)
+    el = el.replace('\'', '')
+    el = el.replace('[', '_')
+    el = el.replace(']', '_')
+    el = el.replace('.', '_')
+    el = re.sub(' +', ' ', el)  # Замена нескольких пробелов одним
+    el = el.replace('_ ', ' ')
+    el = el.replace(' _', ' ')
+    el = re.sub(r"([^\s\)]+)\((.+?)\)(?=[^()]*(\(|$))", r"\1_\2_", el)
+    return el
+
+
+# лексемы формулы после _prepareForPyeda
+_formula_token_re = re.compile(r'\s*(?:([A-Za-z_][A-Za-z0-9_]*)|(\S))')
+_name_re = re.compile(r'(?<![A-Za-z0-9_])[A-Za-z_][A-Za-z0-9_]*')
+# имена операторов pyeda, переменные с такими именами разбирает только его парсер
+_pyeda_keywords = {'Or', 'Nor', 'And', 'Nand', 'Xor', 'Xnor', 'Equal', 'Unequal', 'Implies', 'ITE', 'Not',
+                   'OneHot', 'OneHot0', 'Majority', 'AchillesHeel'}
+
+
+def _product(factors: list) -> expr.Expression:
+    return factors[0] if len(factors) == 1 else expr.And(*factors, simplify=False)
+
+
+def _sum(terms: list) -> expr.Expression:
+    return terms[0] if len(terms) == 1 else expr.Or(*terms, simplify=False)
+
+
+def parseFormula(el: str) -> expr.Expression:
+    """
+    The same as pyeda expr.expr for formulas of variables, ~, &, | and brackets, without recursion:
+    pyeda parser recurses on each operand of | and &.
+    Other formulas are parsed by pyeda
+    :param el: result of _prepareForPyeda
+    :return: simplified pyeda expression
+    """
+    # скобки: (термы суммы, множители произведения, отрицания перед скобкой)
+    frames = []
+    terms, factors, negations = [], [], 0
+    expect_operand = True
+    for name, symbol in _formula_token_re.findall(el):
+        if expect_operand:
+            if symbol == '~':
+                negations += 1
+                continue
+            if symbol == '(':
+                frames.append((terms, factors, negations))
+                terms, factors, negations = [], [], 0
+                continue
+            if not name or name in _pyeda_keywords:
+                return expr.expr(el)
+            factor = expr.exprvar(name)
+        elif symbol == '&':
+            expect_operand = True
+            continue
+        elif symbol == '|':
+            terms.append(_product(factors))
+            factors = []
+            expect_operand = True
+            continue
+        elif symbol == ')' and frames:
+            terms.append(_product(factors))
+            factor = _sum(terms)
+            terms, factors, negations = frames.pop()
+        else:
+            return expr.expr(el)
+
+        for _ in range(negations):
+            factor = expr.Not(factor, simplify=False)
+        negations = 0
+        factors.append(factor)
+        expect_operand = False
+
+    if expect_operand or frames:
+        return expr.expr(el)
+    terms.append(_product(factors))
+    return _sum(terms).simplify()
+
+
+def _dnfRows(formulaDnf: expr.Expression) -> Set[str]:
+    """
+    Or(And(a, b), c) -> {'a and b', 'c'}
+    :param formulaDnf: pyeda expression in DNF
+    :return: conjunctions
+    """
+    x = re.findall(r"And\([^\)]+\)", str(formulaDnf))  # <===
+    t = re.sub(r"And\([^\)]+\)", "", str(formulaDnf))
+    t = t.replace(' ,', '')
+    m = re.split(r"(?:Or\(|\,)", t)  # <===
+    dmn_01 = x+m
+    dmn_02 = set()
+    for op in dmn_01:
+        if len(op.strip()) > 1:
+            op = re.sub(r"^And\(", '', op)
+            op = re.sub(r"\)$", '', op)
+            op = re.sub(r",", ' and ', op)
+            dmn_02.add(op.strip())
+    return dmn_02
+
+
+def inputDomains(domains: Dict[str, Tuple[str, str]]) -> Dict[str, Dict[str, str]]:
+    """
+    Group equality operands by input into categorical variables
+    {op_1: (x, "a"), op_2: (x, "b")} -> {x: {"a": op_1, "b": op_2}}
+    :param domains: {operand variable: (input, literal)}
+    :return: {input: {literal: operand variable}}
+    """
+    grouped = {}
+    for variable, (input_name, literal) in domains.items():
+        grouped.setdefault(input_name, {})[literal] = variable
+    return grouped
+
+
+def _sameValueSubstitution(domains: Dict[str, Tuple[str, str]]) -> Dict[expr.Variable, expr.Variable]:
+    """
+    Operands with equal input and literal become one variable of categorical input
+    :param domains: {operand variable: (input, literal)}
+    :return: {variable: its representative}
+    """
+    grouped = inputDomains(domains)
+    substitution = {}
+    for variable, (input_name, literal) in domains.items():
+        representative = grouped[input_name][literal]
+        if representative != variable:
+            substitution[expr.exprvar(variable)] = expr.exprvar(representative)
+    return substitution
+
+
+def pruneByDomains(formulaDnf: expr.Expression, domains: Dict[str, Tuple[str, str]]) -> expr.Expression:
+    """
+    Input has only one value, so in each conjunction of DNF:
+    x eq "a" and x eq "b" -> conjunction is unsatisfiable and removed
+    x eq "a" and !(x eq "b") -> x eq "a"
+    :param formulaDnf: pyeda expression in DNF
+    :param domains: {operand variable: (input, literal)}
+    :return: pyeda expression in DNF
+    """
+    if isinstance(formulaDnf, expr.Constant):
+        return formulaDnf
+
+    conjunctions = formulaDnf.xs if isinstance(formulaDnf, expr.OrOp) else (formulaDnf,)
+    kept = []
+    for conjunction in conjunctions:
+        literals = conjunction.xs if isinstance(conjunction, expr.AndOp) else (conjunction,)
+
+        values = {}
+        satisfiable = True
+        for literal in literals:
+            if isinstance(literal, expr.Variable) and str(literal) in domains:
+                input_name, value = domains[str(literal)]
+                if values.setdefault(input_name, value) != value:
+                    satisfiable = False
+                    break
+        if not satisfiable:
+            continue
+
+        literals = [
+            literal for literal in literals
+            if not (isinstance(literal, expr.Complement) and str(~literal) in domains
+                    and domains[str(~literal)][0] in values)
+        ]
+        kept.append(expr.And(*literals))
+
+    return expr.Or(*kept)
+
+
+def formulaShape(el: str, domains: Dict[str, Tuple[str, str]] = None) -> Tuple[str, tuple, Dict[str, str]]:
+    """
+    Boolean skeleton of formula: variables are renamed to op_0, op_1, ... in order of first occurrence,
+    equality domains keep only which operands share input and literal
+    op_12 or op_3 and ~op_12 -> op_0 or op_1 and ~op_0
+    :param el: result of _prepareForPyeda
+    :param domains: {operand variable: (input, literal)}
+    :return: shape, domains pattern ((variable of shape, input number, literal number), ...), {shape variable: variable}
+    """
+    renamed = {}
+
+    def rename(name: str) -> str:
+        if name not in renamed:
+            renamed[name] = SHAPE_VARIABLE_PREFIX + str(len(renamed))
+        return renamed[name]
+
+    shape = _name_re.sub(lambda m: m.group() if m.group() in _pyeda_keywords else rename(m.group()), el)
+
+    pattern = []
+    if domains:
+        inputs, literals = {}, {}
+        for variable, (input_name, literal) in domains.items():
+            pattern.append((rename(variable), inputs.setdefault(input_name, len(inputs)),
+                            literals.setdefault(literal, len(literals))))
+    return shape, tuple(pattern), {shape_name: name for name, shape_name in renamed.items()}
+
+
+def _instantiate(formula: str, names: Dict[str, str]) -> str:
+    # переменные формы -> переменные формулы, aux переменные остаются
+    return _name_re.sub(lambda m: names.get(m.group(), m.group()), formula)
+
+
+def toDMNReadyBounded(el: str, budget: int = DNF_SIZE_BUDGET, domains: Dict[str, Tuple[str, str]] = None) -> DMNReady:
+    """
+    toDMNReady with guard of exponential DNF expansion.
+    If DNF size estimate exceeds budget, sub formulas are replaced by aux variables.
+    DNF is computed once per shape of formula and is renamed to variables of formula
+    :param el: zipped formula
+    :param budget: max DNF size estimate, None - without limit
+    :param domains: {operand variable: (input, literal)} for operands like input eq literal
+    :return: DMNReady(rows: DNF conjunctions, intermediates: {aux variable: formula in rows format})
+    """
+    checkExpression(el)
+
+    shape, pattern, names = formulaShape(_prepareForPyeda(el), domains)
+    dmn_ready = _shapeDMNReady(shape, budget, pattern)
+    return DMNReady(rows={_instantiate(row, names) for row in dmn_ready.rows},
+                    intermediates={aux_name: _instantiate(formula, names)
+                                   for aux_name, formula in dmn_ready.intermediates.items()})
+
+
+@lru_cache(maxsize=SHAPE_CACHE_SIZE)
+def _shapeDMNReady(shape: str, budget: Optional[int], pattern: tuple) -> DMNReady:
+    """
+    :param shape: formula in pyeda format with variables of shape
+    :param budget: max DNF size estimate, None - without limit
+    :param pattern: domains pattern of formulaShape
+    :return: DMNReady of shape, rows are frozenset
+    """
+    domains = {variable: (str(input_number), str(literal_number)) for variable, input_number, literal_number in pattern}
+    formula = parseFormula(shape)
+    if domains:
+        formula = formula.compose(_sameValueSubstitution(domains))
+
+    intermediates = {}
+    if budget is not None and estimateDNFSize(formula.to_nnf()) > budget:
+        aux_formulas = {}
+        formula, _ = _boundDNFSize(formula.to_nnf(), budget, aux_formulas)
+        for aux_name, aux_formula in aux_formulas.items():
+            intermediates[aux_name] = toInfix(aux_formula)
+
+    formulaDnf = formula.to_dnf()
+    if domains:
+        formulaDnf = pruneByDomains(formulaDnf, domains)
+
+    return DMNReady(rows=frozenset(_dnfRows(formulaDnf)), intermediates=intermediates)
+
+
+def shapeCacheInfo():
+    """
+    Hits and misses of DNF computed by shape of formula
+    :return: functools cache info
+    """
+    return _shapeDMNReady.cache_info()
+
 
 def toDMNReady(el: str) -> Set[str]:
-    if check_brackets(el):
-        # Форматируем выражение: добавляем отступы, заменяем операнды на совместимые с билиотекой EDA
-        el = el.replace('!', ' ~ ')
-        el = el.replace(' not ', ' ~ ')
-        el = el.replace(' and ', ' & ')
-        el = el.replace(')and', ') & ')
-        el = el.replace('and(', '& (')
-        el = el.replace('&&', ' & ')
-        el = el.replace(' or ', ' | ')
-        el = el.replace(')or', ') | ')
-        el = el.replace('or(', '| (')
-        el = el.replace('||', ' | ')
-        el = el.replace(' eq ', '_eq_')
-        el = el.replace(' == ', '_eq_')
-        el = el.replace(' empty ', ' empty_')
-        # null склеить с операндом
-        el = el.replace(' null', '_null')
-        el = re.sub(r"^empty ", "empty_", el)
-        el = el.replace('\'', '')
-        el = el.replace('[', '_')
-        el = el.replace(']', '_')
-        el = el.replace('.', '_')
-        el = re.sub(' +', ' ', el)  # Замена нескольких пробелов одним
-        # el = el.replace('(', ' ( ')
-        # el = el.replace(')', ' ) ')
-        el = el.replace('_ ', ' ')
-        el = el.replace(' _', ' ')
-        el = re.sub(r"([^\s\)]+)\((.+?)\)(?=[^()]*(\(|$))", r"\1_\2_", el)
-        # print("\r\n------------------------------------------------------")
-        # print("................................................[ OK ] \rПодготовка формулы")
-        # print(el)
-        #
-        dirty_operands_01 = re.split(r"(?:\s\&\s|\s\|\s)", el)  # Разделение на операнды
-        dirty_operands_02 = set(dirty_operands_01)
-        dirty_operands_03 = set()
-        for op in dirty_operands_02:
-            dirty_operands_03.add(op.replace('(', '').replace(')', '').strip())
-
-        # print("\r\n------------------------------------------------------")
-        # print("................................................[ OK ] \rЭлементы формулы")
-        # print("Всего . . : {}",format(dirty_operands_01.__len__()))
-        # print("Уникальных: {}",format(dirty_operands_03.__len__()))
-        # print("----------------------")
-        #
-        formula = el  # .replace(" eq '", '_eq_').replace("'", '').replace("empty ", "empty_").replace(".", "_")
-        # print(*dirty_operands_03, sep = "\n")
-        formulaDnf = expr.expr(formula).to_dnf()
-        # print("\r\n------------------------------------------------------")
-        # print("................................................[ OK ] \rПриведение к ДНФ")
-        # print(formulaDnf)
-        #
-        x = re.findall(r"And\([^\)]+\)", str(formulaDnf))  # <===
-        t = re.sub(r"And\([^\)]+\)", "", str(formulaDnf))
-        t = t.replace(' ,', '')
-        m = re.split(r"(?:Or\(|\,)", t)  # <===
-        dmn_01 = x+m
-        dmn_02 = set()
-        for op in dmn_01:
-            if len(op.strip()) > 1:
-                op = re.sub(r"^And\(", '', op)
-                op = re.sub(r"\)$", '', op)
-                op = re.sub(r",", ' and ', op)
-                dmn_02.add(op.strip())
-
-        return dmn_02
-
-        # print("\r\n------------------------------------------------------")
-        # print("................................................[ OK ] \rПриведение к DMN")
-        # print(*dmn_02, sep="\n")
-        # return 'Or(' + ', '.join(dmn_02) + ')'
-
-    else:
-        raise ValueError("Invalid brackets")
+    """
+    Zipped formula -> DNF conjunctions, without guard of DNF size
+    :param el: zipped formula
+    :return: conjunctions
+    """
+    return toDMNReadyBounded(el, budget=None).rows
@@ -1,17 +1,33 @@
+import sys
+
+import click
 from lxml import etree
 
 from src.translator.treeFormula import tree, DMNTree, translateDMNReadyinDMNTree, DMN_XML, printDMNTree, \
-    SyntaxTreePrinter
+    SyntaxTreePrinter, ANTLR_PARSER, PARSERS, collapseChains
+from src.translator.toKNF import DNF_SIZE_BUDGET
+from src.translator.expressionValidator import InvalidExpression, checkExpression
 from loguru import logger
 
 
-def translate(java_el_expr: str) -> DMNTree:
+def translate(java_el_expr: str, dnf_budget: int = DNF_SIZE_BUDGET, parser: str = ANTLR_PARSER,
+              canonical=None, collapse: bool = True) -> DMNTree:
     """
     Builds DMNTree representation of translated to FEEL java_el_expr
     :param java_el_expr: Valid Java EL expression
+    :param dnf_budget: max DNF size estimate of one decision, bigger formulas are split to intermediate decisions
+    :param parser: ANTLR_PARSER or PRATT_PARSER, pratt parser also rejects expressions ANTLR parses partially
+    :param canonical: CanonicalForms shared by translations of catalog, equivalent decisions are translated once
+    :param collapse: fold ! and empty into tables of operands and drop decisions passing result of child
     :return: translated representation of given expression
+    :raises InvalidExpression: pre-validation or parser found syntax errors
     """
-    el_tree = tree(java_el_expr)
+    # отклоняется до разбора ANTLR
+    checkExpression(java_el_expr)
+    syntax_errors = []
+    el_tree = tree(java_el_expr, syntax_errors, parser)
+    if syntax_errors:
+        raise InvalidExpression(java_el_expr, syntax_errors)
     dmn_tree = DMNTree(el_tree)
     logger.debug('This tree wil be translated')
     printDMNTree(dmn_tree)
@@ -21,11 +37,14 @@ def translate(java_el_expr: str) -> DMNTree:
     # stp.visit(el_tree)
     # logger.opt(colors=True).debug(f'<green>{stp.tree_expression}</green>')
     # logger.debug('---------------------------')
-    translateDMNReadyinDMNTree(dmn_tree)
+    translateDMNReadyinDMNTree(dmn_tree, dnf_budget, parser, canonical)
+    if collapse:
+        collapseChains(dmn_tree)
     logger.debug('Translated DMN tree')
     printDMNTree(dmn_tree)
     logger.debug('---------------------------')
-    return dmn_tree
+    # FEEL получен, дерево разбора больше не нужно
+    return dmn_tree.freeze()
 
 
 def xml_from_dmntree(dmn_tree_translated: DMNTree, xml_out_path: str) -> None:
@@ -40,3 +59,26 @@ def xml_from_dmntree(dmn_tree_translated: DMNTree, xml_out_path: str) -> None:
     etree.ElementTree(dmn_xml_root).write(xml_out_path + str(id(dmn_tree_translated)) + '.xml', pretty_print=True)
     # with open(xml_out_path, 'w') as xml_out:
     #     xml_out.write(etree.tostring(dmn_xml_root, pretty_print=True))
+
+
+@click.command()
+@click.argument('expression')
+@click.option('--out', default=None, help='DMN file path, stdout by default')
+@click.option('--budget', default=DNF_SIZE_BUDGET, type=int, help='DNF size budget of translation')
+@click.option('--parser', default=ANTLR_PARSER, type=click.Choice(PARSERS), help='JavaEL parser')
+def main(expression, out, budget, parser):
+    """
+    Translate JavaEL expression to DMN XML
+    """
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING', format='{level} {message}')
+
+    dmn_xml_root = DMN_XML.visit(translate(expression, budget, parser))
+    if out:
+        etree.ElementTree(dmn_xml_root).write(out, pretty_print=True)
+    else:
+        sys.stdout.write(etree.tostring(dmn_xml_root, pretty_print=True).decode('utf-8'))
+
+
+if __name__ == '__main__':
+    main()
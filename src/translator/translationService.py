@@ -0,0 +1,315 @@
+import asyncio
+import bisect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import click
+from lxml import etree
+from loguru import logger
+
+from src.translator.toKNF import DNF_SIZE_BUDGET
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BATCH = 32
+# ожидание следующих запросов в пакет, секунды
+BATCH_WINDOW = 0.005
+MAX_BODY = 1 << 20
+
+# границы корзин гистограмм
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large'}
+
+
+def translateBatch(expressions: List[str], dnf_budget: int = DNF_SIZE_BUDGET) -> List[Tuple[str, str]]:
+    """
+    Runs in worker process: translate and build DMN XML
+    :param expressions: JavaEL expressions
+    :param dnf_budget:
+    :return: (xml, None) or (None, error) for each expression
+    """
+    from src.translator.translate import translate
+    from src.translator.treeFormula import DMN_XML
+
+    results = []
+    for expression in expressions:
+        try:
+            definitions = DMN_XML.visit(translate(expression, dnf_budget))
+            results.append((etree.tostring(definitions, pretty_print=True).decode('utf-8'), None))
+        except Exception as e:
+            results.append((None, f'{type(e).__name__}: {e}'))
+    return results
+
+
+def _warmUp() -> bool:
+    # импорт парсеров и первая трансляция в каждом процессе пула
+    logger.remove()
+    translateBatch(["fields['a'] eq true"])
+    return True
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds
+    """
+    def __init__(self, bounds: Tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {'buckets': buckets, 'count': self.total, 'sum': self.sum}
+
+
+class TranslationService:
+    """
+    Translation on warm process pool.
+    Concurrent requests are collected into batches, equal expressions in flight are translated once
+    """
+    def __init__(self, workers: int = None, dnf_budget: int = DNF_SIZE_BUDGET, max_batch: int = MAX_BATCH,
+                 batch_window: float = BATCH_WINDOW):
+        self.workers = workers
+        self.dnf_budget = dnf_budget
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+
+        self.executor = None
+        self.queue = None
+        self.inflight = {}  # expression: Future
+        self._batcher = None
+        self._running = set()
+
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.queue_depth = Histogram(DEPTH_BUCKETS)
+        self.batch_size = Histogram(DEPTH_BUCKETS)
+        self.counters = {'requests': 0, 'deduplicated': 0, 'batches': 0, 'errors': 0}
+
+    async def start(self):
+        workers = self.workers or os.cpu_count()
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warmUp) for _ in range(workers)))
+        self.queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batchLoop())
+
+    async def stop(self):
+        if self._batcher:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self.executor:
+            self.executor.shutdown()
+
+    async def translate(self, expression: str) -> dict:
+        """
+        :param expression: JavaEL expression
+        :return: {'expression', 'xml', 'error'}
+        """
+        started = time.perf_counter()
+        self.counters['requests'] += 1
+
+        future = self.inflight.get(expression)
+        if future is not None:
+            self.counters['deduplicated'] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[expression] = future
+            self.queue_depth.observe(self.queue.qsize())
+            self.queue.put_nowait(expression)
+
+        xml, error = await asyncio.shield(future)
+        self.latency.observe((time.perf_counter() - started) * 1000)
+        return {'expression': expression, 'xml': xml, 'error': error}
+
+    async def _batchLoop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.counters['batches'] += 1
+            self.batch_size.observe(len(batch))
+            task = asyncio.create_task(self._runBatch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _runBatch(self, batch: List[str]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, translateBatch, batch, self.dnf_budget)
+        except Exception as e:
+            results = [(None, f'{type(e).__name__}: {e}')] * len(batch)
+
+        for expression, result in zip(batch, results):
+            if result[1] is not None:
+                self.counters['errors'] += 1
+            future = self.inflight.pop(expression)
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self) -> dict:
+        return {
+            'counters': dict(self.counters),
+            'queue': self.queue.qsize() if self.queue else 0,
+            'inflight': len(self.inflight),
+            'queue_depth': self.queue_depth.snapshot(),
+            'batch_size': self.batch_size.snapshot(),
+            'latency_ms': self.latency.snapshot(),
+        }
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        """
+        POST /translate {"expression": "..."} or {"expressions": [...]}
+        GET /metrics, GET /health
+        :return: status, json response
+        """
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, self.metrics()
+        if path != '/translate':
+            return 404, {'error': f'unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'POST expected'}
+
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as e:
+            return 400, {'error': f'invalid json: {e}'}
+        if not isinstance(request, dict):
+            return 400, {'error': 'json object expected'}
+        if isinstance(request.get('expressions'), list):
+            results = await asyncio.gather(*(self.translate(str(e)) for e in request['expressions']))
+            return 200, {'results': list(results)}
+        if isinstance(request.get('expression'), str):
+            return 200, await self.translate(request['expression'])
+        return 400, {'error': 'expression or expressions expected'}
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'bad request line'}, False)
+                    break
+
+                headers = await self._readHeaders(reader)
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {'error': 'bad content-length'}, False)
+                    break
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, response = await self.handle(method, path.split('?')[0], body)
+                await self._respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _readHeaders(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, response: dict, keep_alive: bool):
+        body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        head = (
+            f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: str = None) -> asyncio.AbstractServer:
+        """
+        Start pool and listen localhost or unix socket
+        :param host:
+        :param port: 0 - any free port
+        :param unix: unix socket path instead of host and port
+        :return: started server
+        """
+        await self.start()
+        if unix:
+            return await asyncio.start_unix_server(self._connection, path=unix)
+        return await asyncio.start_server(self._connection, host, port)
+
+
+async def _serveForever(service: TranslationService, host: str, port: int, unix: str):
+    server = await service.serve(host, port, unix)
+    logger.info(f'listening {unix or server.sockets[0].getsockname()}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+@click.command()
+@click.option('--host', default=DEFAULT_HOST, help='localhost address')
+@click.option('--port', default=DEFAULT_PORT, type=int)
+@click.option('--unix', default=None, help='unix socket path instead of host and port')
+@click.option('--workers', default=None, type=int, help='processes count')
+@click.option('--budget', default=DNF_SIZE_BUDGET, type=int, help='DNF size budget of translation')
+def main(host, port, unix, workers, budget):
+    """
+    Long-running translation service
+    """
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, level='INFO', format='{level} {message}')
+    try:
+        asyncio.run(_serveForever(TranslationService(workers, budget), host, port, unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,25 @@
-from typing import List, Set
+from typing import Dict, List, Set, Tuple, Optional
 from lxml import etree
 
 from loguru import logger
-from collections import namedtuple
+from collections import namedtuple, Counter
 from queue import SimpleQueue
 import re
-import ctypes
+import sys
+from bisect import bisect_left
 from antlr4 import *
 from ANTLR_JavaELParser.JavaELParser import JavaELParser
 from ANTLR_JavaELParser.JavaELLexer import JavaELLexer
 from ANTLR_JavaELParser.JavaELParserVisitor import JavaELParserVisitor
-from src.translator.toKNF import toDMNReady
-from src.translator.xmlPacker import DecisionTable, expression_xml
+from src.translator.toKNF import toDMNReady, toDMNReadyBounded, DNF_SIZE_BUDGET, AUX_VARIABLE_PREFIX
+from src.translator.xmlPacker import DecisionTable, DmnElementsExtracter, expression_xml
+from src.translator.typeInference import InputTypes
+from src.translator.rulePruning import isBare, normalizedTest
+from src.translator.sourceText import compactText
+from src.translator.passState import PassState
+from src.translator.parseArena import ParseArena, TERMINAL, PRIMITIVE_CHAIN, UNIT_BASE, ZIPPABLE, SIMPLE_OPERAND
+from src.translator.expressionValidator import CollectingErrorListener, ExpressionError, listenErrors
+from src.translator import prattParser, feelUnaryTests
 
 # logger.disable(__name__)
 
@@ -21,95 +29,219 @@ extract_id_re = re.compile(r'op_(\d+)')
 
 not_re = re.compile(r'~([\d\w_]+)')
 
-ExpressionZipped = namedtuple('ExpressionZipped', ('expression', 'tree'))
+equality_re = re.compile(r'op_(\d+)\s*(?:eq|==)\s*op_(\d+)')
+
+aux_re = re.compile(r'\b' + AUX_VARIABLE_PREFIX + r'\d+\b')
+
+# разбор JavaEL: ANTLR JavaELParser - эталон, pratt - prattParser без контекстов ANTLR
+ANTLR_PARSER = 'antlr'
+PRATT_PARSER = 'pratt'
+PARSERS = (ANTLR_PARSER, PRATT_PARSER)
+
+# tree: ParseArena выражения, op_ id - номер вершины арены; operands: op_ id -> текст операнда
+ExpressionZipped = namedtuple('ExpressionZipped', ('expression', 'tree', 'operands'), defaults=(None,))
+
+
+# токены операторов с несколькими написаниями -> тип токена конкретного оператора
+OPERATOR_TYPES = {
+    '==': JavaELParser.Equal, 'eq': JavaELParser.Equal,
+    '!=': JavaELParser.NotEqual, 'ne': JavaELParser.NotEqual,
+    '>': JavaELParser.Greater, 'gt': JavaELParser.Greater,
+    '<': JavaELParser.Less, 'lt': JavaELParser.Less,
+    '>=': JavaELParser.GreaterEqual, 'ge': JavaELParser.GreaterEqual,
+    '<=': JavaELParser.LessEqual, 'le': JavaELParser.LessEqual,
+}
+
+
+LITERAL_TYPES = (JavaELParser.StringLiteral, JavaELParser.IntegerLiteral, JavaELParser.BooleanLiteral)
+
+# выражение решения без выполнимых строк
+CONSTANT_FALSE = ''
+# операторы, которые collapseChains сворачивает в таблицу операнда
+FOLDED_OPERATORS = (JavaELParser.Not, JavaELParser.Empty)
+# выражение решения - только ссылка на решение потомка: ( dmn140294141731968 )
+DECISION_REFERENCE_RE = re.compile(r'^[\s(]*dmn(\d+)[\s)]*$')
 
 
 class DMNTreeNode:
+    __slots__ = ('children', 'contexts')
+
     def __init__(self):
         self.children = []
         self.contexts = None
 
-    def find_dependencies(self):
+    def freeze(self):
         """
-        Find dependent sub DMN expressions and replace to id
-        example: field.first eq field.second and not (field.third or true) ->
-              -> field.first eq field.second and dmn_1
+        Drop references to parse tree, node keeps only translated text
         :return:
         """
-        global new_child_dmn_handler
-        # только один контекст не терминальный
-        if isinstance(self, ExpressionDMN):
-            for c in self.contexts:
-                if not isinstance(c, TerminalNode):
-                    DMNTreeBuilder(self).visit(c)
-
-        for child in self.children:
-            child.find_dependencies()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.contexts = None
+            if isinstance(node, ExpressionDMN):
+                node.zipped = None
+            stack.extend(node.children)
 
 
 class ExpressionDMN(DMNTreeNode):
-    def __init__(self, expr: str, ctxs: List[ParserRuleContext]):
+    __slots__ = ('_expression', 'span', 'zipped', 'operators')
+
+    def __init__(self, expr: str, ctxs: List[ParserRuleContext], span: Tuple[int, int] = None):
+        """
+        :param expr: JavaEL expression
+        :param ctxs: contexts of expression or nodes of ParseArena of DMNTree
+        :param span: first and last token of expression, by default tokens of ctxs, required for arena nodes
+        """
         super(ExpressionDMN, self).__init__()
         self.expression = expr
         self.contexts = ctxs
         self.children = []
+        if span is None and ctxs:
+            span = (min(tokenSpan(c)[0] for c in ctxs), max(tokenSpan(c)[1] for c in ctxs))
+        self.span = span
+        # ExpressionZipped выражения, если построен при разборе дерева
+        self.zipped = None
+        # ! и empty над результатом таблицы, свернутые collapseChains
+        self.operators = ()
+
+    @property
+    def expression(self) -> str:
+        return self._expression
+
+    @expression.setter
+    def expression(self, expr: str):
+        # одинаковые выражения в пакете хранятся один раз
+        self._expression = sys.intern(expr)
 
 
 class OperatorDMN(DMNTreeNode):
+    __slots__ = ('operator',)
+
     def __init__(self, operator: int):
         super(OperatorDMN, self).__init__()
         self.operator = operator
 
+    @property
+    def operatorName(self) -> str:
+        return JavaELParser.symbolicNames[self.operator]
+
 
 class DMNTree:
-    def __init__(self, ctx: ParserRuleContext):
+    __slots__ = ('ctx', 'root', 'state', 'arena')
+
+    def __init__(self, ctx: ParserRuleContext or ParseArena):
         self.ctx = ctx
+        self.state = None
+        self.arena = None
         if ctx:
-            p = SyntaxTreePrinter()
-            p.visit(ctx)
-            self.root = ExpressionDMN(p.tree_expression, [ctx])
-            self.root.find_dependencies()
+            # все проходы идут по арене, контексты ANTLR больше не обходятся
+            self.arena = ctx if isinstance(ctx, ParseArena) else ParseArena(ctx)
+            self.state = PassState.ofArena(self.arena)
+            self.root = ExpressionDMN(self.arena.text(0), [0], self.arena.span(0))
+            analyzer = FormulaAnalyzer(self.arena, self.state)
+            nodes = [self.root]
+            while nodes:
+                node = nodes.pop()
+                if isinstance(node, ExpressionDMN):
+                    node.zipped = analyzer.analyze(node)
+                nodes.extend(node.children)
+
+    def freeze(self) -> 'DMNTree':
+        """
+        Release parse tree after translation: token stream, contexts and their marks
+        :return: self
+        """
+        self.ctx = None
+        self.state = None
+        self.arena = None
+        self.root.freeze()
+        return self
 
 
-def add_color_to_ctx(ctx: ParserRuleContext, dmn_id: str):
+def postorder(root: DMNTreeNode):
     """
-    добвать в очередь к ctx новый dmn_id, иначе создать ее
-    корневые вершины поддеревьев DMNNode покрашены в одинаковый dmn_id
-    :param ctx:
-    :param dmn_id:
-    :return:
+    DMN nodes after their children, left to right, without recursion.
+    Children are taken when node is reached, children added to visited node are not yielded
+    :param root:
+    :return: generator of DMNTreeNode
     """
-    if hasattr(ctx, 'colors'):
-        ctx.colors.append(dmn_id)
-    else:
-        ctx.colors = []
-        ctx.colors.append(dmn_id)
-    logger.opt(colors=True).debug(f'<red>context: {id(ctx)} colorized: {dmn_id}</red>')
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded or not node.children:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
 
 
-def tree(expression: str):
+def tokenSpan(ctx) -> Tuple[int, int]:
+    if isinstance(ctx, TerminalNode):
+        return ctx.symbol.tokenIndex, ctx.symbol.tokenIndex
+    return ctx.start.tokenIndex, ctx.stop.tokenIndex
+
+
+def tree(expression: str, errors: List[ExpressionError] = None, parser: str = ANTLR_PARSER):
+    """
+    Parse JavaEL expression, syntax errors are collected instead of printing to stderr
+    :param expression:
+    :param errors: list for syntax errors with offsets
+    :param parser: ANTLR_PARSER or PRATT_PARSER
+    :return: ANTLR_PARSER - root ternary context, parser recovers from errors;
+             PRATT_PARSER - ParseArena, None if expression has errors
+    """
+    if parser == PRATT_PARSER:
+        return prattParser.parse(expression, errors)
     input_stream = InputStream(expression)
     lexer = JavaELLexer(input_stream)
     tree_returned = JavaELParser(CommonTokenStream(lexer))
+    listenErrors((lexer, tree_returned), CollectingErrorListener(expression, errors))
     return tree_returned.ternary()
 
 
-def zipFormula(context: ParserRuleContext) -> ExpressionZipped:
-    SimpleOperandMarker().visit(context)
-    zipper = FormulaZipper()
-    zipper.visit(context)
-    return ExpressionZipped(zipper.result, context)
+def zipFormula(context: ParserRuleContext or ParseArena) -> ExpressionZipped:
+    """
+    Logical skeleton of expression, simple operands are replaced by op_{node of ParseArena}
+    :param context: expression without sub DMN
+    :return: zipped expression with texts of its operands
+    """
+    arena = context if isinstance(context, ParseArena) else ParseArena(context)
+    return FormulaAnalyzer(arena, extract=False).zip(0)
+
 
+def equalityDomain(input_ctx: ParserRuleContext, literal_ctx: ParserRuleContext) -> Optional[Tuple[str, str]]:
+    """
+    operands of input eq literal -> (input, literal), if right operand is not literal -> None
+    :param input_ctx: left zipped operand
+    :param literal_ctx: right zipped operand
+    :return:
+    """
+    while not isinstance(literal_ctx, TerminalNode) and literal_ctx.getChildCount() == 1:
+        literal_ctx = literal_ctx.getChild(0)
+    if not isinstance(literal_ctx, TerminalNode) or literal_ctx.symbol.type not in LITERAL_TYPES:
+        return None
 
-def unzipOperand(operand_id: str) -> str:
-    operand = ctypes.cast(int(operand_id), ctypes.py_object).value
+    return compactText(input_ctx), literal_ctx.getText().replace("\'", "\"")
 
-    logger.opt(colors=True).debug(f'<green>unzip {operand_id}</green>')
 
-    printer = SyntaxTreePrinter()
-    printer.visit(operand)
-    result = printer.tree_expression
-    return result
+def equalityDomains(zipped: ExpressionZipped) -> Dict[str, Tuple[str, str]]:
+    """
+    Find zipped operands like op_1 eq op_2, where op_2 is literal.
+    In toDMNReady they become one variable op_1_eq_op_2
+    :param zipped: result of zipFormula or FormulaAnalyzer
+    :return: {op_1_eq_op_2: (input, literal)}
+    """
+    arena = zipped.tree
+    domains = {}
+    for input_id, literal_id in equality_re.findall(zipped.expression):
+        literal = int(literal_id)
+        # литерал - цепочка до одного токена
+        if arena.first_child[literal] >= 0 or arena.tokenType(literal) not in LITERAL_TYPES:
+            continue
+        domains[f'op_{input_id}_eq_op_{literal_id}'] = (arena.compactText(int(input_id)),
+                                                        arena.compactText(literal).replace("\'", "\""))
+    return domains
 
 
 def concatWithOr(or_operands: Set[str]):
@@ -120,15 +252,18 @@ def concatWithOr(or_operands: Set[str]):
     return ' or '.join(scoped_or_operands)
 
 
-def unpack(formula: str) -> str:
-    # set scopes after not
-    for not_m in not_re.findall(formula):
-        formula = formula.replace(not_m, '(' + not_m + ')')
+def unpack(formula: str, operands: Dict[str, str]) -> str:
+    """
+    :param formula: zipped formula
+    :param operands: texts of operands by op_ id
+    :return: JavaEL
+    """
+    # set scopes after not: имя в скобках столько раз, сколько раз встречается его отрицание
+    for name, count in Counter(not_re.findall(formula)).items():
+        formula = re.sub(r'(?<!\w)' + re.escape(name) + r'(?!\w)', '(' * count + name + ')' * count, formula)
 
-    # unzip by id
-    for m in extract_id_re.findall(formula):
-        formula = formula.replace(m, unzipOperand(m))
-    formula = formula.replace('op_', ' ')
+    # unzip by id: op_ id заменяется целиком, номера вершин бывают префиксами друг друга
+    formula = extract_id_re.sub(lambda m: ' ' + operands[m.group(1)], formula)
     formula = re.sub(r'_(..)_', r' \g<1> ', formula)
     formula = formula.replace('_ ', ' ').replace(' _', ' ').replace("\'", "\"")
 
@@ -140,71 +275,86 @@ def unpack(formula: str) -> str:
 new_child_dmn_handler = None
 
 
-class SyntaxTreePrinter(JavaELParserVisitor):
-    def __init__(self):
-        super(SyntaxTreePrinter, self).__init__()
+class PassVisitor(JavaELParserVisitor):
+    """
+    Visitor keeps its marks in PassState, new state of visited tree is created on the first visit
+    """
+    def __init__(self, state: PassState = None):
+        super(PassVisitor, self).__init__()
+        self.state = state
+
+    def visit(self, tree):
+        if self.state is None:
+            self.state = PassState(tree)
+        return tree.accept(self)
+
+
+class SyntaxTreePrinter(PassVisitor):
+    def __init__(self, state: PassState = None):
+        super(SyntaxTreePrinter, self).__init__(state)
         self.result = []
 
     def lastContextWasDMN(self):
         return len(self.result) > 0 and 'dmn_' in self.result[-1]
 
     def passIfNoDMN(self, ctx):
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            self.result.append(ctx.colors[-1])
+        color = self.state.color(ctx)
+        if color is not None:
+            self.result.append(color)
         else:
             return self.visitChildren(ctx)
 
     def visitTerminal(self, node):
-        logger.opt(colors=True).debug(f'terminal: <red>{id(node)}</red> <green>{node.getText()}</green> dmn: {hasattr(node, "colors")}')
+        logger.opt(colors=True).debug(f'terminal: <red>{id(node)}</red> <green>{node.getText()}</green> dmn: {self.state.color(node)}')
         self.result.append(node.getText())
 
     def visitPrimitive(self, ctx:JavaELParser.PrimitiveContext):
-        logger.opt(colors=True).debug(f'primitive: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'primitive: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitValue(self, ctx:JavaELParser.ValueContext):
-        logger.opt(colors=True).debug(f'value: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'value: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitBase(self, ctx:JavaELParser.BaseContext):
-        logger.opt(colors=True).debug(f'base: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'base: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitMember(self, ctx:JavaELParser.MemberContext):
-        logger.opt(colors=True).debug(f'member: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'member: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitAlgebraic(self, ctx:JavaELParser.AlgebraicContext):
-        logger.opt(colors=True).debug(f'algebraic: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'algebraic: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitRelation(self, ctx:JavaELParser.RelationContext):
-        logger.opt(colors=True).debug(f'relation: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'relation: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitEquality(self, ctx:JavaELParser.EqualityContext):
-        logger.opt(colors=True).debug(f'equality: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'equality: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitTerm(self, ctx:JavaELParser.TermContext):
-        logger.opt(colors=True).debug(f'term: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'term: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitExpression(self, ctx:JavaELParser.ExpressionContext):
-        logger.opt(colors=True).debug(f'expression: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'expression: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
     def visitTernary(self, ctx:JavaELParser.TernaryContext):
-        logger.opt(colors=True).debug(f'ternary: <red>{id(ctx)}</red> <green>{ctx.getText()}</green> dmn: {hasattr(ctx, "colors")}')
+        logger.opt(colors=True).debug(f'ternary: <red>{id(ctx)}</red> <green>{compactText(ctx)}</green> dmn: {self.state.color(ctx)}')
         if not self.lastContextWasDMN():
             return self.passIfNoDMN(ctx)
 
@@ -213,11 +363,12 @@ class SyntaxTreePrinter(JavaELParserVisitor):
         return ' '.join(self.result)
 
 
-class ToFEELConverter(JavaELParserVisitor):
+class ToFEELConverter:
+    """
+    JavaEL DNF to FEEL over ParseArena, without recursion
+    """
     def __init__(self):
-        super(ToFEELConverter, self).__init__()
         self.translated = []
-        self.visited = []
 
     @property
     def result(self):
@@ -229,101 +380,56 @@ class ToFEELConverter(JavaELParserVisitor):
         to_ret = re.sub(r'\s+', ' ', to_ret)
         return to_ret
 
-    def visitTernary(self, ctx: JavaELParser.TernaryContext):
-        # logger.debug("visit Ternary {}: {} with translated {}", ctx.getText(), [i.getText() for i in ctx.getChildren()],
-        #              self.translated)
-        if ctx.getChildCount() > 1:  # ternary expression
-            ctx_children = list(ctx.getChildren())
-            condition_expression = ctx_children[0]
-            true_ternary = ctx_children[2]
-            false_ternary = ctx_children[4]
-
-            self.translated.append('if')
-            self.translated.append(self.visit(condition_expression))
-            self.translated.append('then')
-            self.translated.append(self.visit(true_ternary))
-            self.translated.append('else')
-            self.translated.append(self.visit(false_ternary))
-        else:
-            return self.visitChildren(ctx)
-
-    def visitRelation(self, ctx: JavaELParser.RelationContext):
-        # logger.debug("visit Relation {}: {} with translated {}", ctx.getText(),
-        #              [i.getText() for i in ctx.getChildren()], self.translated)
-        if ctx.getChildCount() > 1 and isinstance(ctx.getChild(1), TerminalNode):
-            left_algebraic = ctx.getChild(0)
-            right_algebraic = ctx.getChild(2)
-            ctx_operator = ctx.getChild(1)
-
-            self.translated.append(self.visit(left_algebraic))
-            self.translated.append(self.translateRelationalToFEEL(ctx_operator))
-            self.translated.append(self.visit(right_algebraic))
-
-        else:
-            return self.visitChildren(ctx)
-
-    def visitEquality(self, ctx: JavaELParser.EqualityContext):
-        # logger.debug("visit Equality {}: {} with translated {}", ctx.getText(),
-        #              [i.getText() for i in ctx.getChildren()], self.translated)
-        if ctx.getChildCount() > 1:
-            self.translateEqualityToFEEL(ctx)
-        else:
-            return self.visitChildren(ctx)
-
-    def visitBase(self, ctx: JavaELParser.BaseContext):
-        # logger.debug("visit Base {}: {} with translated {}", ctx.getText(), [i.getText() for i in ctx.getChildren()],
-        #              self.translated)
-        if ctx.getChildCount() > 1:
-            self.translateUnaryToFEEL(ctx)
-        else:
-            return self.visitChildren(ctx)
+    def visit(self, tree):
+        """
+        :param tree: parsed expression or its ParseArena
+        :return:
+        """
+        arena = tree if isinstance(tree, ParseArena) else ParseArena(tree)
+        # в стеке вершины арены и готовые части перевода
+        stack = [0]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                self.translated.append(item)
+                continue
+            children = arena.childList(item)
+            if not children or arena.flags[item] & PRIMITIVE_CHAIN:
+                self.translated.append(arena.compactText(item))
+                continue
+            stack.extend(reversed(self._translateNode(arena, item, children)))
+
+    def _translateNode(self, arena: ParseArena, node: int, children: List[int]) -> list:
+        """
+        Translation of node with several children: its children and FEEL words in output order
+        """
+        kind = arena.kinds[node]
+        if kind == JavaELParser.RULE_ternary:
+            return ['if', children[0], 'then', children[2], 'else', children[4]]
+        if kind == JavaELParser.RULE_relation and arena.kinds[children[1]] == TERMINAL:
+            # translateRelationalToFEEL получает терминал, а не текст, оператор сравнения пропускается
+            return [children[0], children[2]]
+        if kind == JavaELParser.RULE_equality:
+            return self.translateEqualityToFEEL(arena, children)
+        if kind == JavaELParser.RULE_base:
+            return self.translateUnaryToFEEL(arena, children)
+        return children
 
-    def visitTerminal(self, node):
-        # logger.debug("visit Terminal {}", node.getText())
-        self.translated.append(node.getText())
-
-    def visitPrimitive(self, ctx: JavaELParser.PrimitiveContext):
-        # logger.debug("visit Primitive {}: {} with translated {}", ctx.getText(),
-        #              [i.getText() for i in ctx.getChildren()],
-        #              self.translated)
-        self.translated.append(ctx.getText())
-
-    def translateUnaryToFEEL(self, ctx: ParserRuleContext):
-        child_cht = ctx.getChildCount()
-        for i in range(child_cht):
-            child = ctx.getChild(i)
-            if child not in self.visited:
-                if isinstance(child, TerminalNode):
-                    operator = child.symbol.type
-                    self.visited.append(child)
-
-                    if operator == JavaELParser.Not:
-                        self.translated.append('not(')
-                        self.translateUnaryToFEEL(ctx)
-                        self.translated.append(')')
-
-                    elif operator == JavaELParser.Empty:
-                        self.translateUnaryToFEEL(ctx)
-                        self.translated.append(' ')
-                        self.translated.append('null')
-                else:
-                    self.visit(child)
-                    self.visited.append(child)
-
-    def visitChildren(self, node):
-        result = self.defaultResult()
-        n = node.getChildCount()
-        for i in range(n):
-            if not self.shouldVisitNextChild(node, result):
-                return result
-
-            c = node.getChild(i)
-            childResult = None
-            if c not in self.visited:
-                childResult = c.accept(self)
-            result = self.aggregateResult(result, childResult)
-
-        return result
+    @staticmethod
+    def translateUnaryToFEEL(arena: ParseArena, children: List[int]) -> list:
+        # операторы вложены: ! empty x -> not( x null )
+        opening, closing = [], []
+        operand = 0
+        while operand < len(children) - 1 and arena.kinds[children[operand]] == TERMINAL \
+                and arena.tokenType(children[operand]) in PREFIX_OPERATORS:
+            operator = arena.tokenType(children[operand])
+            if operator == JavaELParser.Not:
+                opening.append('not(')
+                closing.append(')')
+            elif operator == JavaELParser.Empty:
+                closing.append('null')
+            operand += 1
+        return opening + children[operand:] + closing[::-1]
 
     @staticmethod
     def translateRelationalToFEEL(operator: str) -> str:
@@ -336,448 +442,397 @@ class ToFEELConverter(JavaELParserVisitor):
         elif operator == 'le':
             return '<='
 
-    def translateEqualityToFEEL(self, ctx: ParserRuleContext):
-        operator = ctx.getChild(1).getText()
+    @staticmethod
+    def translateEqualityToFEEL(arena: ParseArena, children: List[int]) -> list:
+        operator = arena.compactText(children[1])
         if operator == '==' or operator == 'eq':
-            self.translated.append(self.visit(ctx.getChild(0)))
-            self.translated.append('=')
-            self.translated.append(self.visit(ctx.getChild(2)))
-
+            return [children[0], '=', children[2]]
         elif operator == '!=' or operator == 'ne':
-            self.translated.append(self.visit(ctx.getChild(0)))
-            self.translated.append('not(')
-            self.translated.append(self.visit(ctx.getChild(2)))
-            self.translated.append(')')
+            return [children[0], 'not(', children[2], ')']
+        return []
 
 
-class DMNTreeBuilder(JavaELParserVisitor):
-    """
-    Extract to DMN node operands of non-logical operators
-    """
-    def __init__(self, node: DMNTreeNode):
-        super(DMNTreeBuilder, self).__init__()
-        self.node = node
+# правила, которые выносятся в ребенка как бинарный оператор
+BINARY_RULES = (JavaELParser.RULE_member, JavaELParser.RULE_algebraic, JavaELParser.RULE_equality)
+LOGICAL_OPERATORS = (JavaELParser.And, JavaELParser.Or, JavaELParser.Question)
+PREFIX_OPERATORS = (JavaELParser.Not, JavaELParser.Empty, JavaELParser.Minus)
 
-    def add_binary_children(self, ctx_l: ParserRuleContext, ctx_r: ParserRuleContext, operator: int):
-        # self.node
-        #    |
-        #    |
-        # operator
-        #  |    |
-        #  |    |
-        # left right
-        new_op_node = OperatorDMN(operator)
+# шаги обхода FormulaAnalyzer
+_ENTER, _EXIT, _SEGMENT = 0, 1, 2
+# режим вершины: вне выноса, под выносом детей, вынесена в ребенка
+_PASSIVE, _ACTIVE, _EXTRACTED = 0, 1, 2
 
-        new_expr_node_l = ExpressionDMN(ctx_l.getText(), [ctx_l])
-        new_expr_node_r = ExpressionDMN(ctx_r.getText(), [ctx_r])
 
-        new_op_node.children.append(new_expr_node_l)
-        new_op_node.children.append(new_expr_node_r)
-
-        self.node.children.append(new_op_node)
-        return id(new_op_node)
-
-    def add_unary_children(self, text: str, ctxs: List[ParserRuleContext], operator: int = None):
+class FormulaAnalyzer:
+    """
+    One iterative traversal of ParseArena: sub DMN extraction, simple operand marks and zipped formula
+    of expression node.
+    Extracted subtree is zipped and marked as one operand, the same as its dmn id in the rewritten expression,
+    so the rewritten expression is not parsed again
+    """
+    def __init__(self, arena: ParseArena, state: PassState = None, extract: bool = True):
         """
-        Генерирует имя для DMNTreeNode, создает нового ребенка у node,
-        в выражении родителя заменяет выражение ребенка на dmn id вида dmn_{int}
-        :param ctxs:
-        :param text:
-        :param operator:
-        :return:
+        :param arena: parse tree of expression
+        :param state: marks of arena, shared by all nodes of DMNTree
+        :param extract: extract sub DMN, False - only zip
         """
-        # self.node
-        #    |
-        #    |
-        # operator
-        #    |
-        #    |
-        # expression
-        if operator:
-            new_op_node = OperatorDMN(operator)
-            new_expr_node = ExpressionDMN(text, ctxs)
-            new_op_node.children.append(new_expr_node)
-            self.node.children.append(new_op_node)
-            return id(new_op_node)
-        else:
-            new_node = ExpressionDMN(text, ctxs)
-            self.node.children.append(new_node)
-            return id(new_node)
-
-    def visitBase(self, ctx: JavaELParser.BaseContext):
-        if ctx.getChildCount() > 1:
-            self.processUnary(ctx)
-        else:
-            return self.visitChildren(ctx)
-
-    def visitMember(self, ctx: JavaELParser.MemberContext):
-        if ctx.getChildCount() > 1:
-            self.processBinary(ctx)
-        else:
-            return self.visitChildren(ctx)
-
-    def visitAlgebraic(self, ctx: JavaELParser.AlgebraicContext):
-        if ctx.getChildCount() > 1:
-            self.processBinary(ctx)
-        else:
-            return self.visitChildren(ctx)
-
-    def visitEquality(self, ctx: JavaELParser.EqualityContext):
-        if ctx.getChildCount() > 1:
-            self.processBinary(ctx)
-        else:
-            return self.visitChildren(ctx)
-
-    def visitRelation(self, ctx: JavaELParser.RelationContext):
-        if ctx.getChildCount() > 1:
-            # пропустить скобки
-            if not (isinstance(ctx.getChild(0), TerminalNode) and ctx.getChild(0).symbol.type == JavaELParser.OpenParen) and not (isinstance(ctx.getChild(2), TerminalNode) and ctx.getChild(2).token.type != JavaELParser.CloseParen):
-                self.processBinary(ctx)
-            else:
-                return self.visitChildren(ctx)
-        else:
-            return self.visitChildren(ctx)
-
-    def processUnary(self, ctx: ParserRuleContext):
+        self.arena = arena
+        self.state = state if state is not None else PassState.ofArena(arena)
+        self.extract = extract
+        self.node = None
+        # (первый токен, последний токен, dmn id) - части выражения node, вынесенные в детей
+        self.edits = []
+        # вершины арены, пройденные анализатором
+        self.visits = 0
+
+    def analyze(self, node: ExpressionDMN) -> ExpressionZipped:
         """
-        Add DMNNode represents unary operator if operand not simple
-        :param ctx:
-        :return:
+        Extract sub DMN children of node, rewrite node expression and zip it
+        :param node: ExpressionDMN with arena nodes as contexts
+        :return: zipped rewritten expression with texts of its operands
         """
-        children_count = ctx.getChildCount()
-        for i in range(children_count):
-
-            # pass operated
-            if not hasattr(ctx.getChild(i), 'visited') or not ctx.getChild(i).visited:
-                maybe_operator = ctx.getChild(i)
-                maybe_operand = ctx.getChild(i + 1)
-
-                # case with chain unary operators
-                if isinstance(maybe_operand, TerminalNode):
-                    maybe_operator.visited = True
-
-                    new_child_ctxs = []
-                    new_child_text = []
-
-                    for j in range(i + 1, children_count):
-                        new_child_ctxs.append(ctx.getChild(j))
-                        new_child_text.append(ctx.getChild(j).getText())
-
-                    new_child_text = ' '.join(new_child_text)
-
-                    new_child_id = 'dmn' + str(self.add_unary_children(new_child_text, new_child_ctxs, maybe_operator))
-
-                    # редактируем свое выражение
-                    self.node.expression = self.node.expression.replace(maybe_operand.getText(),
-                                                                        ' ' + new_child_id + ' ')
-
-                    # все следующие пометить как принадлежащие node
-                    for j in range(i + 1, children_count):
-                        self.node.expression = self.node.expression.replace(ctx.getChild(j).getText(), '')
-                        add_color_to_ctx(ctx.getChild(j), new_child_id)
-                    break
-                else:
-                    maybe_operator.visited = True
-                    maybe_operand.visited = True
-                    new_child_id = 'dmn' + str(
-                        self.add_unary_children(maybe_operand.getText(), [maybe_operand], maybe_operator))
-
-                    # редактируем свое выражение
-                    self.node.expression = self.node.expression.replace(maybe_operand.getText(),
-                                                                        ' ' + new_child_id + ' ')
-                    # пометить операнд как принадлежащий node
-                    add_color_to_ctx(maybe_operand, new_child_id)
-                    # self.node.expression = self.node.expression.replace(maybe_operand.getText(), ' ' + new_child_id + ' ')
-
-                    break
-
-    def processBinary(self, ctx: ParserRuleContext):
+        self.node = node
+        self.edits = []
+        zipped = []
+        for arena_node in node.contexts:
+            self._traverse(arena_node, zipped)
+        expression = self._zippedText(zipped)
+        operands = self._operandTexts(expression, node.span)
+        self.applyEdits()
+        self.node = None
+        return ExpressionZipped(expression, self.arena, operands)
+
+    def zip(self, arena_node: int) -> ExpressionZipped:
         """
-        Add DMNNode if at least one operand not simple
-        :param ctx:
+        Zip expression without extraction
+        :param arena_node: root of expression
         :return:
         """
-        children_count = ctx.getChildCount()
-        if children_count > 1:
-            if not isCtxSimple(ctx.getChild(0)) or not isCtxSimple(ctx.getChild(2)):
-                self.add_binary_children(ctx.getChild(0), ctx.getChild(2), ctx.getChild(1).symbol.type)
-                # if not isinstance(ctx.getChild(0), TerminalNode):
-                #     if not isCtxSimple(ctx.getChild(0)):
-                #         self.add_unary_children(ctx.getChild(0), ctx.getChild(1))
-                #         add_color_to_ctx(ctx.getChild(0), 'dmn_id' + str(id(self.node)))
-                # if not isinstance(ctx.getChild(2), TerminalNode):
-                #     if not isCtxSimple(ctx.getChild(2)):
-                #         self.add_unary_children(ctx.getChild(2), ctx.getChild(1))
-                #         add_color_to_ctx(ctx.getChild(2), 'dmn_id' + str(id(self.node)))
-
-
-class SimpleOperandMarker(JavaELParserVisitor):
-    """
-    Find and mark logical operands without other logical operators
-    """
+        self.edits = []
+        zipped = []
+        self._traverse(arena_node, zipped)
+        expression = self._zippedText(zipped)
+        return ExpressionZipped(expression, self.arena, self._operandTexts(expression, self.arena.span(arena_node)))
 
     @staticmethod
-    def _findSimpleOperandAncestor(ctx: ParserRuleContext) -> ParserRuleContext or None:
-        while ctx.parentCtx:
-            if hasattr(ctx, 'is_simple_operand') and ctx.is_simple_operand:
-                return ctx
-            else:
-                ctx = ctx.parentCtx
-        return None
-
-    @staticmethod
-    def _mark_simple(ctx: ParserRuleContext, operator: TerminalNode):
-        children = list(ctx.getChildren())
-        children_cnt = len(children)
-
-        if isinstance(ctx, (JavaELParser.ExpressionContext, JavaELParser.TermContext)):
-            for i in range(children_cnt):
-                if hasattr(children[i], 'symbol') and children[i].symbol.type == operator:
-                    # убрать is_simple_operand у прямых родителей
-                    if i - 1 >= 0:
-                        left_operand_parent_with_simple = SimpleOperandMarker._findSimpleOperandAncestor(
-                            children[i - 1])
-                        if left_operand_parent_with_simple:
-                            left_operand_parent_with_simple.is_simple_operand = False
-                        children[i - 1].is_simple_operand = True
-
-                    if i + 1 < children_cnt:
-                        right_operand_parent_with_simple = SimpleOperandMarker._findSimpleOperandAncestor(
-                            children[i + 1])
-                        if right_operand_parent_with_simple:
-                            right_operand_parent_with_simple.is_simple_operand = False
-                        children[i + 1].is_simple_operand = True
-        elif isinstance(ctx, JavaELParser.BaseContext):
-            for i in range(children_cnt):
-                if not (hasattr(children[i], 'symbol') and children[i].symbol.type in [JavaELParser.Not,
-                                                                                       JavaELParser.Empty,
-                                                                                       JavaELParser.Minus]):
-                    # operand branch
-                    operand_marked_parent = SimpleOperandMarker._findSimpleOperandAncestor(children[i])
-                    if operand_marked_parent:
-                        operand_marked_parent.is_simple_operand = False
-                    children[i].is_simple_operand = True
-                    return
-
-    def visitTerm(self, ctx: JavaELParser.TermContext):
-
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-        self._mark_simple(ctx, JavaELParser.And)
-        return self.visitChildren(ctx)
-
-    def visitExpression(self, ctx: JavaELParser.ExpressionContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-
-        self._mark_simple(ctx, JavaELParser.Or)
-        return self.visitChildren(ctx)
-
-    def visitBase(self, ctx: JavaELParser.BaseContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-
-        self._mark_simple(ctx, JavaELParser.Not)
-        return self.visitChildren(ctx)
-
-    def visitTernary(self, ctx:JavaELParser.TernaryContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-        else:
-            return self.visitChildren(ctx)
-
-    def visitEquality(self, ctx:JavaELParser.EqualityContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-        else:
-            return self.visitChildren(ctx)
-
-    def visitRelation(self, ctx:JavaELParser.RelationContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-        else:
-            return self.visitChildren(ctx)
-
-    def visitAlgebraic(self, ctx:JavaELParser.AlgebraicContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-        else:
-            return self.visitChildren(ctx)
-
-    def visitMember(self, ctx:JavaELParser.MemberContext):
-        # если нода помечена как dmn, то она простая
-        if hasattr(ctx, 'colors') and len(ctx.colors):
-            ctx.is_simple_operand = True
-            return
-        else:
-            return self.visitChildren(ctx)
-
-    def visitTerminal(self, node):
-        # если нода помечена как dmn, то она простая
-        if hasattr(node, 'colors') and len(node.colors):
-            node.is_simple_operand = True
+    def _zippedText(zipped: List[str]) -> str:
+        return re.sub(r'\s+', ' ', ''.join(zipped).replace(' . ', '.'))
+
+    def _operandTexts(self, expression: str, region: Tuple[int, int]) -> Dict[str, str]:
+        # текст операнда - токены его вершины с вынесенными частями, замененными на dmn id
+        source = self.arena.source
+        region_start, region_stop = region
+        edits = sorted(self.edits)
+        edit_starts = [e[0] for e in edits]
+        operands = {}
+        for operand_id in set(extract_id_re.findall(expression)):
+            start, stop = self.arena.span(int(operand_id))
+            start, stop = max(start, region_start), min(stop, region_stop)
+            operand_edits = edits[bisect_left(edit_starts, start):bisect_left(edit_starts, stop + 1)]
+            operands[operand_id] = source.rewrite(start, stop, operand_edits)
+        return operands
+
+    def replaceSpan(self, start: int, stop: int, dmn_id: str):
+        self.edits.append((start, stop, dmn_id))
+
+    def applyEdits(self):
+        """
+        Rewrite node expression once: tokens of node span with extracted parts replaced by dmn ids
+        :return:
+        """
+        if not self.edits:
             return
-        else:
-            return self.visitChildren(node)
+        self.node.expression = self.arena.source.rewrite(self.node.span[0], self.node.span[1], self.edits)
+        self.edits = []
 
+    def _expressionNode(self, arena_node: int) -> ExpressionDMN:
+        return ExpressionDMN(self.arena.text(arena_node), [arena_node], self.arena.span(arena_node))
 
-class FormulaZipper(JavaELParserVisitor):
-    def __init__(self):
-        super(FormulaZipper, self).__init__()
-        self._zipped = []
+    def _operatorType(self, arena_node: int) -> int:
+        return OPERATOR_TYPES.get(self.arena.compactText(arena_node), self.arena.tokenType(arena_node))
 
-    @property
-    def result(self):
-        to_ret = ''.join([token for token in self._zipped if token is not None]).replace(' . ', '.')
-        to_ret = re.sub(r'\s+', ' ', to_ret)
-        return to_ret
+    def _addChild(self, child: ExpressionDMN, operator: int = None) -> str:
+        # ребенок с оператором или без, в выражении заменяется на dmn id
+        if operator is not None:
+            operator_node = OperatorDMN(operator)
+            operator_node.children.append(child)
+            child = operator_node
+        self.node.children.append(child)
+        return 'dmn' + str(id(child))
 
-    def visitTernary(self, ctx: JavaELParser.TernaryContext):
+    def processUnary(self, arena_node: int, children: List[int]):
         """
-        A ? B : C ==
-        (A -> B) and (!A -> C) == (!A or B) and (A or C) ==
-        (!A and A) or (!A and С) or (B and A) or (B and С) ==
-        (!A and С) or (A and B) or (B and С)
-        :param ctx:
+        Add DMNNode represents unary operator, operator and operand are replaced by its dmn id
+        :param arena_node: base node
+        :param children:
         :return:
         """
-        if ctx.getChildCount() > 1:  # ternary expression here
-            ctx_children = list(ctx.getChildren())
-            condition_expression = ctx_children[0]
-            true_ternary = ctx_children[2]
-            false_ternary = ctx_children[4]
-
-            # (not (A) and C)
-            self._zipped.append('(! (')
-            self._zipped.append(self.visit(condition_expression))
-            self._zipped.append(') and ')
-            self._zipped.append(self.visit(false_ternary))
-            self._zipped.append(')')
-            # or
-            self._zipped.append(' or ')
-            # (A and B)
-            self._zipped.append('(')
-            self._zipped.append(self.visit(condition_expression))
-            self._zipped.append(' and ')
-            self._zipped.append(self.visit(true_ternary))
-            self._zipped.append(')')
-            # # or
-            # self._zipped.append(' or ')
-            # # (B and C)
-            # self._zipped.append('(')
-            # self._zipped.append(self.visit(false_ternary))
-            # self._zipped.append(' and ')
-            # self._zipped.append(self.visit(true_ternary))
-            # self._zipped.append(')')
-        else:
-            return self.visitChildren(ctx)
-
-    def visitExpression(self, ctx: JavaELParser.ExpressionContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitTerm(self, ctx: JavaELParser.TermContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitEquality(self, ctx: JavaELParser.EqualityContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitRelation(self, ctx: JavaELParser.RelationContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitAlgebraic(self, ctx: JavaELParser.AlgebraicContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitMember(self, ctx: JavaELParser.MemberContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitBase(self, ctx: JavaELParser.BaseContext):
-        return self.addIdIfSimple(ctx)
-
-    def visitValue(self, ctx: JavaELParser.ValueContext):
-        return self.addIdIfSimple(ctx)
+        arena, visited = self.arena, self.state.visited
+        for i, operator in enumerate(children):
+            if visited[operator]:
+                continue
+            visited[operator] = 1
+            operand = children[i + 1]
+            operator_index = arena.starts[operator]
+            if arena.kinds[operand] == TERMINAL:
+                # ребенок - остаток цепочки унарных операторов, их разберет анализ ребенка
+                span = (operator_index + 1, arena.stops[arena_node])
+                child = ExpressionDMN(arena.source.text(*span), [arena_node], span)
+            else:
+                visited[operand] = 1
+                child = self._expressionNode(operand)
+            self.replaceSpan(operator_index, arena.stops[arena_node], self._addChild(child, self._operatorType(operator)))
+            break
 
-    def visitPrimitive(self, ctx: JavaELParser.PrimitiveContext):
-        return self.addIdIfSimple(ctx)
+    def processBinary(self, arena_node: int, children: List[int]) -> bool:
+        """
+        Add DMNNode if at least one operand not simple
+        :param arena_node:
+        :param children:
+        :return: operator is extracted
+        """
+        flags = self.arena.flags
+        if flags[children[0]] & SIMPLE_OPERAND and flags[children[2]] & SIMPLE_OPERAND:
+            return False
+        operator_node = OperatorDMN(self._operatorType(children[1]))
+        operator_node.children.extend((self._expressionNode(children[0]), self._expressionNode(children[2])))
+        self.node.children.append(operator_node)
+        self.replaceSpan(*self.arena.span(arena_node), 'dmn' + str(id(operator_node)))
+        return True
+
+    def extractCondition(self, condition: int) -> bool:
+        """
+        Condition of ternary with logical operators becomes child node without operator.
+        A ? B : C lowered to (!A and C) or (A and B), so condition is shared by dmn id, not copied
+        :param condition: first child of ternary
+        :return: condition is extracted
+        """
+        if not self.arena.hasTokenType(condition, LOGICAL_OPERATORS):
+            return False
+        self.replaceSpan(*self.arena.span(condition), self._addChild(self._expressionNode(condition)))
+        return True
 
-    def visitTerminal(self, node):
-        self._zipped.append(node.getText() + ' ')
+    def _extractStep(self, arena_node: int, children: List[int]) -> int:
+        """
+        Extraction decision on the lowest context of node
+        :return: mode of node children, _EXTRACTED - node itself is extracted
+        """
+        if len(children) < 2:
+            return _ACTIVE
+        kind = self.arena.kinds[arena_node]
+        if kind == JavaELParser.RULE_base:
+            self.processUnary(arena_node, children)
+            return _EXTRACTED
+        if kind in BINARY_RULES or (kind == JavaELParser.RULE_relation and not (
+                self.arena.kinds[children[0]] == TERMINAL and self.arena.tokenType(children[0]) == JavaELParser.OpenParen)):
+            # простые операнды не обходятся
+            return _EXTRACTED if self.processBinary(arena_node, children) else _PASSIVE
+        return _ACTIVE
+
+    def _unmarkSimpleAncestor(self, i: int, boundary: int):
+        ancestor = self.state.simpleAncestorOf(i, boundary)
+        if ancestor >= 0:
+            self.state.simple[ancestor] = 0
+
+    def _mark(self, i: int, boundary: int):
+        self._unmarkSimpleAncestor(i, boundary)
+        self.state.simple[i] = 1
+
+    def _markSimple(self, arena_node: int, children: List[int], boundary: int):
+        # пометка простых операндов для контекстов цепочки сверху вниз
+        arena = self.arena
+        if arena.flags[arena_node] & UNIT_BASE:
+            # base с одним ребенком помечает value, value - часть той же вершины
+            self._mark(arena_node, boundary)
+        if len(children) < 2:
+            return
+        kind = arena.kinds[arena_node]
+        if kind == JavaELParser.RULE_expression or kind == JavaELParser.RULE_term:
+            operator = JavaELParser.Or if kind == JavaELParser.RULE_expression else JavaELParser.And
+            for i, child in enumerate(children):
+                if arena.kinds[child] == TERMINAL and arena.tokenType(child) == operator:
+                    for operand in (i - 1, i + 1):
+                        if 0 <= operand < len(children):
+                            self._mark(children[operand], boundary)
+        elif kind == JavaELParser.RULE_base:
+            for child in children:
+                if not (arena.kinds[child] == TERMINAL and arena.tokenType(child) in PREFIX_OPERATORS):
+                    self._mark(child, boundary)
+                    return
 
-    def addIdIfSimple(self, ctx: ParserRuleContext):
-        if hasattr(ctx, 'is_simple_operand') and ctx.is_simple_operand:
-            logger.debug('dmn_id {}', hasattr(ctx, 'dmn_id'))
-            self._zipped.append('op_' + str(id(ctx)) + ' ')
-        else:
-            return self.visitChildren(ctx)
+    def _traverse(self, root: int, zipped: List[str]):
+        arena, simple = self.arena, self.state.simple
+        # корень разбирается как отдельное выражение, он не бывает простым операндом
+        simple[root] = 0
+
+        stack = [(_ENTER, root, _ACTIVE if self.extract else _PASSIVE)]
+        while stack:
+            step = stack.pop()
+            if step[0] == _SEGMENT:
+                step[1].append(len(zipped))
+                continue
+
+            if step[0] == _EXIT:
+                _, arena_node, start, segments = step
+                if simple[arena_node] and arena.flags[arena_node] & ZIPPABLE:
+                    del zipped[start:]
+                    zipped.append('op_' + str(arena_node) + ' ')
+                elif segments is not None:
+                    # A ? B : C -> (! (A) and C) or (A and B)
+                    condition = zipped[segments[0]:segments[1]]
+                    true_ternary = zipped[segments[2]:segments[3]]
+                    false_ternary = zipped[segments[4]:]
+                    del zipped[start:]
+                    zipped.append('(! (')
+                    zipped.extend(condition)
+                    zipped.append(') and ')
+                    zipped.extend(false_ternary)
+                    zipped.extend((')', ' or ', '('))
+                    zipped.extend(condition)
+                    zipped.append(' and ')
+                    zipped.extend(true_ternary)
+                    zipped.append(')')
+                continue
+
+            _, arena_node, mode = step
+            self.visits += 1
+            children = arena.childList(arena_node)
+            if mode == _ACTIVE:
+                mode = self._extractStep(arena_node, children)
+
+            if mode == _EXTRACTED:
+                # вынесенное поддерево - один операнд, как dmn id в переписанном выражении
+                self._mark(arena_node, root)
+                stack.append((_EXIT, arena_node, len(zipped), None))
+                continue
+
+            self._markSimple(arena_node, children, root)
+
+            children_modes = [mode] * len(children)
+            segments = None
+            if arena.kinds[arena_node] == JavaELParser.RULE_ternary and len(children) > 1:
+                segments = []
+                if mode == _ACTIVE and self.extractCondition(children[0]):
+                    children_modes[0] = _EXTRACTED
+
+            stack.append((_EXIT, arena_node, len(zipped), segments))
+            if not children:
+                zipped.append(arena.text(arena_node) + ' ')
+            for i in reversed(range(len(children))):
+                stack.append((_ENTER, children[i], children_modes[i]))
+                if segments is not None:
+                    stack.append((_SEGMENT, segments))
 
 
 class DMN_XML:
     @classmethod
-    def visit(cls, tree: DMNTree) -> etree.Element:
+    def visit(cls, tree: DMNTree, types: InputTypes = None) -> etree.Element:
         """
         DFS на возврате
+        :param tree: translated DMNTree
+        :param types: types of inputs in catalog, by default each table infers types of its inputs
         :return:
         """
         root = tree.root
         decisions = []
-        cls._dfs(root, decisions)
+        for node in postorder(root):
+            cls._visitNode(node, decisions, types)
         return expression_xml('drd_id', decisions)
 
     @classmethod
-    def _dfs(cls, node: DMNTreeNode, decisions: List[etree.Element]):
-        if len(node.children):
-            for child in node.children:
-                cls._dfs(child, decisions)
+    def inputs(cls, tree: DMNTree) -> Set[str]:
+        """
+        :param tree: translated DMNTree
+        :return: inputs of expression tables of tree
+        """
+        inputs = set()
+        for node in postorder(tree.root):
+            if isinstance(node, ExpressionDMN):
+                inputs |= DmnElementsExtracter.getInputs(node.expression)
+        return inputs
+
+    @classmethod
+    def observeTypes(cls, tree: DMNTree, types: InputTypes) -> List[str]:
+        """
+        Add entries of expression tables of tree to catalog types, before visit of catalog trees
+        :param tree: translated DMNTree
+        :param types: types of inputs in catalog
+        :return: inputs with changed type
+        """
+        changed = []
+        for node in postorder(tree.root):
+            if isinstance(node, ExpressionDMN):
+                expression, operators = node.expression, node.operators
+            elif node.operator == JavaELParser.Empty and _isSingleOperand(node.children[0]):
+                # см. visitConstraint
+                expression, operators = node.children[0].expression, (JavaELParser.Empty,)
+            else:
+                continue
+            inputs = DmnElementsExtracter.getInputs(expression)
+            rules = DecisionTable.expressionRules(expression, inputs, operators)
+            changed.extend(i for i in types.observeRules(inputs, rules) if i not in changed)
+        return changed
 
+    @classmethod
+    def _visitNode(cls, node: DMNTreeNode, decisions: List[etree.Element], types: InputTypes = None):
         # constraint dmn node
         if isinstance(node, OperatorDMN):
-            cls.visitConstraint(node, decisions)
+            cls.visitConstraint(node, decisions, types)
         elif isinstance(node, ExpressionDMN):
             # expression node
-            cls.visitExpression(node, decisions)
+            cls.visitExpression(node, decisions, types)
         else:
             raise ValueError('XML builder got wrong DMN node type')
 
     @classmethod
-    def visitExpression(cls, node: ExpressionDMN, decision_list: List[etree.Element]):
+    def visitExpression(cls, node: ExpressionDMN, decision_list: List[etree.Element], types: InputTypes = None):
         logger.debug(f'construct DMN xml from <red>expression</red>: <green>{node.expression}</green>')
 
         dependents = ['dmn' + str(id(c)) for c in node.children]
 
-        new_table = DecisionTable.from_expression(node.expression, 'output_name here', dependents)
+        new_table = DecisionTable.from_expression(node.expression, 'output_name here', dependents, types,
+                                                  node.operators)
 
-        if not new_table:
+        if new_table is None:
             logger.error(f'construct DMN xml from <red>expression</red>: <green>{node.expression}</green> failure')
             raise ValueError('DecisionTable is None')
 
+        cls._nameDecision(node, new_table)
         decision_list.append(new_table)
 
+    @staticmethod
+    def _nameDecision(node: DMNTreeNode, decision: etree.Element):
+        """
+        Decision and its output are named by dmn id, the parent uses this name as input and requiredInput href
+        :param node:
+        :param decision:
+        :return:
+        """
+        name = 'dmn' + str(id(node))
+        decision.set('name', name)
+        for output in decision.iter('output'):
+            output.set('name', name)
+
     @classmethod
-    def visitConstraint(cls, node: OperatorDMN, decision_list: List[etree.Element]):
-        logger.debug(f'construct DMN xml from <red>constraint</red>: <green>{node.operator}</green>')
+    def visitConstraint(cls, node: OperatorDMN, decision_list: List[etree.Element], types: InputTypes = None):
+        logger.debug(f'construct DMN xml from <red>constraint</red>: <green>{node.operatorName}</green>')
 
         dependents = ['dmn' + str(id(c)) for c in node.children]
 
-        if node.operator.symbol.type in [JavaELParser.Empty, JavaELParser.Not]:
-            new_table = DecisionTable.from_constraint(node.operator.symbol.type, dependents, decision_list[-1])
+        if node.operator == JavaELParser.Empty and _isSingleOperand(node.children[0]):
+            # empty проверяет значение операнда, а не boolean результат его таблицы
+            new_table = DecisionTable.from_expression(node.children[0].expression, DecisionTable.OPERATION_RESULT_LABEL,
+                                                      [], types, (JavaELParser.Empty,))
+            cls._nameDecision(node, new_table)
+            decision_list.append(new_table)
+        elif node.operator in [JavaELParser.Empty, JavaELParser.Not]:
+            new_table = DecisionTable.from_constraint(node.operator, dependents, decision_list[-1])
 
             if new_table is None:
-                logger.error(f'construct DMN xml from <red>constraint</red>: <green>{node.operator}</green> failure')
+                logger.error(f'construct DMN xml from <red>constraint</red>: <green>{node.operatorName}</green> failure')
                 raise ValueError('DecisionTable is None')
 
+            cls._nameDecision(node, new_table)
             decision_list.append(new_table)
         else:
             left_op = decision_list[-2]
@@ -786,9 +841,10 @@ class DMN_XML:
             new_table = DecisionTable.from_constraint(node.operator, dependents, left_op, right_op)
 
             if new_table is None:
-                logger.error(f'construct DMN xml from <red>constraint</red>: <green>{node.operator}</green> failure')
+                logger.error(f'construct DMN xml from <red>constraint</red>: <green>{node.operatorName}</green> failure')
                 raise ValueError('DecisionTable is None')
 
+            cls._nameDecision(node, new_table)
             decision_list.append(new_table)
 
 
@@ -798,70 +854,187 @@ def treeHeight(ctx: ParserRuleContext) -> int:
     :param ctx: subtree root
     :return: subtree height
     """
+    # высота считается по терминалам, вершина без детей не учитывается
     subtree_height = 0
-    heightDFS.height = 0
-    heightDFS(ctx, subtree_height)
-    subtree_height = heightDFS.height
-    del heightDFS.height
+    stack = [(ctx, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, TerminalNode):
+            subtree_height = max(subtree_height, depth)
+        elif node.children:
+            stack.extend((child, depth + 1) for child in node.children)
     return subtree_height
 
 
-def heightDFS(ctx: ParserRuleContext, cur_h: int):
-    cur_h = cur_h + 1
-    # logger.debug("{} height {}", ctx.getText(), cur_h)
-    if isinstance(ctx, TerminalNode):
-        heightDFS.height = max(heightDFS.height, cur_h)
-        return cur_h - 1
-    for child in ctx.getChildren():
-        cur_h = heightDFS(child, cur_h)
-    return cur_h - 1
-
-
-def toParentTernaryDist(ctx: ParserRuleContext) -> int:
-    dist = 0
-    while not isinstance(ctx.parentCtx, JavaELParser.TernaryContext):
-        ctx = ctx.parentCtx
-        dist += 1
-    return dist
-
-
-def isCtxSimple(ctx: ParserRuleContext) -> bool:
+def translateDMNReadyinDMNTree(dmntree: DMNTree, dnf_budget: int = DNF_SIZE_BUDGET,
+                               parser: str = ANTLR_PARSER, canonical=None) -> None:
     """
-    subtree is simple operand if
-    max dist to bottom + dist to parent Ternary == 10 (distance to bottom in simple case)
-    and ctx can be fork, not a TerminalNode
-    :param ctx: root of subtree
-    :return: bool
+    :param dmntree:
+    :param dnf_budget: max DNF size estimate of one decision
+    :param parser: parser of translated formulas
+    :param canonical: CanonicalForms of catalog, equivalent decisions without children share one translation
+    :return:
     """
-    th = treeHeight(ctx)
-    tp = toParentTernaryDist(ctx)
-    return th + tp == 10 and not isinstance(ctx, TerminalNode)
+    root_node = dmntree.root
+    _translateDMNReadyinDMNTree(root_node, dnf_budget, parser, canonical)
 
 
-def translateDMNReadyinDMNTree(dmntree: DMNTree) -> None:
-    root_node = dmntree.root
-    _translateDMNReadyinDMNTree(root_node)
+def _translateDMNReadyinDMNTree(root: DMNTreeNode, dnf_budget: int = DNF_SIZE_BUDGET,
+                                parser: str = ANTLR_PARSER, canonical=None) -> None:
+    # дети до родителя: промежуточные решения родителя добавляются к уже переведенным детям
+    for node in postorder(root):
+        _translateDMNReadyNode(node, dnf_budget, parser, canonical)
 
 
-def _translateDMNReadyinDMNTree(node: DMNTreeNode) -> None:
+def _translateDMNReadyNode(node: DMNTreeNode, dnf_budget: int, parser: str = ANTLR_PARSER, canonical=None) -> None:
     # нет оператора -> выражение состоит только из логических операторов,
     # нелогические операторы имеют только простые операнды
-
-    for child in node.children:
-        _translateDMNReadyinDMNTree(child)
-
     if isinstance(node, ExpressionDMN):
         logger.debug(f"translating ExpressionDMN node {node.expression}")
-        node.expression = zipFormula(tree(node.expression)).expression
-        node.expression = toDMNReady(node.expression)
-        node.expression = unpack(concatWithOr(node.expression))
+        zipped = node.zipped if node.zipped is not None else zipFormula(tree(node.expression, parser=parser))
+        node.zipped = None
+        # перевод решения без детей зависит только от его булевой функции
+        key = None
+        if canonical is not None and not node.children:
+            key = canonical.key(zipped)
+        if key is not None:
+            canonical.add(key, node.expression)
+            translation = canonical.translation(key, dnf_budget)
+            if translation is not None:
+                node.expression = translation
+                logger.debug(f"canonical form {key}: {node.expression}")
+                return
+        dmn_ready = toDMNReadyBounded(zipped.expression, dnf_budget, equalityDomains(zipped))
+        if not dmn_ready.rows:
+            # все строки противоречивы: решение всегда false, таблица из одной строки false
+            node.expression = CONSTANT_FALSE
+            logger.debug('dnf converted: no satisfiable rows, constant false')
+            return
+        aux_ids = addIntermediateDecisions(node, dmn_ready.intermediates, dnf_budget, zipped.operands, parser,
+                                           canonical)
+        node.expression = unpack(concatWithOr({replaceAux(row, aux_ids) for row in dmn_ready.rows}),
+                                 zipped.operands)
+        del zipped
         logger.debug(f"dnf converted: {node.expression}")
-        dmn_ready_tree = tree(node.expression)
+        dmn_ready_tree = tree(node.expression, parser=parser)
         conv = ToFEELConverter()
         conv.visit(dmn_ready_tree)
         node.expression = conv.result
+        # промежуточные решения ссылаются на вершины этого дерева
+        if key is not None and not node.children:
+            canonical.remember(key, dnf_budget, node.expression)
     elif isinstance(node, OperatorDMN):
-        logger.debug(f"skip OperatorDMN node {node.operator}")
+        logger.debug(f"skip OperatorDMN node {node.operatorName}")
+
+
+def replaceAux(formula: str, aux_ids: dict) -> str:
+    return aux_re.sub(lambda m: aux_ids[m.group(0)], formula)
+
+
+def addIntermediateDecisions(node: ExpressionDMN, intermediates: dict, dnf_budget: int,
+                             operands: Dict[str, str] = None, parser: str = ANTLR_PARSER, canonical=None) -> dict:
+    """
+    Create translated child ExpressionDMN for every aux variable of bounded DNF
+    aux variable used in other intermediate formula becomes child of its node
+    :param node: node with bounded formula
+    :param intermediates: {aux variable: formula in toDMNReady rows format}
+    :param dnf_budget:
+    :param operands: texts of operands of zipped formula
+    :param parser: parser of translated formulas
+    :param canonical: CanonicalForms shared with node
+    :return: {aux variable: dmn id}
+    """
+    aux_nodes = {aux_name: ExpressionDMN('', []) for aux_name in intermediates}
+    aux_ids = {aux_name: 'dmn' + str(id(aux_node)) for aux_name, aux_node in aux_nodes.items()}
+    nested = set()
+
+    for aux_name, formula in intermediates.items():
+        aux_nodes[aux_name].expression = unpack(replaceAux(formula, aux_ids), operands)
+        for used in aux_re.findall(formula):
+            aux_nodes[aux_name].children.append(aux_nodes[used])
+            nested.add(used)
+
+    for aux_name, aux_node in aux_nodes.items():
+        if aux_name not in nested:
+            logger.debug(f"intermediate decision {aux_ids[aux_name]}: {aux_node.expression}")
+            _translateDMNReadyinDMNTree(aux_node, dnf_budget, parser, canonical)
+            node.children.append(aux_node)
+
+    return aux_ids
+
+
+def _isReference(expression: str, node: DMNTreeNode) -> bool:
+    reference = DECISION_REFERENCE_RE.match(expression)
+    return reference is not None and int(reference.group(1)) == id(node)
+
+
+def _isBoolean(node: DMNTreeNode) -> bool:
+    # результат ограничений, ! и empty - true или false
+    if isinstance(node, OperatorDMN) or node.operators:
+        return True
+    try:
+        inputs = DmnElementsExtracter.getInputs(node.expression)
+        rules = DmnElementsExtracter.getRulesOrdered(node.expression, inputs)
+    except Exception:
+        return False
+    return {rule.outputEntry for rule in rules} <= {'true', 'false'}
+
+
+def _isSingleOperand(node: DMNTreeNode) -> bool:
+    # empty проверяет значение операнда: сворачивается только над таблицей из одного входа без операторов
+    if not isinstance(node, ExpressionDMN) or node.operators or node.children:
+        return False
+    try:
+        inputs = DmnElementsExtracter.getInputs(node.expression)
+    except Exception:
+        return False
+    # вход - весь путь операнда: fields.a, fields [ "a" ], а не первый идентификатор fields
+    path = feelUnaryTests.operandPath(node.expression)
+    operand = normalizedTest(node.expression.strip().strip('()'))
+    return path is not None and inputs == {path} and bool(operand) and isBare(path, operand)
+
+
+def collapseChains(dmn_tree: DMNTree) -> int:
+    """
+    Fuse trivial decisions of translated tree before XML generation:
+    ! over expression decision becomes mapping of outputs of its table, empty over single operand
+    becomes test of its input,
+    expression decision which only passes boolean result of its single child is replaced by the child
+    ( dmn1 ) -> not -> ( fields [ "a" ] = 1 )   ->   ( fields [ "a" ] = 1 ) with operators (not)
+    :param dmn_tree: translated DMNTree
+    :return: count of removed decisions
+    """
+    parents = {}
+    nodes = list(postorder(dmn_tree.root))
+    for node in nodes:
+        for child in node.children:
+            parents[id(child)] = node
+
+    removed = 0
+    for node in nodes:
+        replacement = None
+        if isinstance(node, OperatorDMN) and node.operator in FOLDED_OPERATORS and len(node.children) == 1 \
+                and isinstance(node.children[0], ExpressionDMN) \
+                and (node.operator == JavaELParser.Not or _isSingleOperand(node.children[0])):
+            replacement = node.children[0]
+            replacement.operators += (node.operator,)
+        elif isinstance(node, ExpressionDMN) and len(node.children) == 1 and not node.operators \
+                and _isReference(node.expression, node.children[0]) and _isBoolean(node.children[0]):
+            replacement = node.children[0]
+        if replacement is None:
+            continue
+
+        removed += 1
+        parent = parents.get(id(node))
+        parents[id(replacement)] = parent
+        if parent is None:
+            dmn_tree.root = replacement
+            continue
+        parent.children[parent.children.index(node)] = replacement
+        # родитель ссылается на решение по имени dmn + id
+        if isinstance(parent, ExpressionDMN):
+            parent.expression = re.sub(rf'\bdmn{id(node)}\b', f'dmn{id(replacement)}', parent.expression)
+    return removed
 
 
 def printDMNTree(dmntree: DMNTree) -> None:
@@ -869,12 +1042,14 @@ def printDMNTree(dmntree: DMNTree) -> None:
     _printDMNTree(root_node)
 
 
-def _printDMNTree(node: DMNTreeNode) -> None:
-    if isinstance(node, ExpressionDMN):
-        logger.debug(
-            f"ExpressionDMN node {id(node)} expression: {node.expression}, children: {len(node.children)}")
-    elif isinstance(node, OperatorDMN):
-        logger.debug(
-            f"OperatorDMN node {id(node)} operator: {node.operator}")
-    for child in node.children:
-        _printDMNTree(child)
+def _printDMNTree(root: DMNTreeNode) -> None:
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ExpressionDMN):
+            logger.debug(
+                f"ExpressionDMN node {id(node)} expression: {node.expression}, children: {len(node.children)}")
+        elif isinstance(node, OperatorDMN):
+            logger.debug(
+                f"OperatorDMN node {id(node)} operator: {node.operatorName}")
+        stack.extend(reversed(node.children))
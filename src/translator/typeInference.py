@@ -0,0 +1,164 @@
+import re
+from enum import Enum
+from typing import Dict, Iterable, List, Optional
+
+from src.translator.rulePruning import Literal, literalOf, normalizedTest, isBare, EQUALITY_TEST_RE
+
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+LIST_ITEM_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[^,]+')
+# вход - результат другого решения, решения выдают true или false
+DECISION_INPUT_RE = re.compile(r'^dmn\d+$')
+
+
+class TypeRef(Enum):
+    STRING = 1,
+    INTEGER = 2
+    DOUBLE = 3
+    BOOLEAN = 4
+    DATE = 5
+
+
+TYPE_REF_NAMES = {
+    TypeRef.STRING: 'string',
+    TypeRef.INTEGER: 'integer',
+    TypeRef.DOUBLE: 'double',
+    TypeRef.BOOLEAN: 'boolean',
+    TypeRef.DATE: 'date',
+}
+
+# виды значений, с которыми сравнивается вход
+BOOLEAN, INTEGER, DOUBLE, STRING, DATE = 'boolean', 'integer', 'double', 'string', 'date'
+BOOLEAN_STRING, INTEGER_STRING, DOUBLE_STRING = 'boolean_string', 'integer_string', 'double_string'
+
+_NUMBERS = {INTEGER, DOUBLE, INTEGER_STRING, DOUBLE_STRING}
+
+
+def literalKind(literal: Literal) -> Optional[str]:
+    """
+    Kind of compared value, strings which JavaEL coerces to number or boolean have own kinds
+    :param literal:
+    :return: kind, None for null
+    """
+    if literal.kind == 'null':
+        return None
+    if literal.kind == 'boolean':
+        return BOOLEAN
+    if literal.kind == 'number':
+        return INTEGER if literal.value == literal.value.to_integral_value() else DOUBLE
+    value = literal.value
+    if DATE_RE.match(value):
+        return DATE
+    if value.lower() in ('true', 'false'):
+        return BOOLEAN_STRING
+    typed = literalOf(value)
+    if typed is not None and typed.kind == 'number':
+        return literalKind(typed) + '_string'
+    return STRING
+
+
+def _entryLiterals(test: str) -> List[str]:
+    """
+    = "a" -> ['"a"'], "a","b" -> ['"a"', '"b"'], other tests -> []
+    :param test: normalizedTest of entry
+    :return: literal texts
+    """
+    equality = EQUALITY_TEST_RE.match(test)
+    items = [equality.group(1)] if equality else LIST_ITEM_RE.findall(test)
+    if all(literalOf(item) is not None for item in items):
+        return items
+    return []
+
+
+class InputTypes:
+    """
+    Kinds of values compared with each input over all tables of catalog.
+    Type of input is the narrowest type of all its kinds, so one input has one typeRef in every table
+    """
+    def __init__(self, kinds: Dict[str, Iterable[str]] = None):
+        """
+        :param kinds: {input: kinds}, saved by toDict
+        """
+        self.kinds = {name: set(k) for name, k in (kinds or {}).items()}
+
+    def toDict(self) -> Dict[str, List[str]]:
+        return {name: sorted(k) for name, k in self.kinds.items()}
+
+    def observe(self, input_name: str, entry: Optional[str]) -> bool:
+        """
+        :param input_name: input expression
+        :param entry: input entry of rule, None - rule does not test input
+        :return: type of input changed
+        """
+        if entry is None:
+            return False
+        test = normalizedTest(entry)
+        if isBare(input_name, test) or DECISION_INPUT_RE.match(input_name):
+            observed = {BOOLEAN}
+        else:
+            observed = {literalKind(literalOf(item)) for item in _entryLiterals(test)} - {None}
+        before = self.typeOf(input_name)
+        self.kinds.setdefault(input_name, set()).update(observed)
+        return self.typeOf(input_name) != before
+
+    def observeRules(self, inputs: Iterable[str], rules: Iterable) -> List[str]:
+        """
+        :param inputs: inputs of table
+        :param rules: RuleTag rows of table
+        :return: inputs with changed type
+        """
+        inputs = list(inputs)
+        changed = []
+        for rule in rules:
+            for input_name, entry in zip(inputs, rule.inputEntries):
+                if self.observe(input_name, entry) and input_name not in changed:
+                    changed.append(input_name)
+        return changed
+
+    def typeOf(self, input_name: str) -> TypeRef:
+        kinds = self.kinds.get(input_name, set())
+        if BOOLEAN in kinds and kinds <= {BOOLEAN, BOOLEAN_STRING}:
+            return TypeRef.BOOLEAN
+        if kinds & {INTEGER, DOUBLE} and kinds <= _NUMBERS:
+            return TypeRef.DOUBLE if kinds & {DOUBLE, DOUBLE_STRING} else TypeRef.INTEGER
+        if kinds == {DATE}:
+            return TypeRef.DATE
+        return TypeRef.STRING
+
+    def typedEntry(self, input_name: str, entry: Optional[str]) -> Optional[str]:
+        """
+        Entry with literals of input type: "1" -> 1 for number input, "2020-01-01" -> date("2020-01-01"),
+        operand of logical operator -> true for boolean input
+        :param input_name:
+        :param entry: input entry of rule
+        :return: input entry
+        """
+        type_ref = self.typeOf(input_name)
+        if entry is None or type_ref == TypeRef.STRING:
+            return entry
+        test = normalizedTest(entry)
+        if isBare(input_name, test):
+            return 'true' if type_ref == TypeRef.BOOLEAN else entry
+        items = _entryLiterals(test)
+        if not items:
+            return entry
+        typed = [_typedLiteral(type_ref, literalOf(item), item) for item in items]
+        return '= ' + typed[0] if EQUALITY_TEST_RE.match(test) else ','.join(typed)
+
+
+def _typedLiteral(type_ref: TypeRef, literal: Literal, text: str) -> str:
+    if literal.kind != 'string':
+        return text
+    if type_ref == TypeRef.BOOLEAN:
+        return literal.value.lower()
+    if type_ref == TypeRef.DATE:
+        return f'date({text})'
+    return literal.value.strip()
+
+
+def outputType(rules: Iterable) -> TypeRef:
+    """
+    :param rules: RuleTag rows of table
+    :return: BOOLEAN if all outputs are true or false
+    """
+    outputs = {rule.outputEntry for rule in rules}
+    return TypeRef.BOOLEAN if outputs and outputs <= {'true', 'false'} else TypeRef.STRING
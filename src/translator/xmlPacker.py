@@ -2,12 +2,12 @@ import string
 import random
 import re
 from lxml import etree
-from enum import Enum
 from collections import namedtuple
 from src.translator.toKNF import toDMNReady
-from typing import Dict, Iterable, Set, List, Collection
+from typing import Dict, Iterable, Iterator, Set, List, Collection, Sequence, Optional
 from loguru import logger
-from src.translator.feel_analizer import tree, FEELInputExtractor, FEELRuleExtractor
+from src.translator import feelUnaryTests, rulePruning
+from src.translator.typeInference import TypeRef, TYPE_REF_NAMES, InputTypes, outputType
 from ANTLR_JavaELParser.JavaELParser import JavaELParser
 
 xmlns = 'https://www.omg.org/spec/DMN/20191111/MODEL/'
@@ -25,29 +25,54 @@ RuleTag = namedtuple('RuleTag', ('inputEntries', 'outputEntry'))
 logger = logger.opt(colors=True)
 
 
-class TypeRef(Enum):
-    STRING = 1,
-    INTEGER = 2
-
-
 class DmnElementsExtracter:
     AND_OPERANDS_RE = re.compile(r'^and\((.*)\)$')
     WITH_BOOLEAN_METHOD = re.compile(r'^(.+?)\..+?\(\)$')
+    EQUALITY_TEST_RE = re.compile(r'^=\s*(.+)$')
 
     @classmethod
     def _getInput(cls, expr: str):
         """
-        Suggesting that only one identifier in expression
+        Suggesting that only one identifier in expression.
+        Input is whole path of operand: fields.a and fields.b are different inputs
         :param expr:
         :return:
         """
-        feel_expr_tree = tree(expr)
-        extractor = FEELInputExtractor()
-        extractor.visit(feel_expr_tree)
-        if len(extractor.result) > 1:
+        # "( dmn1", "fields.a )": скобки строки DNF у ячейки не разбираются
+        cell = cls._balanced(expr)
+        identifiers = feelUnaryTests.inputs(cell)
+        path = feelUnaryTests.operandPath(cell)
+        if path is not None:
+            # справа от сравнения не должно быть других входов
+            if not identifiers <= feelUnaryTests.inputs(path):
+                raise ValueError(f"Expected only one input in {expr}")
+            return path
+        if len(identifiers) > 1:
             raise ValueError(f"Expected only one input in {expr}")
 
-        return extractor.result.pop()
+        return identifiers.pop()
+
+    @staticmethod
+    def _balanced(cell: str) -> str:
+        # скобки строки DNF остаются у первой и последней ячейки
+        cell = cell.replace('(', ' ', max(0, cell.count('(') - cell.count(')')))
+        extra = cell.count(')') - cell.count('(')
+        return cell[::-1].replace(')', ' ', extra)[::-1] if extra > 0 else cell
+
+    @classmethod
+    def _pruningKey(cls, cell: str, input_name: str) -> Optional[str]:
+        """
+        Input of cell for SAT pruning: whole path of operand, fields.a and fields.b have one input fields
+        :param cell: FEEL cell of row
+        :param input_name: input of cell
+        :return: None if path is unknown and cell is not about input itself
+        """
+        path = feelUnaryTests.operandPath(cls._balanced(cell))
+        if path is not None:
+            return path
+        # not(fields.a): обращение к члену входа, путь не известен
+        member = re.escape(rulePruning.normalizedTest(input_name)) + r'\.'
+        return None if re.search(member, rulePruning.normalizedTest(cell)) else input_name
 
     @classmethod
     def _getOutput(cls, expr: str):
@@ -66,10 +91,7 @@ class DmnElementsExtracter:
         :param expr: FEEL expression without logical
         :return:
         """
-        expr_tree = tree(expr)
-        rule_extr = FEELRuleExtractor()
-        rule_extr.visit(expr_tree)
-        return rule_extr.result
+        return feelUnaryTests.rule(expr)
 
     @classmethod
     def _split_by_or_by_and(cls, operands_FEEL: str) -> List[List[str]]:
@@ -96,69 +118,93 @@ class DmnElementsExtracter:
         :param expr: simple dmn expression
         :return: Set[str]
         """
-        feel_expr_tree = tree(expr)
-        extractor = FEELInputExtractor()
-        extractor.visit(feel_expr_tree)
-        return extractor.result
+        # по ячейкам: имя FEEL может содержать and, "dmn1 and fields" - одно имя
+        return {cls._getInput(cell) for row in cls._split_by_or_by_and(expr) for cell in row if expr.strip()}
+
+    @staticmethod
+    def _pruneRows(rows: List[tuple], keys: Iterator[str]) -> List[tuple]:
+        """
+        rulePruning.pruneRows over cells keyed by path of operand
+        :param rows: cells (input, test, text) and output of rows
+        :param keys: pruning key of every cell in order of rows
+        :return: rows
+        """
+        cells_of = {}
+        keyed = []
+        for cells, output in rows:
+            keyed_cells = []
+            for cell in cells:
+                keyed_cell = (next(keys), cell[1])
+                cells_of[keyed_cell] = cell
+                keyed_cells.append(keyed_cell)
+            keyed.append((keyed_cells, output))
+        return [([cells_of[c] for c in cells], output) for cells, output in rulePruning.pruneRows(keyed)]
 
     @classmethod
-    def getRulesOrdered(cls, expr: str, inputs) -> Iterable[RuleTag]:  # rvalue c оператором
+    def getRulesOrdered(cls, expr: str, inputs, prune: bool = True) -> Iterable[RuleTag]:  # rvalue c оператором
         """
         :param inputs: order of rules
         :param expr:
+        :param prune: drop contradictory and implied rows by rulePruning.pruneRows
         :return:
         """
-        rules = dict().fromkeys(inputs)
-        used_inputs = []
+        if not expr.strip():
+            # выражение без выполнимых строк, см. treeFormula.CONSTANT_FALSE
+            return [RuleTag(inputEntries=[], outputEntry='false')]
+
         to_return = []
         is_none_row_needs = False
 
         # TODO: remove _prepare()
+        rows = []
+        keys = []
         for row in cls._split_by_or_by_and(expr):
-            output = []
-
+            cells, output = [], []
             for cell in row:
-                inputName, ruleExpr = cls._getInput(cell), cls._getRule(cell)
+                input_name = cls._getInput(cell)
+                text = cls._balanced(cell).strip()
+                cells.append((input_name, cls._getRule(text), text))
+                keys.append(cls._pruningKey(cell, input_name))
 
                 out = cls._getOutput(cell)
                 if out:
                     output.append(out)
 
-                used_inputs.append(inputName)
-
-                if rules[inputName]:
-                    rules[inputName].append(ruleExpr)
-                else:
-                    rules[inputName] = [ruleExpr]
-
-            # rule of missed input is None
-            for key in rules.keys():
-                if key not in used_inputs:
-                    if rules[key]:
-                        rules[key].append(None)
-                    else:
-                        rules[key] = [None]
-            used_inputs.clear()
+            if len(output) > 1:
+                raise ValueError('Rule must have only 1 output')
+            rows.append((cells, output[0] if output else None))
+            # строка false нужна, даже если все строки true невыполнимы
+            is_none_row_needs = is_none_row_needs or not output
+
+        if prune and None not in keys:
+            rows = cls._pruneRows(rows, iter(keys))
+
+        for cells, output in rows:
+            entries, texts = {}, {}
+            for input_name, rule, text in cells:
+                # у входа одна ячейка в строке: проверки одного входа, которые не сократил pruneRows,
+                # в таблицу не записываются
+                if texts.setdefault(input_name, text) != text:
+                    raise ValueError(f'Expected only one test of {input_name} in row: {texts[input_name]}, {text}')
+                entries[input_name] = rule
+            unknown = set(entries).difference(inputs)
+            if unknown:
+                raise ValueError(f'Inputs {unknown} are not in {inputs}')
             # или все outputEntries это rvalue, или все outputEntries это boolean вида:
             # inputEntry, inputEntry, ... : true
             # inputEntry, inputEntry, ... : true
             # ...
             # None      , None      , ... : false
-            row_input_entries = []
-            for key in inputs:
-                # get last rule ordered to inputs arg
-                row_input_entries.append(rules[key][-1])
+            # rule of missed input is None
+            row_input_entries = [entries.get(key) for key in inputs]
 
-            if len(output) == 1:
+            if output is not None:
                 # случай с rvalue
-                to_return.append(RuleTag(inputEntries=row_input_entries, outputEntry=output[0]))
+                to_return.append(RuleTag(inputEntries=row_input_entries, outputEntry=output))
 
-            elif len(output) == 0:
+            else:
                 # случай с bool, необходимо добавить строку с None и false
                 to_return.append(RuleTag(inputEntries=row_input_entries, outputEntry='true'))
-                is_none_row_needs = True
-            else:
-                raise ValueError('Rule must have only 1 output')
 
         if is_none_row_needs:
             none_row = []
@@ -167,15 +213,66 @@ class DmnElementsExtracter:
                 none_row.append(None)
             to_return.append(RuleTag(inputEntries=none_row, outputEntry='false'))
         
-        return to_return
+        return cls.mergeEqualityRules(to_return)
+
+    @classmethod
+    def mergeEqualityRules(cls, rules: List[RuleTag]) -> List[RuleTag]:
+        """
+        Rules which differ only by equality test of one input are merged to FEEL list test:
+        = "a", -   : true
+        = "b", -   : true   ->   "a","b", -   : true
+        :param rules: rows of decision table
+        :return: rows of decision table
+        """
+        columns = len(rules[0].inputEntries) if rules else 0
+        for column in range(columns):
+            merged = {}
+            result = []
+            for rule in rules:
+                entry = rule.inputEntries[column]
+                test = cls.EQUALITY_TEST_RE.findall(entry) if entry else None
+                if not test:
+                    result.append(rule)
+                    continue
+
+                key = (rule.outputEntry, tuple(e for i, e in enumerate(rule.inputEntries) if i != column))
+                if key not in merged:
+                    merged[key] = (len(result), [test[0].strip()])
+                    result.append(rule)
+                    continue
+
+                index, values = merged[key]
+                if test[0].strip() not in values:
+                    values.append(test[0].strip())
+                input_entries = list(result[index].inputEntries)
+                input_entries[column] = ','.join(values)
+                result[index] = RuleTag(inputEntries=input_entries, outputEntry=rule.outputEntry)
+            rules = result
+        return rules
 
 
 class DecisionTable:
     RANDOM_ID_LEN = 7
     OPERATION_RESULT_LABEL = 'operation_result'
+    # JavaEL empty: null или пустая строка
+    EMPTY_TEST = 'null,""'
 
     @classmethod
-    def newTable(cls, inputs: Collection, output_name: str, rules_rows: Iterable[RuleTag], dependentDMNs: List[str]):
+    def newTable(cls, inputs: Collection, output_name: str, rules_rows: Iterable[RuleTag], dependentDMNs: List[str],
+                 types: InputTypes = None):
+        """
+        :param inputs: input expressions
+        :param output_name:
+        :param rules_rows: rows of table
+        :param dependentDMNs: required decisions
+        :param types: types of inputs in catalog, by default inferred from entries of this table
+        :return: decision tag
+        """
+        rules_rows = list(rules_rows)
+        if types is None:
+            types = InputTypes()
+            types.observeRules(inputs, rules_rows)
+
         decision_tag = cls.decision(cls._constructDecisionId(), 'test_name')
 
         for dependence in dependentDMNs:
@@ -188,6 +285,12 @@ class DecisionTable:
             decision_tag.append(info_requirement_tag)
 
         decisionTable = cls.decisionTable(cls._constructDecisionTableId())
+        # строки с разным результатом пересекаются (строка "любое" последняя), результат дает первая подходящая
+        if len({rule.outputEntry for rule in rules_rows}) > 1:
+            decisionTable.set('hitPolicy', 'FIRST')
+        elif len(rules_rows) > 1:
+            # строки с одним результатом могут пересекаться, UNIQUE это запрещает
+            decisionTable.set('hitPolicy', 'ANY')
 
         decision_tag.append(decisionTable)
 
@@ -195,17 +298,15 @@ class DecisionTable:
         for inputVar in inputs:
 
             input_tag = cls.input(cls._constructInputId(), inputVar)
-            # TODO: TypeRef.STRING всегда?
-            input_tag.append(cls.inputExpression(cls._constructInputExpressionId(), TypeRef.STRING, inputVar))
+            input_tag.append(cls.inputExpression(cls._constructInputExpressionId(), types.typeOf(inputVar), inputVar))
 
             decisionTable.append(
                 input_tag
             )
 
         # construct output tag
-        # TODO: тип output?
         decisionTable.append(
-            cls.output(cls._constructOutputId(), output_name, output_name, TypeRef.STRING)
+            cls.output(cls._constructOutputId(), output_name, output_name, outputType(rules_rows))
         )
 
         # construct rule tag branch
@@ -220,14 +321,68 @@ class DecisionTable:
         return decision_tag
 
     @classmethod
-    def from_expression(cls, expression: str, output_name: str, dependentDMNs: List[str]) -> etree.Element:
+    def from_expression(cls, expression: str, output_name: str, dependentDMNs: List[str],
+                        types: InputTypes = None, operators: Sequence[int] = ()) -> etree.Element:
+        """
+        :param expression: FEEL expression in DNF
+        :param output_name:
+        :param dependentDMNs: required decisions
+        :param types: types of inputs in catalog, by default inferred from this table
+        :param operators: Not and Empty applied to result of table, innermost first
+        :return: decision tag
+        """
         inputs = DmnElementsExtracter.getInputs(expression)
-        return cls.newTable(
-                inputs,
-                output_name,
-            DmnElementsExtracter.getRulesOrdered(expression, inputs),
-                dependentDMNs
-            )
+        rules = cls.expressionRules(expression, inputs, operators)
+        if types is None:
+            types = InputTypes()
+            types.observeRules(inputs, rules)
+        # литералы в типе входа, одиночный операнд boolean входа -> true
+        rules = [RuleTag(inputEntries=[types.typedEntry(i, e) for i, e in zip(inputs, rule.inputEntries)],
+                         outputEntry=rule.outputEntry) for rule in rules]
+        negations = operators[1:] if operators and operators[0] == JavaELParser.Empty else operators
+        if negations:
+            rules = cls.foldOperators(rules, negations, len(inputs))
+        return cls.newTable(inputs, output_name, rules, dependentDMNs, types)
+
+    @classmethod
+    def expressionRules(cls, expression: str, inputs: Collection, operators: Sequence[int] = ()) -> List[RuleTag]:
+        """
+        Rows of expression table before typing of entries. Empty is folded only over single operand:
+        result of operand table is never null, so the table tests value of its input
+        :param expression: FEEL expression in DNF
+        :param inputs: inputs of expression
+        :param operators: Not and Empty applied to result of table, innermost first
+        :return: rows of table
+        """
+        if not operators or operators[0] != JavaELParser.Empty:
+            return DmnElementsExtracter.getRulesOrdered(expression, inputs)
+        if len(inputs) != 1:
+            raise ValueError(f'Empty can not be folded into table of {len(inputs)} inputs')
+        return [RuleTag(inputEntries=[cls.EMPTY_TEST], outputEntry='true'),
+                RuleTag(inputEntries=[None], outputEntry='false')]
+
+    @classmethod
+    def foldOperators(cls, rules: List[RuleTag], operators: Sequence[int], columns: int) -> List[RuleTag]:
+        """
+        Outputs of rules mapped as _constructNot maps result of operand decision:
+        = 1 : true, - : false   ->   = 1 : false, - : true
+        Row for values matched by no rule is added, its output is operators of null
+        :param rules: rows of table, the first matched row gives result
+        :param operators: Not operators
+        :param columns: inputs count
+        :return: rows of table
+        """
+        def fold(output: str) -> str:
+            for operator in operators:
+                if operator != JavaELParser.Not:
+                    raise ValueError(f'Operator {JavaELParser.symbolicNames[operator]} can not be folded')
+                output = 'false' if output == 'true' else 'true'
+            return output
+
+        folded = [RuleTag(inputEntries=rule.inputEntries, outputEntry=fold(rule.outputEntry)) for rule in rules]
+        if not rules or any(entry is not None for entry in rules[-1].inputEntries):
+            folded.append(RuleTag(inputEntries=[None] * columns, outputEntry=fold('null')))
+        return folded
 
     @classmethod
     def from_constraint(cls, operator: int, dependentDMNs: List[str], left_operand, right_operand=None):
@@ -407,11 +562,11 @@ class DecisionTable:
 
         rules = (
             RuleTag(
-                inputEntries=(f"{op.get('id')}", 'true'),
+                inputEntries=['true'],
                 outputEntry='false'
             ),
             RuleTag(
-                inputEntries=('', ''),
+                inputEntries=[None],
                 outputEntry='true'
             )
         )
@@ -430,16 +585,16 @@ class DecisionTable:
 
         rules = (
             RuleTag(
-                inputEntries=(f"{op.get('id')}", 'null'),
+                inputEntries=[cls.EMPTY_TEST],
                 outputEntry='true'
             ),
             RuleTag(
-                inputEntries=('', ''),
+                inputEntries=[None],
                 outputEntry='false'
             )
         )
         return cls.newTable(
-            (op.get('id')),
+            [op.get('id')],
             cls.OPERATION_RESULT_LABEL,
             rules,
             dependentDMNs
@@ -472,13 +627,7 @@ class DecisionTable:
         logger.debug(
             f'new <green>inputExpression</green> xml tag, id: <red>{id_attr}</red>, typeRef: <red>{typeRef_attr}</red>, text: <red>{text_val}</red>')
 
-        to_return = None
-
-        if typeRef_attr == TypeRef.STRING:
-            to_return = etree.Element('inputExpression', id=id_attr, typeRef='string')
-        elif typeRef_attr == TypeRef.INTEGER:
-            to_return = etree.Element('inputExpression', id=id_attr, typeRef='integer')
-
+        to_return = etree.Element('inputExpression', id=id_attr, typeRef=TYPE_REF_NAMES[typeRef_attr])
         to_return.append(DecisionTable.text(text_val))
         return to_return
 
@@ -488,10 +637,8 @@ class DecisionTable:
         logger.debug(
             f'new <green>output</green> xml tag, id: <red>{id_attr}</red>, typeRef: <red>{typeRef_attr}</red>, label: <red>{label_attr}</red>, name: <red>{name_attr}</red>')
 
-        if typeRef_attr == TypeRef.STRING:
-            return etree.Element('output', id=id_attr, label=label_attr, name=name_attr, typeRef='string')
-        elif typeRef_attr == TypeRef.INTEGER:
-            return etree.Element('output', id=id_attr, label=label_attr, name=name_attr, typeRef='integer')
+        return etree.Element('output', id=id_attr, label=label_attr, name=name_attr,
+                             typeRef=TYPE_REF_NAMES[typeRef_attr])
 
     @staticmethod
     def rule(id_attr: str, description_tag_text: str = None):
@@ -0,0 +1,76 @@
+import unittest
+
+from src.translator.canonicalForms import CanonicalForms, expressionKey, equivalenceClasses, FALSE, TRUE
+from src.translator.expressionValidator import InvalidExpression
+from src.translator.translate import translate
+from src.translator.treeFormula import ExpressionDMN, postorder
+
+equivalent = ["fields['a'] eq 1 and b or c", "c or b && fields['a'] == 1", "(c or b) and (c or fields['a'] eq 1)"]
+# a eq 1 и a eq 2 не выполняются одновременно
+same_input = ["a eq 1 or a eq 1 and a eq 2", "a eq 1"]
+
+
+class TestCanonicalForms(unittest.TestCase):
+    def test_unique_table(self):
+        forms = CanonicalForms()
+        a, b = forms.variable('a'), forms.variable('b')
+        self.assertEqual(forms.conjoin(a, b), forms.conjoin(b, a))
+        self.assertEqual(forms.disjoin(a, b), forms.negate(forms.conjoin(forms.negate(a), forms.negate(b))))
+        self.assertEqual(FALSE, forms.conjoin(a, forms.negate(a)))
+        self.assertEqual(TRUE, forms.disjoin(a, forms.negate(a)))
+        self.assertEqual(a, forms.disjoin(a, forms.conjoin(a, b)))
+
+    def test_equivalent_expressions(self):
+        forms = CanonicalForms()
+        keys = {expressionKey(expression, forms) for expression in equivalent}
+        self.assertEqual(1, len(keys))
+        self.assertNotIn(None, keys)
+        self.assertNotEqual(keys, {expressionKey("fields['a'] eq 1 and (b or c)", forms)})
+
+    def test_key_is_stable(self):
+        # порядок переменных не зависит от порядка выражений каталога
+        self.assertEqual(expressionKey(equivalent[0], CanonicalForms()),
+                         expressionKey(equivalent[0], self.formsOf(reversed(equivalent + same_input))))
+
+    @staticmethod
+    def formsOf(expressions) -> CanonicalForms:
+        forms = CanonicalForms()
+        for expression in expressions:
+            expressionKey(expression, forms)
+        return forms
+
+    def test_equality_domains(self):
+        forms = CanonicalForms()
+        self.assertEqual(expressionKey(same_input[0], forms), expressionKey(same_input[1], forms))
+        self.assertEqual(forms.digest(FALSE), expressionKey('a eq 1 and a eq 2', forms))
+        self.assertNotEqual(forms.digest(FALSE), expressionKey('a eq 1 and b eq 2', forms))
+
+    def test_not_canonical(self):
+        forms = CanonicalForms()
+        self.assertIsNone(expressionKey('a + 1 eq 2', forms))
+        with self.assertRaises(InvalidExpression):
+            expressionKey('a and (b', forms)
+
+    def test_classes(self):
+        classes, keyed = equivalenceClasses(equivalent + same_input + ['x or y'])
+        self.assertEqual(6, keyed)
+        self.assertEqual([3, 2], [len(c.members) for c in classes])
+        self.assertEqual(equivalent, classes[0].members)
+
+    def test_shared_translation(self):
+        forms = CanonicalForms()
+        first = translate(equivalent[0], canonical=forms)
+        second = translate('!(' + equivalent[1] + ')', canonical=forms)
+        expressions = [node.expression for node in postorder(second.root) if isinstance(node, ExpressionDMN)]
+        self.assertIn(first.root.expression, expressions)
+        self.assertEqual(1, len(forms.translations))
+
+    def test_constant_not_shared(self):
+        forms = CanonicalForms()
+        false_key = expressionKey('a eq 1 and a eq 2', forms)
+        self.assertEqual(false_key, expressionKey('b eq 1 and b eq 2', forms))
+        forms.remember(false_key, 256, 'a = 1 and a = 2')
+        self.assertIsNone(forms.translation(false_key, 256))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import numpy as np
+from lxml import etree
+from src.translator.xmlPacker import DecisionTable, RuleTag, expression_xml
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+from src.translator.dmnEvaluator import DMNEvaluator, columnsFromRecords, splitUnaryTests
+from src.translator.javaELEvaluator import compileExpression
+
+simple_operand_or = "fields['SignFL'] eq true or fields['SignUL'] eq true"
+
+
+def statusDecision():
+    decision = DecisionTable.newTable(
+        ['fields.status', 'fields.count'],
+        'status_ok',
+        [
+            RuleTag(inputEntries=['"a","b"', '> 2'], outputEntry='true'),
+            RuleTag(inputEntries=['not( "c" )', 'null'], outputEntry='true'),
+            RuleTag(inputEntries=[None, None], outputEntry='false'),
+        ],
+        []
+    )
+    decision.set('name', 'status_ok')
+    return decision
+
+
+class TestDMNEvaluator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.records = [
+            {'fields': {'status': 'a', 'count': 3}},
+            {'fields': {'status': 'b', 'count': 1}},
+            {'fields': {'status': 'd', 'count': None}},
+            {'fields': {'status': 'c'}},
+        ]
+
+    def test_split_unary_tests(self):
+        self.assertEqual(['"a"', '"b,c"', 'not( 1, 2 )'], splitUnaryTests('"a", "b,c", not( 1, 2 )'))
+
+    def test_evaluate_table(self):
+        evaluator = DMNEvaluator(expression_xml('drd_id', [statusDecision()]))
+        self.assertEqual([True, False, True, False], list(evaluator.evaluateRecords(self.records)))
+
+    def test_required_decision(self):
+        parent = DecisionTable.newTable(
+            ['status_ok'],
+            'visible',
+            [
+                RuleTag(inputEntries=['= true'], outputEntry='"shown"'),
+                RuleTag(inputEntries=[None], outputEntry='"hidden"'),
+            ],
+            ['status_ok']
+        )
+        evaluator = DMNEvaluator(expression_xml('drd_id', [statusDecision(), parent]))
+        self.assertEqual(['fields.status', 'fields.count'], evaluator.inputExpressions())
+        self.assertEqual(['shown', 'hidden', 'shown', 'hidden'], list(evaluator.evaluateRecords(self.records)))
+
+    def test_translated_from_file(self):
+        definitions = DMN_XML.visit(translate(simple_operand_or))
+        # после записи теги в namespace DMN
+        evaluator = DMNEvaluator(etree.fromstring(etree.tostring(definitions)))
+
+        records = [
+            {'fields': {'SignFL': True, 'SignUL': False}},
+            {'fields': {'SignFL': False, 'SignUL': False}},
+            {'fields': {'SignFL': None, 'SignUL': True}},
+            {'fields': {}},
+        ]
+        columns = columnsFromRecords(records, evaluator.inputExpressions())
+        np.testing.assert_array_equal(np.array([True, False, True, False], dtype=object), evaluator.evaluate(columns))
+
+    def test_empty_same_as_java_el(self):
+        records = [{'fields': {'x': x, 'y': True}} for x in (None, '', 'a', True, False)] + [{'fields': {'y': False}}]
+        for expression in ["empty fields['x']", "!empty fields['x']", "fields['y'] and !empty fields['x']"]:
+            definitions = etree.fromstring(etree.tostring(DMN_XML.visit(translate(expression))))
+            self.assertEqual([bool(compileExpression(expression)(r)) for r in records],
+                             [bool(v) for v in DMNEvaluator(definitions).evaluateRecords(records)], expression)
+            # строки пересекаются со строкой "любое"
+            self.assertEqual({'FIRST'}, {t.get('hitPolicy') for t in definitions.iter('{*}decisionTable')})
+
+    def test_hit_policies(self):
+        rules = [RuleTag(inputEntries=['"a","b"'], outputEntry='"x"'), RuleTag(inputEntries=['"a"'], outputEntry='"y"')]
+        table = DecisionTable.newTable(['fields.status'], 'status', rules, [])
+        self.assertEqual(['x', 'x', None, None], list(DMNEvaluator(expression_xml('drd_id', [table])).evaluateRecords(
+            self.records)))
+        for policy in ['UNIQUE', 'ANY']:
+            table[-1].set('hitPolicy', policy)
+            with self.assertRaises(ValueError):
+                DMNEvaluator(expression_xml('drd_id', [table])).evaluateRecords(self.records)
+        # одинаковый результат пересекающихся строк
+        table = DecisionTable.newTable(['fields.status'], 'status', [rules[0]._replace(outputEntry='"y"'), rules[1]],
+                                       [])
+        self.assertEqual('ANY', table[-1].get('hitPolicy'))
+        self.assertEqual(['y', 'y', None, None],
+                         list(DMNEvaluator(expression_xml('drd_id', [table])).evaluateRecords(self.records)))
+        table[-1].set('hitPolicy', 'PRIORITY')
+        with self.assertRaises(ValueError):
+            DMNEvaluator(expression_xml('drd_id', [table]))
+
+    def test_constraint_tables(self):
+        records = [{'fields': {'a': a, 'b': b}} for a in (True, False) for b in (True, False, None)]
+        for expression in ["fields['a'] and !fields['b']", "!(fields['a'] eq true or fields['b'] eq false)",
+                           "!empty fields['b']"]:
+            definitions = etree.fromstring(etree.tostring(DMN_XML.visit(translate(expression, collapse=False))))
+            self.assertEqual([bool(compileExpression(expression)(r)) for r in records],
+                             [bool(v) for v in DMNEvaluator(definitions).evaluateRecords(records)], expression)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from src.translator.treeFormula import tree
+from src.translator.equivalenceChecker import TruthTable, checkExpression, checkNode, operandKey, checkCorpus, \
+    checkDecisions, assignmentRecord, normalizeExpression, _firstDifference
+
+simple_operand_or = "fields['SignFL'] eq true or fields['SignUL'] eq true"
+domain_expression = "(fields['status'] eq 'a' or fields['status'] eq 'b') and fields['flag']"
+
+
+class TestEquivalenceChecker(unittest.TestCase):
+    def test_operand_key(self):
+        self.assertEqual(operandKey(tree("fields . x == 'a'")), operandKey(tree('fields.x eq "a"')))
+
+    def test_exhaustive_operands(self):
+        table = TruthTable.exhaustiveFor(3)
+        self.assertEqual(0b10101010, table.operand('a'))
+        self.assertEqual(0b11001100, table.operand('b'))
+        self.assertEqual(0b11110000, table.operand('c'))
+
+    def test_not_precedence(self):
+        table = TruthTable.exhaustiveFor(2)
+        # грамматика: !a and b -> !(a and b)
+        self.assertEqual(table.evaluate(tree('!(a and b)')), table.evaluate(tree('!a and b')))
+        self.assertEqual(table.evaluate(tree('(!a) and b')), table.evaluate(tree('!a and b'), javael_precedence=True))
+
+    def test_equivalent(self):
+        report = checkExpression(simple_operand_or)
+        self.assertTrue(report.equivalent)
+        self.assertTrue(report.exhaustive)
+        self.assertEqual(2, report.operands)
+
+    def test_domain(self):
+        report = checkExpression(domain_expression)
+        self.assertTrue(report.equivalent, report.counterexample)
+
+    def test_contradiction(self):
+        # все строки DNF сокращены: нормализованное выражение - постоянная ложь
+        expression = "fields['a'] eq 'x' and fields['a'] eq 'y'"
+        self.assertEqual('', normalizeExpression(expression))
+        report = checkExpression(expression)
+        self.assertIsNone(report.error)
+        self.assertTrue(report.equivalent, report.counterexample)
+        self.assertIsNone(checkNode(expression)[2])
+
+    def test_bounded_dnf(self):
+        report = checkExpression('(a or b) and (c or d) and (e or f)', dnf_budget=4)
+        self.assertTrue(report.equivalent, report.counterexample)
+
+    def test_sampling(self):
+        operands, exhaustive, counterexample = checkNode('(a or b) and (c or d)', max_exhaustive=0, sample_rounds=2)
+        self.assertFalse(exhaustive)
+        self.assertIsNone(counterexample)
+
+    def test_counterexample(self):
+        table = TruthTable.exhaustiveFor(2)
+        bit, expected, actual = _firstDifference(table, tree('a and b'), tree('a or b'))
+        self.assertNotEqual(expected, actual)
+        assignment = table.assignment(bit)
+        self.assertNotEqual(assignment['a'], assignment['b'])
+
+    def test_empty_precedence(self):
+        table = TruthTable.exhaustiveFor(2)
+        table.evaluate(tree("empty fields['x'] or fields['y']"), javael_precedence=True)
+        self.assertEqual(['empty fields["x"]', 'fields["y"]'], list(table.operands))
+
+    def test_assignment_record(self):
+        table = TruthTable.exhaustiveFor(3)
+        table.evaluate(tree(domain_expression), javael_precedence=True)
+        records = [assignmentRecord(table, bit) for bit in range(table.width)]
+        # status не равен "a" и "b" одновременно
+        self.assertEqual(6, sum(r is not None for r in records))
+        self.assertIn({'fields': {'status': 'a', 'flag': True}}, records)
+
+    def test_decisions(self):
+        checked, counterexample = checkDecisions(domain_expression)
+        self.assertEqual(6, checked)
+        self.assertIsNone(counterexample)
+
+    def test_corpus(self):
+        reports = checkCorpus([simple_operand_or, domain_expression], workers=2)
+        self.assertEqual([simple_operand_or, domain_expression], [r.expression for r in reports])
+        self.assertTrue(all(r.equivalent for r in reports))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import io
+import unittest
+from contextlib import redirect_stderr
+
+from src.translator.expressionValidator import validate, InvalidExpression, ExpressionError
+from src.translator.toKNF import toDMNReady
+from src.translator.translate import translate
+from src.translator.treeFormula import tree
+
+valid_expressions = [
+    "fields['SignFL'] eq true or fields['SignUL'] eq true",
+    "view.viewId.contains('portal.xhtml') and value.contains(fields.ApplicantType.Code)",
+    "!empty fields.id or (a && b) ? 'x' : f()",
+    "a ? b ? c : d : e ? f : g",
+    "-1 eq a - -b and fields.x eq 1.5",
+    r"fields['a\'b'] != " + r'"x\"y"' + "\n and not empty (a || b)",
+    "(a) eq (b and c)",
+]
+
+invalid_expressions = {
+    "fields.a eq": [ExpressionError(9, "operand expected after 'eq'")],
+    "(a and b": [ExpressionError(0, "'(' is not closed")],
+    "a and b)": [ExpressionError(7, "')' does not close any bracket")],
+    "(a]": [ExpressionError(0, "'(' is not closed"), ExpressionError(2, "']' does not close '(' at 0")],
+    "fields['a] eq b": [ExpressionError(7, 'string literal is not closed')],
+    "a and or b": [ExpressionError(6, "unexpected 'or', operand expected")],
+    "true fields": [ExpressionError(5, "unexpected 'fields', operator expected")],
+    "a ? b": [ExpressionError(5, "'?' without ':'")],
+    "a : b": [ExpressionError(2, "':' without '?'")],
+    "a.(b)": [ExpressionError(2, "name expected after '.'")],
+    "a = b": [ExpressionError(2, "unexpected characters '='"), ExpressionError(4, "unexpected 'b', operator expected")],
+    " ": [ExpressionError(0, 'empty expression')],
+}
+
+
+class TestExpressionValidator(unittest.TestCase):
+    def test_valid(self):
+        for expression in valid_expressions:
+            self.assertEqual([], validate(expression), expression)
+
+    def test_errors(self):
+        for expression, errors in invalid_expressions.items():
+            self.assertEqual(errors, validate(expression), expression)
+
+    def test_translate_rejects(self):
+        with self.assertRaises(InvalidExpression) as raised:
+            translate("fields.a eq 'x' and (fields.b or")
+        self.assertEqual([ExpressionError(20, "'(' is not closed"), ExpressionError(30, "operand expected after 'or'")],
+                         raised.exception.errors)
+        self.assertEqual("20: '(' is not closed; 30: operand expected after 'or'", str(raised.exception))
+        self.assertIsInstance(raised.exception, ValueError)
+
+    def test_parser_errors_collected(self):
+        errors = []
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            # вызов функции с двумя аргументами проходит предпроверку, но не грамматику
+            tree("fields.a eq 'x' or\n f(a, b)", errors)
+        self.assertEqual('', stderr.getvalue())
+        self.assertTrue(errors)
+        self.assertEqual(23, errors[0].offset)
+
+    def test_to_dmn_rejects(self):
+        self.assertRaises(ValueError, toDMNReady, '(op_1 and op_2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import random
+import unittest
+
+from src.translator.feel_analizer import tree, unaryTestsTree, FEELInputExtractor, FEELRuleExtractor
+from src.translator.feelUnaryTests import lex, parseCell, inputs, rule, unaryTestErrors, invalidEntries
+from src.translator.xmlPacker import DmnElementsExtracter
+
+# ячейки, которые пишет toDMNReady, и выражения таблиц
+cells = [
+    'fields [ "SignFL" ] = true', '( fields [ "a" ].b = 1 )', 'fields.p_ContractTransferType.Code = "7185643"',
+    'value.contains(fields.ApplicantType.Code)', 'not( ( fields.b = fields.b ) )', '( ( dmn140106561294016 ) )',
+    'a.b(c) [ d ]', '"x"(y)', 'a.1', 'f()', 'null = a', '1 = "s"', 'x = -1',
+    # nameRef забирает все токены до скобки, сравнения или запятой
+    'a != 1', 'a and b', 'fields.b <= 2',
+    '( fields [ "SignUL" ] = true ) or ( fields [ "SignFL" ] = true )',
+    '( securityDataProvider.hasRole("tehprisEE_ZayavkaTP") and dmn139908261060864 )',
+]
+
+# вне подмножества: разбирает полная грамматика
+fallback_cells = ['( fields.b', 'not( ( 1 ) ) )', 'f()(x).y [ z ].g(h.i)', 'a in (1, 2)', 'x = 1e5', 'f(a: 1)',
+                  '(a).b', 'a [ 1 ].b(c)', "a = 'x'", 'a // b']
+
+entries = ['', '-', '= "a"', '"a","b"', 'not( dmn1 )', '< dmn1', 'null', 'true', 'f()', 'not((a))', '>= 1.5',
+           'not( "a", "b" )']
+invalid_entries = ['(not((fields["c"])', 'a.b(', 'a ) (', 'not( a']
+
+
+def randomCell(rng: random.Random, depth: int) -> str:
+    if depth <= 0:
+        return rng.choice(['a', 'fields.b', 'dmn1', '"s"', '1', '2.5', 'true', 'null', '-1', 'a != 1', 'a1b'])
+    deeper = depth - 1
+    choice = rng.randrange(7)
+    if choice == 0:
+        return '( ' + randomCell(rng, deeper) + ' )'
+    if choice == 1:
+        return '{} {} {}'.format(randomCell(rng, deeper), rng.choice(['=', '<', '>', '!=', '>=']),
+                                 randomCell(rng, deeper))
+    if choice == 2:
+        arguments = ', '.join(randomCell(rng, deeper) for _ in range(rng.randrange(3)))
+        return rng.choice(['f', 'a.b', 'not', '"x"']) + '(' + arguments + ')'
+    if choice == 3:
+        return randomCell(rng, deeper) + ' [ ' + randomCell(rng, deeper) + ' ]'
+    if choice == 4:
+        return randomCell(rng, deeper) + '.' + rng.choice(['b', 'c.d'])
+    if choice == 5:
+        return '{} {} {}'.format(randomCell(rng, deeper), rng.choice(['and', 'or']), randomCell(rng, deeper))
+    return randomCell(rng, 0)
+
+
+def fullGrammar(expression: str) -> tuple:
+    input_extractor, rule_extractor = FEELInputExtractor(), FEELRuleExtractor()
+    input_extractor.visit(tree(expression))
+    rule_extractor.visit(tree(expression))
+    return input_extractor.result, rule_extractor.result
+
+
+class TestFeelUnaryTests(unittest.TestCase):
+    def test_lex(self):
+        self.assertEqual(['a', '.', 'b', '(', ')', '!=', '1.5', 'not', '"x\\"y"', '<EOF>'],
+                         [t.text for t in lex('a.b() != 1.5 not "x\\"y"')])
+        for expression in ['1e5', '0x1F', 'a // b', "'x'", '"\\u12"']:
+            self.assertIsNone(lex(expression), expression)
+
+    def test_same_as_full_grammar(self):
+        for expression in cells:
+            self.assertIsNotNone(parseCell(expression), expression)
+            self.assertEqual(fullGrammar(expression), (inputs(expression), rule(expression)), expression)
+
+    def test_random_cells(self):
+        rng = random.Random(44)
+        parsed = 0
+        for _ in range(500):
+            expression = randomCell(rng, rng.randint(0, 3))
+            if parseCell(expression) is not None:
+                parsed += 1
+                self.assertEqual(fullGrammar(expression), (inputs(expression), rule(expression)), expression)
+        self.assertGreater(parsed, 250)
+
+    def test_fallback(self):
+        for expression in fallback_cells:
+            self.assertIsNone(parseCell(expression), expression)
+            self.assertEqual(fullGrammar(expression), (inputs(expression), rule(expression)), expression)
+
+    def test_extracter(self):
+        self.assertEqual('fields [ "SignFL" ]', DmnElementsExtracter._getInput('( fields [ "SignFL" ] = true )'))
+        self.assertEqual('= true', DmnElementsExtracter._getRule('( fields [ "SignFL" ] = true )'))
+        with self.assertRaises(ValueError):
+            DmnElementsExtracter._getInput('a = b')
+        # вход - полный путь операнда
+        self.assertEqual('fields.a', DmnElementsExtracter._getInput('( fields.a = "x"'))
+        self.assertEqual('fields [ "a" ].b', DmnElementsExtracter._getInput('fields [ "a" ].b )'))
+        self.assertEqual('fields.a.size()', DmnElementsExtracter._getInput('fields.a.size() = 1'))
+
+    def test_unary_tests(self):
+        for entry in entries:
+            self.assertEqual([], unaryTestErrors(entry), entry)
+            if entry.strip() and entry != '-':
+                errors = []
+                unaryTestsTree(entry, errors)
+                self.assertEqual([], errors, entry)
+        for entry in invalid_entries:
+            self.assertTrue(unaryTestErrors(entry), entry)
+        invalid = invalidEntries(entries + invalid_entries + invalid_entries)
+        self.assertEqual(set(invalid_entries), set(invalid))
+
+
+if __name__ == '__main__':
+    unittest.main()
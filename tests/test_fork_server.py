@@ -0,0 +1,110 @@
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from src.translator.forkServer import runCommand, serve
+
+simple_operand_or = "fields['SignFL'] eq true or fields['SignUL'] eq true"
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestForkServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.socket = os.path.join(self.dir.name, 'fork.sock')
+        self.env = dict(os.environ, PYTHONPATH=root)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def client(self, *args):
+        return subprocess.run(
+            [sys.executable, '-m', 'src.translator.forkServer', *args],
+            cwd=root, env=self.env, capture_output=True, text=True, timeout=60
+        )
+
+    def test_unknown_command(self):
+        self.assertEqual(2, runCommand('unknown', []))
+
+    def test_without_server(self):
+        result = self.client('run', '--socket', self.socket, 'translate', simple_operand_or)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertIn('<decision', result.stdout)
+
+    def test_untrusted_socket(self):
+        # в каталог могут писать другие: окружение и дескрипторы не отправляются, команда идет без сервера
+        os.chmod(self.dir.name, 0o777)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(self.socket)
+            listener.listen(1)
+            result = self.client('run', '--socket', self.socket, 'translate', simple_operand_or)
+            connection, _ = listener.accept()
+            with connection:
+                self.assertEqual(b'', connection.recv(16))
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertIn('not private', result.stderr)
+        self.assertIn('<decision', result.stdout)
+
+    def test_serve_shared_directory(self):
+        os.chmod(self.dir.name, 0o777)
+        with self.assertRaises(PermissionError):
+            serve(self.socket, [])
+        self.assertFalse(os.path.exists(self.socket))
+
+    def test_forked(self):
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'src.translator.forkServer', 'serve', '--socket', self.socket],
+            cwd=root, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            deadline = time.time() + 60
+            while not os.path.exists(self.socket) and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(0, os.stat(self.socket).st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+            out = os.path.join(self.dir.name, 'out.dmn')
+            result = self.client('run', '--socket', self.socket, 'translate', simple_operand_or, '--out', out)
+            self.assertEqual(0, result.returncode, result.stderr)
+            with open(out) as f:
+                self.assertIn('<decision', f.read())
+
+            # плохие запросы не останавливают сервер
+            for message in [b'{"command": "transl', b'[1, 2]', b'\xff']:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as bad:
+                    bad.connect(self.socket)
+                    bad.sendall(message)
+                    bad.shutdown(socket.SHUT_WR)
+                    self.assertEqual(b'', bad.recv(16))
+
+            # запрос приходит частями
+            split_out = os.path.join(self.dir.name, 'split.dmn')
+            message = json.dumps({'command': 'translate', 'args': [simple_operand_or, '--out', split_out],
+                                  'cwd': root, 'env': self.env}).encode('utf-8')
+            with open(os.devnull, 'r+') as devnull, socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as split:
+                split.connect(self.socket)
+                socket.send_fds(split, [message[:10]], [devnull.fileno()] * 3)
+                time.sleep(0.2)
+                split.sendall(message[10:])
+                split.shutdown(socket.SHUT_WR)
+                self.assertEqual({'exit': 0}, json.loads(split.recv(64)))
+            self.assertTrue(os.path.exists(split_out))
+
+            result = self.client('run', '--socket', self.socket, 'translate')
+            self.assertEqual(2, result.returncode)
+            self.assertIn('Missing argument', result.stderr)
+
+            self.assertEqual(0, self.client('stop', '--socket', self.socket).returncode)
+            server.wait(timeout=10)
+            self.assertFalse(os.path.exists(self.socket))
+        finally:
+            if server.poll() is None:
+                server.kill()
+
+
+if __name__ == '__main__':
+    unittest.main()
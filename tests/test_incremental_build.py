@@ -0,0 +1,174 @@
+import os
+import tempfile
+import unittest
+from collections import namedtuple
+from src.translator.incrementalBuild import IncrementalTranslator
+
+# поля ExpressionDependency из buildPropDependency
+Dependency = namedtuple('Dependency', ('property', 'expression', 'condition_type', 'form'))
+
+simple_operand_or = "fields['SignFL'] eq true or fields['SignUL'] eq true"
+simple_operand_and = "fields['SignFL'] eq true and fields['SignUL'] eq true"
+
+
+def extractLines(path):
+    # form;property;condition_type;expression в строке
+    forms = {}
+    with open(path) as f:
+        for line in f:
+            form, prop, condition_type, expression = line.strip().split(';')
+            forms.setdefault(form, []).append(Dependency(prop, expression, condition_type, form))
+    return forms
+
+
+class TestIncrementalTranslator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.out = os.path.join(self.dir.name, 'out')
+        self.form_a = os.path.join(self.dir.name, 'a.xml')
+        self.form_b = os.path.join(self.dir.name, 'b.xml')
+        self.write(self.form_a, f'A;x;visible;{simple_operand_or}\n')
+        self.write(self.form_b, f'B;y;visible;{simple_operand_or}\n')
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    @staticmethod
+    def write(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+        # mtime должен отличаться от записанного в манифест
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def translator(self):
+        return IncrementalTranslator(self.out, extractor=extractLines)
+
+    def test_build_shared_expression(self):
+        report = self.translator().build([self.form_a, self.form_b])
+        self.assertEqual(2, len(report.changed_files))
+        self.assertEqual(1, len(report.translated))
+        dmn_files = [f for f in os.listdir(self.out) if f.endswith('.dmn')]
+        self.assertEqual(1, len(dmn_files))
+
+    def test_unchanged(self):
+        self.translator().build([self.form_a, self.form_b])
+        dmn_file = [os.path.join(self.out, f) for f in os.listdir(self.out) if f.endswith('.dmn')][0]
+        mtime = os.stat(dmn_file).st_mtime_ns
+
+        # новый процесс читает манифест
+        report = self.translator().build([self.form_a, self.form_b])
+        self.assertEqual(([], [], [], []), tuple(report))
+        self.assertEqual(mtime, os.stat(dmn_file).st_mtime_ns)
+
+    def test_changed_expression(self):
+        translator = self.translator()
+        translator.build([self.form_a, self.form_b])
+
+        self.write(self.form_a, f'A;x;visible;{simple_operand_and}\n')
+        report = translator.build([self.form_a, self.form_b])
+        self.assertEqual([self.form_a], report.changed_files)
+        self.assertEqual(1, len(report.translated))
+        # старое выражение еще используется формой B
+        self.assertEqual([], report.removed)
+
+        report = translator.build([self.form_a])
+        self.assertEqual(1, len(report.removed))
+        self.assertEqual(1, len([f for f in os.listdir(self.out) if f.endswith('.dmn')]))
+
+    def test_canonical_shared_file(self):
+        translator = IncrementalTranslator(self.out, extractor=extractLines, canonical=True)
+        equivalent_or = "fields['SignUL'] == true || fields['SignFL'] eq true"
+        self.write(self.form_b, f'B;y;visible;{equivalent_or}\n')
+        report = translator.build([self.form_a, self.form_b])
+        self.assertEqual(2, len(report.translated))
+        self.assertEqual(1, len([f for f in os.listdir(self.out) if f.endswith('.dmn')]))
+        first, second = translator.manifest['expressions'].values()
+        self.assertEqual(first['dmn_file'], second['dmn_file'])
+
+        # файл остается, пока на него ссылается эквивалентное выражение
+        self.write(self.form_a, f'A;x;visible;{simple_operand_and}\n')
+        translator.build([self.form_a, self.form_b])
+        self.assertEqual(2, len([f for f in os.listdir(self.out) if f.endswith('.dmn')]))
+        translator.build([self.form_a])
+        self.assertEqual(1, len([f for f in os.listdir(self.out) if f.endswith('.dmn')]))
+
+    def test_widened_type(self):
+        translator = self.translator()
+        self.write(self.form_a, "A;x;visible;fields['a'] eq 1\n")
+        self.write(self.form_b, "B;y;visible;fields['b'] eq true\n")
+        translator.build([self.form_a, self.form_b])
+        self.assertEqual('integer', self.typeRef(translator, self.form_a))
+
+        # строковое значение входа в другой форме меняет тип входа во всех файлах
+        self.write(self.form_b, "B;y;visible;fields['a'] eq 'x'\n")
+        translator.build([self.form_a, self.form_b])
+        self.assertEqual('string', self.typeRef(translator, self.form_a))
+        self.assertEqual('string', self.typeRef(translator, self.form_b))
+        # типы каталога хранятся в манифесте
+        types = IncrementalTranslator(self.out, extractor=extractLines).types
+        self.assertEqual(['integer', 'string'], types.toDict()['fields [ "a" ]'])
+
+    def typeRef(self, translator, form):
+        key = translator.manifest['files'][form]['entries'][0][3]
+        dmn_file = os.path.join(self.out, translator.manifest['expressions'][key]['dmn_file'])
+        with open(dmn_file) as f:
+            text = f.read()
+        return text.split('inputExpression', 1)[1].split('typeRef="', 1)[1].split('"', 1)[0]
+
+    def test_default_extractor(self):
+        form = os.path.join(self.dir.name, 'form.xml')
+        with open(form, 'w') as f:
+            f.write('<root><forms><![CDATA[<objectForm name="A"><key>x</key>'
+                    f'<value visible="#{{{simple_operand_or}}}"></value></objectForm>]]></forms></root>')
+        report = IncrementalTranslator(self.out).build([form])
+        self.assertEqual(1, len(report.translated))
+        self.assertEqual([], report.failed)
+
+    def test_written_once(self):
+        writes = []
+
+        class Counting(IncrementalTranslator):
+            def _write(self, key, result, widened):
+                writes.append(key)
+                super()._write(key, result, widened)
+
+        translator = Counting(self.out, extractor=extractLines)
+        self.write(self.form_a, "A;x;visible;fields['a'] eq 1\n")
+        self.write(self.form_b, "B;y;visible;fields['b'] eq true\n")
+        translator.build([self.form_a, self.form_b])
+        # типы нового файла известны при записи
+        self.assertEqual(2, len(writes))
+
+        self.write(self.form_b, "B;y;visible;fields['a'] eq 'x'\n")
+        translator.build([self.form_a, self.form_b])
+        # новый файл и файл формы A со входом измененного типа
+        self.assertEqual(4, len(writes))
+        self.assertEqual('string', self.typeRef(translator, self.form_a))
+
+    def test_indexes(self):
+        translator = IncrementalTranslator(self.out, extractor=extractLines, canonical=True)
+        equivalent_or = "fields['SignUL'] == true || fields['SignFL'] eq true"
+        translator.build([self.form_a, self.form_b])
+        self.write(self.form_a, f"A;x;visible;{equivalent_or}\nA;y;visible;fields['SignFL'] eq 'x'\n")
+        translator.build([self.form_a, self.form_b])
+        translator.build([self.form_a])
+
+        # индексы после сборок совпадают с построенными по манифесту
+        loaded = IncrementalTranslator(self.out, extractor=extractLines, canonical=True)
+        self.assertEqual(+loaded.references, +translator.references)
+        self.assertEqual(loaded.by_canonical, translator.by_canonical)
+        self.assertEqual(loaded.by_file, translator.by_file)
+        self.assertEqual(loaded.by_input, translator.by_input)
+        self.assertEqual(set(translator.by_file), {f for f in os.listdir(self.out) if f.endswith('.dmn')})
+
+    def test_manifest_decisions(self):
+        translator = self.translator()
+        translator.build([self.form_a])
+        (entry,) = translator.manifest['expressions'].values()
+        self.assertIsNone(entry['error'])
+        self.assertTrue(entry['decisions'])
+
+
+if __name__ == '__main__':
+    unittest.main()
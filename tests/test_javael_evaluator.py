@@ -0,0 +1,50 @@
+import unittest
+from lxml import etree
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+from src.translator.dmnEvaluator import DMNEvaluator
+from src.translator.javaELEvaluator import CompiledExpression, compileExpression
+
+simple_operand_or = "fields['SignFL'] eq true or fields['SignUL'] eq true"
+
+
+class TestJavaELEvaluator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.record = {'fields': {'SignFL': True, 'SignUL': False, 'status': 'a', 'count': '3', 'list': []}}
+
+    def test_fields(self):
+        self.assertTrue(compileExpression("fields['status'] eq 'a' and fields.SignFL")(self.record))
+        self.assertTrue(compileExpression('fields.missing.x eq null')(self.record))
+        self.assertTrue(compileExpression('empty fields.list and empty fields.missing')(self.record))
+
+    def test_comparison(self):
+        self.assertTrue(compileExpression('fields.count gt 2 and fields.count + 1 == 4')(self.record))
+        self.assertFalse(compileExpression('fields.missing lt 2 or fields.missing gt 2')(self.record))
+
+    def test_ternary(self):
+        self.assertEqual('3', compileExpression("fields.status ne 'a' ? 'no' : fields.count")(self.record))
+
+    def test_prefix_precedence(self):
+        # в дереве !a and b -> !(a and b), вычисляется как (!a) and b
+        self.assertFalse(compileExpression('!fields.SignUL and fields.SignUL')(self.record))
+        self.assertTrue(compileExpression('!(fields.SignUL and fields.SignUL)')(self.record))
+
+    def test_functions(self):
+        compiled = CompiledExpression('fields.list.size() eq 0 and length(fields.status) eq 1',
+                                      {'size': len, 'length': len})
+        self.assertTrue(compiled(self.record))
+        with self.assertRaises(ValueError):
+            CompiledExpression('size(fields.list)')
+
+    def test_same_as_dmn(self):
+        records = [
+            {'fields': {'SignFL': a, 'SignUL': b}}
+            for a in (True, False, None) for b in (True, False, None)
+        ]
+        dmn = DMNEvaluator(etree.fromstring(etree.tostring(DMN_XML.visit(translate(simple_operand_or)))))
+        self.assertEqual(list(dmn.evaluateRecords(records)),
+                         list(compileExpression(simple_operand_or).evaluateRecords(records)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import io
+import random
+import re
+import unittest
+from contextlib import redirect_stderr
+
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
+from src.translator.parseArena import ParseArena
+from src.translator.prattParser import parse, lex, EOF
+from src.translator.translate import translate
+from src.translator.treeFormula import tree, PRATT_PARSER, OperatorDMN, postorder
+from src.translator.expressionValidator import InvalidExpression
+
+conformance_expressions = [
+    "fields['SignFL'] eq true or fields['SignUL'] eq true",
+    "view.viewId.contains('portal.xhtml') and value.contains(fields.ApplicantType.Code)",
+    "fields.p_ContractTransferType.Code eq '7185643' and !empty fields.ScanNotificationLetterSO",
+    "value.property ? (first_var and second_var or ! third_var) : 'xexe'",
+    "a ? b ? c : d : e ? f : g",
+    "! a and b",
+    "not empty (a || b) or c",
+    "- a + b * c mod d",
+    "x + - a + b",
+    "! a ? b : c",
+    "x lt ! a ? b : c",
+    "(a) eq (b and c)",
+    "f()(x).y[z].g(h.i)",
+    "a.1 + 'x'(y) - true.b",
+    "a1b eq 0",
+    r"""'e\'s' ne "q\x41\u{42}C\0\t" """,
+]
+
+# ANTLR разбирает только начало выражения, prattParser сообщает об ошибке
+truncated_expressions = ["a b", "a1b2", "a, b", "(a) + b", "a + (b)", "a lt (b)", "a eq b eq c", "a[b](c)", "a ?",
+                         "a ? b : c d"]
+
+# ANTLR сообщает об ошибке
+invalid_expressions = ["f(a and b)", "f(!a)", "a.(b)", "a[b.c]", "a = b", "(a", r"'\8'", r"'\xZ1'", ""]
+
+
+def randomExpression(rng: random.Random, depth: int, condition: bool = False, at_end: bool = True) -> str:
+    """
+    JavaEL expression by grammar rules. ANTLR resolves ambiguity of ? : after prefix operator
+    depending on its prediction cache, so condition of ternary has prefix operators only in brackets
+    and operand of prefix operator, which is not the last in expression, is a value
+    :param rng:
+    :param depth:
+    :param condition: expression is condition of ternary
+    :param at_end: nothing follows expression up to closing bracket, ':' or end
+    :return:
+    """
+    if depth <= 0:
+        return rng.choice(['a', 'fields.b', "fields['c']", 'f()', 'g(x.y)', 'a.b(c)[d]', "'s'", '1', 'true', 'null'])
+    deeper = depth - 1
+    choice = rng.randrange(10)
+    if choice == 0 and not condition:
+        return '{} ? {} : {}'.format(randomExpression(rng, deeper, True, False), randomExpression(rng, deeper),
+                                     randomExpression(rng, deeper, at_end=at_end))
+    if choice == 1:
+        return '(' + randomExpression(rng, deeper) + ')'
+    if choice == 2 and not condition:
+        operand = randomExpression(rng, deeper, True, True) if at_end else randomExpression(rng, 0)
+        return rng.choice(['!', 'not', 'empty', '-', '! empty']) + ' ' + operand
+    if choice in (3, 4):
+        # цепочка одного уровня, у equality и relation один оператор
+        operators = [['or', '||'], ['and', '&&'], ['+', '-'], ['*', 'div', '%', 'mod']][rng.randrange(4)]
+        count = rng.randint(1, 3)
+        operands = [randomExpression(rng, deeper, condition, at_end and i == count) for i in range(count + 1)]
+        return operands[0] + ''.join(' {} {}'.format(rng.choice(operators), operand) for operand in operands[1:])
+    if choice == 5:
+        left = randomExpression(rng, deeper, condition, False)
+        return '{} {} {}'.format(left, rng.choice(['eq', '==', 'ne', '!=', 'lt', '>', 'le', '>=']),
+                                 randomExpression(rng, deeper, condition, at_end))
+    return randomExpression(rng, 0)
+
+
+def antlrArena(expression: str) -> tuple:
+    errors = []
+    with redirect_stderr(io.StringIO()):
+        ctx = tree(expression, errors)
+    return ParseArena(ctx), errors
+
+
+def arenaArrays(arena: ParseArena) -> tuple:
+    return (list(arena.kinds), list(arena.parents), list(arena.first_child), list(arena.next_sibling),
+            list(arena.starts), list(arena.stops), bytes(arena.flags), list(arena.types),
+            arena.source.spaced, arena.source.compact)
+
+
+def dmnExpressions(dmn_tree) -> list:
+    return [node.operator if isinstance(node, OperatorDMN) else re.sub(r'dmn\d+', 'dmn', node.expression)
+            for node in postorder(dmn_tree.root)]
+
+
+class TestPrattParser(unittest.TestCase):
+    def assertConforms(self, expression: str):
+        antlr, errors = antlrArena(expression)
+        self.assertEqual([], errors, expression)
+        pratt_errors = []
+        pratt = parse(expression, pratt_errors)
+        self.assertEqual([], pratt_errors, expression)
+        self.assertEqual(arenaArrays(antlr), arenaArrays(pratt), expression)
+
+    def test_lex(self):
+        tokens = lex(r"a1b2 007 'x\'y' eq div", [])
+        self.assertEqual(['a1b', '2', '0', '0', '7', r"'x\'y'", 'eq', 'div', '<EOF>'], [t.text for t in tokens])
+        self.assertEqual([JavaELParser.Identifyer, JavaELParser.IntegerLiteral, JavaELParser.Equality,
+                          JavaELParser.Div, EOF], [t.type for t in tokens if t.text in ('a1b', '2', 'eq', 'div', '<EOF>')])
+        errors = []
+        lex('a # b', errors)
+        self.assertEqual(2, errors[0].offset)
+
+    def test_same_arena(self):
+        for expression in conformance_expressions:
+            self.assertConforms(expression)
+
+    def test_random_conformance(self):
+        rng = random.Random(43)
+        parsed = 0
+        for _ in range(300):
+            expression = randomExpression(rng, 4)
+            antlr, errors = antlrArena(expression)
+            pratt = parse(expression, [])
+            if errors or antlr.stops[0] != len(lex(expression, [])) - 2:
+                self.assertIsNone(pratt, expression)
+            else:
+                parsed += 1
+                self.assertEqual(arenaArrays(antlr), arenaArrays(pratt), expression)
+        self.assertGreater(parsed, 150)
+
+    def test_prefix_nested_bases(self):
+        # ANTLR делит цепочку префиксных операторов, чтобы разобрать выражение целиком
+        self.assertConforms("! ! e ne c != d != f")
+        self.assertConforms("! ! e ? x : a eq empty b ne c != d != f")
+
+    def test_truncated_rejected(self):
+        for expression in truncated_expressions:
+            antlr, errors = antlrArena(expression)
+            self.assertEqual([], errors, expression)
+            self.assertLess(antlr.stops[0], len(lex(expression, [])) - 2, expression)
+            pratt_errors = []
+            self.assertIsNone(parse(expression, pratt_errors), expression)
+            self.assertTrue(pratt_errors, expression)
+
+    def test_errors(self):
+        for expression in invalid_expressions:
+            _, errors = antlrArena(expression)
+            self.assertTrue(errors, expression)
+            pratt_errors = []
+            self.assertIsNone(parse(expression, pratt_errors), expression)
+            self.assertTrue(pratt_errors, expression)
+        pratt_errors = []
+        parse('a and (b or', pratt_errors)
+        self.assertEqual(11, pratt_errors[0].offset)
+
+    def test_deep_nesting(self):
+        expression = '(' * 3000 + 'a' + ')' * 3000
+        errors = []
+        self.assertIsNone(parse(expression, errors))
+        self.assertEqual('expression is too deeply nested', errors[0].message)
+
+    def test_translate(self):
+        for expression in conformance_expressions[:4] + ["!empty a or b and (c == 1)", "(a or b) ? !x : y"]:
+            self.assertEqual(dmnExpressions(translate(expression)),
+                             dmnExpressions(translate(expression, parser=PRATT_PARSER)), expression)
+        with self.assertRaises(InvalidExpression):
+            translate("(a) + b", parser=PRATT_PARSER)
+
+
+if __name__ == '__main__':
+    unittest.main()
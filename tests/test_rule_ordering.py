@@ -0,0 +1,98 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+from lxml import etree
+
+from src.translator.dmnEvaluator import DMNEvaluator, columnsFromRecords
+from src.translator.ruleOrdering import TableOptimizer, optimizeTables, selectiveColumns, expectedEvaluations, \
+    FIRST, UNIQUE, ANY
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+from src.translator.xmlPacker import DecisionTable, RuleTag, expression_xml
+
+
+def statusDefinitions():
+    decision = DecisionTable.newTable(
+        ['fields.status', 'fields.count'],
+        'status_ok',
+        [
+            RuleTag(inputEntries=['"a","b"', '> 2'], outputEntry='true'),
+            RuleTag(inputEntries=['"c"', None], outputEntry='true'),
+            RuleTag(inputEntries=[None, None], outputEntry='false'),
+        ],
+        []
+    )
+    return etree.fromstring(etree.tostring(expression_xml('drd_id', [decision])))
+
+
+def ruleTexts(definitions: etree.Element) -> list:
+    return [[e.findtext('{*}text') or e.findtext('text') for e in rule if etree.QName(e).localname == 'inputEntry']
+            for rule in definitions.iter() if isinstance(rule.tag, str) and etree.QName(rule).localname == 'rule']
+
+
+class TestRuleOrdering(unittest.TestCase):
+    def setUp(self) -> None:
+        # чаще всего статус "c"
+        self.records = [{'fields': {'status': 'c', 'count': 1}}] * 8 + [
+            {'fields': {'status': 'a', 'count': 3}},
+            {'fields': {'status': 'd', 'count': 5}},
+        ]
+
+    def test_first_keeps_default_last(self):
+        definitions = statusDefinitions()
+        evaluator = DMNEvaluator(definitions)
+        columns = columnsFromRecords(self.records, evaluator.inputExpressions())
+        expected = list(evaluator.evaluate(columns))
+
+        (table,) = optimizeTables(definitions, columns)
+        self.assertEqual(FIRST, table.hitPolicy)
+        self.assertLess(table.after, table.before)
+        # count проверяется первым: его тест отсекает больше записей
+        self.assertEqual([['', '"c"'], ['> 2', '"a","b"'], ['', '']],
+                         [[t or '' for t in rule] for rule in ruleTexts(definitions)])
+        self.assertEqual(expected, list(DMNEvaluator(definitions).evaluate(columns)))
+
+    def test_hit_policy(self):
+        masks = [[np.array([True, False])], [np.array([False, True])]]
+        exclusive = TableOptimizer(['x'], [(['"a"'], '1'), (['"b"'], '2')], masks)
+        self.assertEqual(UNIQUE, exclusive.hitPolicy(1.0, 1.0))
+        self.assertEqual(FIRST, exclusive.hitPolicy(0.5, 1.0))
+        overlapping = TableOptimizer(['x'], [(['"a"'], 'true'), (['"a","b"'], 'true')], masks)
+        self.assertEqual(ANY, overlapping.hitPolicy(1.0, 1.0))
+        default = TableOptimizer(['x'], [(['"a"'], 'true'), ([''], 'false')], masks)
+        self.assertEqual(FIRST, default.hitPolicy(1.0, 1.0))
+        self.assertEqual({0: set(), 1: {0}}, default.before)
+
+    def test_no_gain_keeps_first(self):
+        # без выигрыша порядок прежний, но пересекающиеся строки с разным результатом требуют FIRST
+        masks = [[np.array([False, False]), np.array([True, True]), None],
+                 [np.array([False, True]), np.array([True, False]), np.array([False, True])]]
+        optimizer = TableOptimizer(['x', 'y', 'z'], [(['"a"', '"a"', ''], '"y"'), (['"a"', '"a"', '"b"'], '"x"')],
+                                   masks)
+        self.assertEqual((FIRST, [0, 1], [0, 1, 2], 2.5, 2.5), optimizer.optimize(UNIQUE))
+
+    def test_selective_columns(self):
+        masks = [[np.array([True, True]), np.array([False, True]), None]]
+        self.assertEqual([1, 0, 2], selectiveColumns(masks, 3))
+        self.assertEqual(2.0, expectedEvaluations(masks + [[None, None, None]], [0, 1], [0, 1, 2], False))
+        self.assertEqual(1.5, expectedEvaluations(masks, [0], [1, 0, 2], True))
+
+    def test_translated_same_result(self):
+        rng = random.Random(49)
+        space = [{'fields': dict(zip('xyz', v))} for v in itertools.product(['A', 'B', None], [1, 2], [True, False])]
+        for expression in ["fields['x'] eq 'A' or fields['y'] eq 1 and fields['z']",
+                           "fields['x'] eq 'B' and fields['y'] eq 2 or fields['x'] eq null or fields['z']"]:
+            definitions = etree.fromstring(etree.tostring(DMN_XML.visit(translate(expression))))
+            evaluator = DMNEvaluator(definitions)
+            sample = columnsFromRecords(rng.choices(space, [rng.random() for _ in space], k=50),
+                                        evaluator.inputExpressions())
+            optimizeTables(definitions, sample)
+            columns = columnsFromRecords(space, evaluator.inputExpressions())
+            self.assertEqual(list(evaluator.evaluate(columns)), list(DMNEvaluator(definitions).evaluate(columns)),
+                             expression)
+
+
+if __name__ == '__main__':
+    unittest.main()
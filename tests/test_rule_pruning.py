@@ -0,0 +1,68 @@
+import unittest
+from decimal import Decimal
+
+from src.translator.rulePruning import Literal, NULL, literalOf, compatible, pruneRows
+from src.translator.xmlPacker import DmnElementsExtracter, RuleTag
+
+
+class TestRulePruning(unittest.TestCase):
+    def test_literal(self):
+        self.assertEqual(Literal('string', 'a b'), literalOf(' "a b" '))
+        self.assertEqual(Literal('number', Decimal('1.5')), literalOf('1.50'))
+        self.assertEqual(Literal('boolean', False), literalOf('false'))
+        self.assertEqual(NULL, literalOf('null'))
+        self.assertIsNone(literalOf('fields.b'))
+
+    def test_compatible(self):
+        self.assertTrue(compatible(literalOf('1'), literalOf('"1.0"')))
+        self.assertTrue(compatible(literalOf('true'), literalOf('"TRUE"')))
+        self.assertFalse(compatible(literalOf('"a"'), literalOf('"b"')))
+        self.assertFalse(compatible(literalOf('1'), literalOf('true')))
+        self.assertFalse(compatible(NULL, literalOf('""')))
+
+    def test_unsatisfiable(self):
+        rows = [([('x', '= "a"'), ('x', '= "b"')], None), ([('x', ''), ('x', '= "Y"')], None),
+                ([('y', '= null'), ('y', '= 1')], None), ([('z', '= 1')], None)]
+        stats = []
+        self.assertEqual([([('z', '= 1')], None)], pruneRows(rows, stats))
+        self.assertEqual(3, stats[0].unsatisfiable)
+
+    def test_subsumed(self):
+        rows = [([('c', '')], None), ([('d', '= 1'), ('c', '')], None), ([('d', '= 1')], None),
+                ([('c', ''), ('d', '= 2')], 'x')]
+        stats = []
+        self.assertEqual([([('c', '')], None), ([('d', '= 1')], None), ([('c', ''), ('d', '= 2')], 'x')],
+                         pruneRows(rows, stats))
+        self.assertEqual(1, stats[0].subsumed)
+
+    def test_implied_cells(self):
+        rows = [([('x', '= "a"'), ('x', 'not((x))'), ('x', '= "a"')], None), ([('y', '= 1'), ('y', '= "1"')], None)]
+        self.assertEqual([([('x', '= "a"')], None), ([('y', '= 1'), ('y', '= "1"')], None)], pruneRows(rows))
+
+    def test_table(self):
+        expression = '( fields [ "X" ] and fields [ "X" ] = "Y" ) or ( fields [ "Z" ] = 1 )'
+        inputs = ['fields [ "X" ]', 'fields [ "Z" ]']
+        self.assertEqual([RuleTag([None, '= 1'], 'true'), RuleTag([None, None], 'false')],
+                         DmnElementsExtracter.getRulesOrdered(expression, inputs))
+        # без сокращения у fields [ "X" ] две проверки в одной строке
+        with self.assertRaises(ValueError):
+            DmnElementsExtracter.getRulesOrdered(expression, inputs, prune=False)
+
+    def test_catch_all_row(self):
+        expression = '( a = null and a = 1 )'
+        self.assertEqual([RuleTag([None], 'false')], DmnElementsExtracter.getRulesOrdered(expression, ['a']))
+
+    def test_dotted_paths(self):
+        # переменные SAT - по полному пути
+        rows = DmnElementsExtracter.getRulesOrdered('( fields.a = "x" and fields.b = "y" )', ['fields.a', 'fields.b'])
+        self.assertEqual(['true', 'false'], [r.outputEntry for r in rows])
+        rows = DmnElementsExtracter.getRulesOrdered('( fields.a = "x" and fields.a = "y" )', ['fields.a'])
+        self.assertEqual([RuleTag([None], 'false')], rows)
+        # путь не известен: строки не сокращаются
+        rows = DmnElementsExtracter.getRulesOrdered('( not(fields.a) and fields.a )', ['fields', 'fields.a'],
+                                                    prune=True)
+        self.assertEqual(['true', 'false'], [r.outputEntry for r in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from src.translator.treeFormula import tree, SyntaxTreePrinter
+from src.translator.feel_analizer import tree as feel_tree, FEELInputExtractor
+from src.translator.sourceText import text, compactText
+
+expression = "fields['SignFL']  eq   true or !(fields.a) ? 'a  b' : c"
+
+
+class TestSourceText(unittest.TestCase):
+    def test_same_as_printer(self):
+        t = tree(expression)
+        printer = SyntaxTreePrinter()
+        printer.visit(t)
+        self.assertEqual(printer.tree_expression, text(t))
+        self.assertEqual(t.getText(), compactText(t))
+
+    def test_subtree(self):
+        t = tree(expression)
+        condition = t.getChild(0)
+        self.assertEqual("fields [ 'SignFL' ] eq true or ! ( fields . a )", text(condition))
+        self.assertEqual("'a  b'", text(t.getChild(2)))
+        self.assertEqual('?', compactText(t.getChild(1)))
+
+    def test_feel_input(self):
+        extractor = FEELInputExtractor()
+        extractor.visit(feel_tree('fields["SignFL"] = true'))
+        self.assertEqual({'fields [ "SignFL" ]'}, extractor.result)
+
+
+if __name__ == '__main__':
+    unittest.main()
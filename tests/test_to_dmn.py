@@ -1,5 +1,12 @@
 import unittest
-from src.translator.toKNF import toDMNReady
+from lxml import etree
+from pyeda.boolalg import expr
+from src.translator.dmnEvaluator import DMNEvaluator
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+from src.translator.toKNF import toDMNReady, toDMNReadyBounded, estimateDNFSize, inputDomains, parseFormula, toInfix
+from src.translator.toKNF import formulaShape, shapeCacheInfo
+from src.translator.toKNF import _boundDNFSize
 
 test_el = "empty fields.id or !securityDataProvider.hasRole('tehprisEE_User')or\
     (dataObjectController.instance.objectStatus.status.code eq 'ta03_Paused')or\
@@ -15,12 +22,120 @@ test_el = "empty fields.id or !securityDataProvider.hasRole('tehprisEE_User')or\
 
 test_el_expected = "Or(~securityDataProvider_hasRole_tehprisEE_User_, And(fields_p_ContractTransferType_Code_eq_7185643, dataObjectController_instance_objectStatus_status_code_eq_ta09_ActsSigning, ~empty_fields_ScanActTP, empty_fields_ScanActTP_User_), dataObjectController_instance_objectStatus_status_code_eq_ta03_Paused, empty_fields_id, And(dataObjectController_instance_objectStatus_status_code_eq_ta05_ContractOnReviewApplicant, fields_p_ContractTransferType_Code_eq_7185643, ~empty_fields_ScanDopDogovor, empty_fields_ScanDopDogovorUser_), And(fields_p_ContractTransferType_Code_eq_7185643, dataObjectController_instance_objectStatus_status_code_eq_ta06_ContractSigned, ~empty_fields_DateCompTechnical_Company, empty_fields_DateCompTechnical_applicant_), And(dataObjectController_instance_objectStatus_status_code_eq_ta05_ContractOnReviewApplicant, fields_p_ContractTransferType_Code_eq_7185643, ~empty_fields_ScanDogovor, empty_fields_ScanDogovorCL), And(fields_p_ContractTransferType_Code_eq_7185643, dataObjectController_instance_objectStatus_status_code_eq_ta07_TUImplementationCheck, ~empty_fields_ScanActTU, empty_fields_ScanActTU_User_))"
 
+test_cnf = ' and '.join(f'(op_{2 * i} or op_{2 * i + 1})' for i in range(12))
+
+test_wide_operands = 3000
+test_deep_nesting = 3000
+
+test_domains = {
+    'op_1_eq_op_2': ('fields.x', '"a"'),
+    'op_3_eq_op_4': ('fields.x', '"b"'),
+    'op_5_eq_op_6': ('fields.x', '"b"'),
+}
+
+
+def _rowsLiterals(rows):
+    # порядок литералов в And зависит от порядка создания переменных pyeda
+    return {frozenset(literal.strip() for literal in row.split(' and ')) for row in rows}
+
+
+def _toPyeda(formula: str):
+    return expr.expr(formula.replace(' and ', ' & ').replace(' or ', ' | '))
+
 
 class TestToDMN(unittest.TestCase):
     def test_to_dmn(self):
         result = toDMNReady(test_el)
         self.assertEqual(test_el_expected, result)
 
+    def test_estimate_dnf_size(self):
+        self.assertEqual(2 ** 12, estimateDNFSize(_toPyeda(test_cnf)))
+        self.assertEqual(3, estimateDNFSize(_toPyeda('op_1 or op_2 and op_3 or op_4')))
+
+    def test_bounded_under_budget(self):
+        result = toDMNReadyBounded('op_1 and (op_2 or op_3)', 64)
+        self.assertEqual(_rowsLiterals({'op_1 and op_2', 'op_1 and op_3'}), _rowsLiterals(result.rows))
+        self.assertEqual({}, result.intermediates)
+
+    def test_bounded_split(self):
+        result = toDMNReadyBounded(test_cnf, 64)
+        self.assertTrue(0 < len(result.rows) <= 64)
+        self.assertTrue(len(result.intermediates) > 0)
+
+        # подстановка промежуточных решений обратно дает исходную формулу
+        bounded = _toPyeda(' or '.join('(' + row + ')' for row in result.rows))
+        for aux_name, formula in reversed(list(result.intermediates.items())):
+            bounded = bounded.compose({expr.exprvar(aux_name): _toPyeda(formula)})
+        self.assertTrue(bounded.equivalent(_toPyeda(test_cnf)))
+
+
+    def test_input_domains(self):
+        self.assertEqual({'fields.x': {'"a"': 'op_1_eq_op_2', '"b"': 'op_5_eq_op_6'}}, inputDomains(test_domains))
+
+    def test_domains_prune_unsatisfiable(self):
+        result = toDMNReadyBounded('(op_1 eq op_2 or op_3 eq op_4) and (op_5 eq op_6 or op_7)', domains=test_domains)
+        self.assertEqual(_rowsLiterals({'op_1_eq_op_2 and op_7', 'op_5_eq_op_6'}), _rowsLiterals(result.rows))
+
+    def test_domains_remove_implied_negation(self):
+        result = toDMNReadyBounded('op_1 eq op_2 and ! op_3 eq op_4', domains=test_domains)
+        self.assertEqual({'op_1_eq_op_2'}, result.rows)
+
+    def test_domains_all_rows_pruned(self):
+        result = toDMNReadyBounded('op_1 eq op_2 and op_3 eq op_4', domains=test_domains)
+        self.assertEqual(set(), result.rows)
+        # решение без выполнимых строк всегда false
+        definitions = etree.fromstring(etree.tostring(DMN_XML.visit(translate("fields.x eq 'a' and fields.x eq 'b'"))))
+        records = [{'fields': {'x': 'a'}}, {'fields': {'x': 'b'}}, {'fields': {}}]
+        self.assertEqual([False, False, False], list(DMNEvaluator(definitions).evaluateRecords(records)))
+
+    def test_parse_formula(self):
+        for formula in ['op_1', '~op_1 | op_2 & (op_3 | ~~op_4)', '~(op_1 & ~(op_2 | op_3)) & op_4', '(((op_1)))']:
+            self.assertEqual(str(expr.expr(formula)), str(parseFormula(formula)), formula)
+        # не поддерживаемые лексемы разбирает pyeda
+        self.assertEqual(str(expr.expr('op_1 => op_2')), str(parseFormula('op_1 => op_2')))
+        self.assertRaises(Exception, parseFormula, 'op_1 & (op_2')
+
+    def test_wide_formula(self):
+        # парсер pyeda падает с RecursionError уже на тысяче операндов
+        formula = ' or '.join(f'op_{i}' for i in range(test_wide_operands))
+        self.assertEqual(test_wide_operands, len(toDMNReady(formula)))
+
+    def test_deep_formula(self):
+        formula = expr.exprvar('op_0')
+        for i in range(1, test_deep_nesting):
+            formula = expr.Or(expr.And(formula, expr.exprvar(f'op_{i}'), simplify=False), expr.exprvar(f'op_{i}_'),
+                              simplify=False)
+        self.assertEqual(test_deep_nesting, estimateDNFSize(formula))
+        self.assertEqual(2 * test_deep_nesting - 1, toInfix(formula).count('op_'))
+        intermediates = {}
+        bounded, size = _boundDNFSize(formula, 64, intermediates)
+        self.assertTrue(size <= 64)
+        self.assertTrue(len(intermediates) > 0)
+
+    def test_formula_shape(self):
+        shape, pattern, names = formulaShape('op_12 | op_3 & ~op_12_eq_op_4 & ~op_12', {'op_12_eq_op_4': ('x', '"a"')})
+        self.assertEqual('op_0 | op_1 & ~op_2 & ~op_0', shape)
+        self.assertEqual((('op_2', 0, 0),), pattern)
+        self.assertEqual({'op_0': 'op_12', 'op_1': 'op_3', 'op_2': 'op_12_eq_op_4'}, names)
+        # домены различаются только совпадением входов и литералов
+        self.assertEqual(formulaShape('a_eq_b | c_eq_d', {'a_eq_b': ('x', '1'), 'c_eq_d': ('x', '2')})[:2],
+                         formulaShape('e_eq_f | g_eq_h', {'e_eq_f': ('y', '3'), 'g_eq_h': ('y', '4')})[:2])
+        self.assertNotEqual(formulaShape('a_eq_b | c_eq_d', {'a_eq_b': ('x', '1'), 'c_eq_d': ('x', '2')})[:2],
+                            formulaShape('a_eq_b | c_eq_d', {'a_eq_b': ('x', '1'), 'c_eq_d': ('y', '2')})[:2])
+
+    def test_shape_cache(self):
+        hits = shapeCacheInfo().hits
+        first = toDMNReadyBounded('op_101 and (op_102 or ! op_103)', 64)
+        second = toDMNReadyBounded('op_7 and (op_5 or ! op_6)', 64)
+        self.assertEqual(hits + 1, shapeCacheInfo().hits)
+        self.assertEqual(_rowsLiterals({'op_101 and op_102', 'op_101 and ~op_103'}), _rowsLiterals(first.rows))
+        self.assertEqual(_rowsLiterals({'op_7 and op_5', 'op_7 and ~op_6'}), _rowsLiterals(second.rows))
+
+        result = toDMNReadyBounded('(op_11 eq op_12 or op_13 eq op_14) and (op_15 eq op_16 or op_17)',
+                                   domains={'op_11_eq_op_12': ('fields.y', '"a"'), 'op_13_eq_op_14': ('fields.y', '"b"'),
+                                            'op_15_eq_op_16': ('fields.y', '"b"')})
+        self.assertEqual(_rowsLiterals({'op_11_eq_op_12 and op_17', 'op_15_eq_op_16'}), _rowsLiterals(result.rows))
+
 
 if __name__ == '__main__':
     unittest.main()
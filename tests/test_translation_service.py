@@ -0,0 +1,99 @@
+import asyncio
+import json
+import unittest
+from src.translator.translationService import TranslationService, Histogram
+
+simple_operand_or = "fields['SignFL'] eq true or fields['SignUL'] eq true"
+simple_operand_and = "fields['SignFL'] eq true and fields['SignUL'] eq true"
+# сравнения не поддерживаются при переводе в ДНФ
+not_translated = "fields.count > 2 or fields.status eq 'a'"
+
+
+async def request(port, method, path, body=None, length=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {length or len(data)}\r\n'
+                 f'Connection: close\r\n\r\n'.encode('latin-1') + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+
+class TestTranslationService(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram((1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        self.assertEqual({'1': 2, '10': 1, '+Inf': 1}, histogram.snapshot()['buckets'])
+
+    def test_deduplicate_batch(self):
+        async def run():
+            service = TranslationService(workers=1, batch_window=0.05)
+            await service.start()
+            try:
+                results = await asyncio.gather(
+                    service.translate(simple_operand_or),
+                    service.translate(simple_operand_or),
+                    service.translate(simple_operand_and),
+                )
+            finally:
+                await service.stop()
+            return results, service.metrics()
+
+        results, metrics = asyncio.run(run())
+        self.assertTrue(all(r['error'] is None and 'decision' in r['xml'] for r in results))
+        self.assertEqual(results[0]['xml'], results[1]['xml'])
+        self.assertEqual(1, metrics['counters']['deduplicated'])
+        self.assertEqual(1, metrics['counters']['batches'])
+        self.assertEqual(3, metrics['latency_ms']['count'])
+
+    def test_http(self):
+        async def run():
+            service = TranslationService(workers=1)
+            server = await service.serve(port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                responses = [
+                    await request(port, 'POST', '/translate', {'expression': simple_operand_or}),
+                    await request(port, 'POST', '/translate', {'expressions': [simple_operand_or, not_translated]}),
+                    await request(port, 'GET', '/metrics'),
+                    await request(port, 'GET', '/translate'),
+                ]
+            finally:
+                server.close()
+                await server.wait_closed()
+                await service.stop()
+            return responses
+
+        single, batch, metrics, wrong_method = asyncio.run(run())
+        self.assertEqual(200, single[0])
+        self.assertIsNone(single[1]['error'])
+        self.assertEqual(2, len(batch[1]['results']))
+        self.assertIsNotNone(batch[1]['results'][1]['error'])
+        self.assertEqual(3, metrics[1]['counters']['requests'])
+        self.assertEqual(405, wrong_method[0])
+
+    def test_bad_requests(self):
+        async def run():
+            service = TranslationService(workers=1)
+            server = await service.serve(port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                # json не объект и нечисловая длина тела - ответ 400, а не обрыв соединения
+                responses = [await request(port, 'POST', '/translate', body) for body in ([], 'x', 1)]
+                responses.append(await request(port, 'POST', '/translate', {'expression': 'a'}, length='abc'))
+            finally:
+                server.close()
+                await server.wait_closed()
+                await service.stop()
+            return responses
+
+        for status, response in asyncio.run(run()):
+            self.assertEqual(400, status)
+            self.assertIn('error', response)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
+import re
 import unittest
 
+from ANTLR_JavaELParser.JavaELParser import JavaELParser
 from src.translator.toKNF import toDMNReady
-from src.translator.treeFormula import tree, DMNTree, zipFormula, FormulaZipper, SimpleOperandMarker, unpack, concatWithOr
-from src.translator.treeFormula import treeHeight, ToFEELConverter, printDMNTree
+from src.translator.treeFormula import tree, DMNTree, ExpressionDMN, zipFormula, unpack, concatWithOr
+from src.translator.treeFormula import treeHeight, ToFEELConverter, printDMNTree, extract_id_re, OperatorDMN
+from src.translator.treeFormula import postorder, translateDMNReadyinDMNTree, collapseChains, DMN_XML
+from src.translator.xmlPacker import DecisionTable, RuleTag
+from src.translator.translate import translate
+from src.translator.passState import PassState
+from src.translator.parseArena import ParseArena, TERMINAL
 
 simple_operand = "value.property"
 simplify_with_ternary = "fields.ApplicantType.value.fields.Code eq 'UL' ? 'Юридический адрес' : 'Адрес места регистрации'"
@@ -21,7 +28,72 @@ translate_complex = "view.viewId.contains('portal.xhtml') and value.contains(fie
 translate_complex_ternary = "value.property ? (first_var and second_var or ! third_var) : 'xexe'"
 
 
+fused_analysis_expressions = [
+    simple_operand, simplify_with_ternary, simple_operand_or, sub_dmn_equality, sub_dmn_empty, sub_dmn_not_empty,
+    sub_dmn_complex, translate_with_ternary, translate_with_equality, translate_with_empty, translate_with_not,
+    translate_with_complex_unary, translate_complex, translate_complex_ternary,
+    "((a or b) ? !x : !y) and z", "x or ! empty (a and b)", "(a and b) == c or (a and b)",
+]
+
+# формы DMN дерева отдельных проходов по дереву разбора (example/src/traversal_visits.py), сохранены для сравнения
+# с FormulaAnalyzer: выражение узла с dmn вместо id ребенка или оператор узла, дети
+reference_shapes = {
+    simple_operand: ('value . property', []),
+    simplify_with_ternary: (
+        "fields . ApplicantType . value . fields . Code eq 'UL' ? 'Юридический адрес' : 'Адрес места регистрации'", []),
+    simple_operand_or: ("fields [ 'SignFL' ] eq true or fields [ 'SignUL' ] eq true", []),
+    sub_dmn_equality: ('dmn', [(JavaELParser.Equal, [('( first and second )', []), ('third', [])])]),
+    sub_dmn_empty: ('dmn', [(JavaELParser.Empty, [('( first and second )', [])])]),
+    sub_dmn_not_empty: ('dmn', [(JavaELParser.Not, [('dmn', [(JavaELParser.Empty, [('( first and second )', [])])])])]),
+    sub_dmn_complex: ("fields . p_ContractTransferType . Code eq '7185643' and dmn",
+                      [(JavaELParser.Not, [('dmn', [(JavaELParser.Empty, [('fields . ScanNotificationLetterSO', [])])])])]),
+    translate_with_ternary: ('a ? b : c', []),
+    translate_with_equality: ('( a == b ) and ( c ne d )', []),
+    translate_with_empty: ('dmn', [(JavaELParser.Empty, [('( some_big_expression )', [])])]),
+    translate_with_not: ('dmn', [(JavaELParser.Not, [('( a and b )', [])])]),
+    translate_with_complex_unary: ('dmn', [(JavaELParser.Not, [('dmn', [(JavaELParser.Empty, [('( a and b or c )', [])])])])]),
+    translate_complex: (
+        "view . viewId . contains ( 'portal.xhtml' ) and value . contains ( fields . ApplicantType . Code ) and dmn",
+        [(JavaELParser.Not, [('dmn', [(JavaELParser.Empty, [(
+            "fields . wiringDiagram and fields . p_ContractTransferType . Code eq '7185643' and ( dmn )",
+            [(JavaELParser.Not, [('dmn', [(JavaELParser.Empty, [(
+                "fields . id or ( dataObjectController . instance . objectStatus . status . code eq 'ta03_Paused' "
+                "and fields . SendDate )", [])])])])])])])])]),
+    translate_complex_ternary: ("value . property ? ( first_var and second_var or dmn ) : 'xexe'",
+                                [(JavaELParser.Not, [('third_var', [])])]),
+    "((a or b) ? !x : !y) and z": ('( dmn ? dmn : dmn ) and z',
+                                   [('( a or b )', []), (JavaELParser.Not, [('x', [])]), (JavaELParser.Not, [('y', [])])]),
+    "x or ! empty (a and b)": ('x or dmn', [(JavaELParser.Not, [('dmn', [(JavaELParser.Empty, [('( a and b )', [])])])])]),
+    "(a and b) == c or (a and b)": ('dmn or ( a and b )', [(JavaELParser.Equal, [('( a and b )', []), ('c', [])])]),
+}
+# simplify_with_ternary, сжатый отдельными проходами, с текстом операндов вместо op_ id
+reference_zipped_ternary = (
+    "(! (<fields . ApplicantType . value . fields . Code> eq <'UL'> ) and <'Адрес места регистрации'> ) or "
+    "(<fields . ApplicantType . value . fields . Code> eq <'UL'> and <'Юридический адрес'> )"
+)
+
+
 simple_operand_tree_h = 11
+simple_operand_arena_size = 4
+deep_dmn_chain = 3000
+nested_condition_ternary_depth = 8
+
+
+def dmnTreeShape(node) -> tuple:
+    if isinstance(node, OperatorDMN):
+        return node.operator, [dmnTreeShape(c) for c in node.children]
+    return re.sub(r'dmn\d+', 'dmn', node.expression), [dmnTreeShape(c) for c in node.children]
+
+
+def zippedWithOperands(zipped: str, operand_text) -> str:
+    return re.sub(r'dmn\d+', 'dmn', extract_id_re.sub(lambda m: '<' + operand_text(m.group(1)) + '>', zipped))
+
+
+def nestedConditionTernary(depth: int) -> str:
+    expression = 'a_0 and b_0'
+    for i in range(depth):
+        expression = f'( {expression} ? c_{i} : d_{i} )'
+    return expression
 
 
 class TestTreeTraverses(unittest.TestCase):
@@ -29,6 +101,19 @@ class TestTreeTraverses(unittest.TestCase):
         t = tree(simple_operand)
         self.assertEqual(simple_operand_tree_h, treeHeight(t))
 
+    def test_parse_arena(self):
+        arena = ParseArena(tree(simple_operand))
+        # цепочки контекстов с одним ребенком свернуты: value, две primitive и точка
+        self.assertEqual(simple_operand_arena_size, len(arena))
+        self.assertEqual(JavaELParser.RULE_value, arena.kinds[0])
+        self.assertEqual(-1, arena.parents[0])
+        self.assertEqual(['value', '.', 'property'], [arena.text(c) for c in arena.children(0)])
+        self.assertEqual(TERMINAL, arena.kinds[arena.childList(0)[1]])
+
+    def test_unpack_operand_prefix(self):
+        # номер вершины арены бывает префиксом номера другой вершины
+        self.assertEqual('( a) and !( b) or !( a)', unpack('op_1 and ~op_12 or ~op_1', {'1': 'a', '12': 'b'}))
+
     def assertTranslation(self, java_el, feel):
         t = tree(java_el)
         converter = ToFEELConverter()
@@ -40,14 +125,14 @@ class TestTreeTraverses(unittest.TestCase):
         dmntree = DMNTree(t)
         self.assertEqual(1, len(dmntree.root.children))
         self.assertEqual('(firstandsecond)', dmntree.root.children[0].expression)
-        self.assertEqual('==', dmntree.root.children[0].operator.getText())
+        self.assertEqual(JavaELParser.Equal, dmntree.root.children[0].operator)
 
     def test_find_sub_dmn_empty(self):
         t = tree(sub_dmn_empty)
         dmntree = DMNTree(t)
         self.assertEqual(1, len(dmntree.root.children))
         self.assertEqual('(firstandsecond)', dmntree.root.children[0].expression)
-        self.assertEqual('empty', dmntree.root.children[0].operator.getText())
+        self.assertEqual(JavaELParser.Empty, dmntree.root.children[0].operator)
 
     def test_find_sub_dmn_empty(self):
         t = tree(sub_dmn_not_empty)
@@ -58,10 +143,39 @@ class TestTreeTraverses(unittest.TestCase):
         self.assertEqual(1, len(dmntree.root.children))
 
         self.assertEqual('!empty(firstandsecond)', dmntree.root.children[0].expression)
-        self.assertEqual('!', dmntree.root.children[0].operator.getText())
+        self.assertEqual(JavaELParser.Not, dmntree.root.children[0].operator)
 
         self.assertEqual('(firstandsecond)', dmntree.root.children[0].children[0].expression)
-        self.assertEqual('empty', dmntree.root.children[0].children[0].operator.getText())
+        self.assertEqual(JavaELParser.Empty, dmntree.root.children[0].children[0].operator)
+
+    def test_operator_token_type(self):
+        dmntree = DMNTree(tree(sub_dmn_empty))
+        self.assertEqual(JavaELParser.Empty, dmntree.root.children[0].operator)
+        self.assertEqual('Empty', dmntree.root.children[0].operatorName)
+
+    def test_freeze(self):
+        dmntree = translate(simple_operand_or)
+        self.assertIsNone(dmntree.ctx)
+        self.assertIsNone(dmntree.root.contexts)
+        self.assertFalse(hasattr(dmntree.root, '__dict__'))
+        # выражения интернированы
+        self.assertIs(ExpressionDMN(''.join(['fields', '.a']), []).expression,
+                      ExpressionDMN(''.join(['fields.', 'a']), []).expression)
+
+    def test_sub_dmn_span(self):
+        dmntree = DMNTree(tree('(a and b) == c or (a and b)'))
+        operator_node = dmntree.root.children[0]
+        # заменяется только вынесенный операнд, одинаковый текст в другом месте остается
+        self.assertEqual(f'dmn{id(operator_node)} or ( a and b )', dmntree.root.expression)
+        self.assertEqual(['( a and b )', 'c'], [c.expression for c in operator_node.children])
+
+    def test_sub_dmn_unary_chain(self):
+        dmntree = DMNTree(tree('x or ! empty (a and b)'))
+        not_node = dmntree.root.children[0]
+        empty_node = not_node.children[0].children[0]
+        self.assertEqual(f'x or dmn{id(not_node)}', dmntree.root.expression)
+        self.assertEqual(f'dmn{id(empty_node)}', not_node.children[0].expression)
+        self.assertEqual('( a and b )', empty_node.children[0].expression)
 
     def test_find_sub_dmn_complex(self):
         t = tree(sub_dmn_complex)
@@ -93,9 +207,9 @@ class TestTreeTraverses(unittest.TestCase):
         self.assertTranslation(translate_complex_ternary, "if value.property then ( first_var and second_var or not( third_var ) ) else 'xexe'")
 
     def test_simplify(self):
-        prepared = zipFormula(tree(simplify_with_ternary)).expression
-        prepared = toDMNReady(prepared)
-        prepared = unpack(concatWithOr(prepared))
+        zipped = zipFormula(tree(simplify_with_ternary))
+        prepared = toDMNReady(zipped.expression)
+        prepared = unpack(concatWithOr(prepared), zipped.operands)
         self.assertTrue(
             prepared in [
             '(( fields . ApplicantType . value . fields . Code eq  \'UL\') and \'Юридический адрес\') or (!( fields . ApplicantType . value . fields . Code eq \'UL\') and \'Адрес места регистрации\')',
@@ -105,16 +219,26 @@ class TestTreeTraverses(unittest.TestCase):
         )
 
     def testZipper(self):
-        t = tree(simplify_with_ternary)
-        SimpleOperandMarker().visit(t)
-        zipper = FormulaZipper()
-        zipper.visit(t)
-        self.assertEqual(8, len(zipper.result.split(' ')))
+        zipped = zipFormula(tree(simplify_with_ternary))
+        self.assertEqual(reference_zipped_ternary, zippedWithOperands(zipped.expression, zipped.operands.get))
+        self.assertEqual(8, len(zipped.expression.split(' ')))
+
+    def test_pass_state(self):
+        t = tree(simple_operand_or)
+        first = zipFormula(t).expression
+        # марки прохода не хранятся в контекстах, повторный проход дает тот же результат
+        self.assertEqual(first, zipFormula(t).expression)
+        self.assertFalse(any(hasattr(n, a) for n in PassState(t).nodes for a in ('colors', 'is_simple_operand', 'visited')))
+
+        state = PassState(t)
+        self.assertEqual(-1, state.parents[0])
+        self.assertEqual(len(state), len(state.simple))
+        self.assertIs(t, state.nodes[state.index(t)])
 
     def test_or(self):
-        prepared = zipFormula(tree(simple_operand_or)).expression
-        prepared = toDMNReady(prepared)
-        prepared = unpack(concatWithOr(prepared))
+        zipped = zipFormula(tree(simple_operand_or))
+        prepared = toDMNReady(zipped.expression)
+        prepared = unpack(concatWithOr(prepared), zipped.operands)
         self.assertTrue(
             prepared in [
                 "( fields [ 'SignUL' ] eq true) or ( fields [ 'SignFL' ] eq true)",
@@ -123,5 +247,111 @@ class TestTreeTraverses(unittest.TestCase):
             "Unpack broken"
         )
 
+    def test_fused_analysis(self):
+        for expression in fused_analysis_expressions:
+            dmntree = DMNTree(tree(expression))
+            self.assertEqual(reference_shapes[expression], dmnTreeShape(dmntree.root), expression)
+
+            # выражение каждого узла, разобранное заново и сжатое, совпадает со сжатым при обходе
+            nodes = [dmntree.root]
+            while nodes:
+                node = nodes.pop()
+                nodes.extend(node.children)
+                if isinstance(node, ExpressionDMN):
+                    fused = zippedWithOperands(node.zipped.expression, node.zipped.operands.get)
+                    reparsed = zipFormula(tree(node.expression))
+                    reparsed = zippedWithOperands(reparsed.expression, reparsed.operands.get)
+                    self.assertEqual(reparsed, fused, expression)
+
+    def test_ternary_condition_shared(self):
+        dmntree = DMNTree(tree(nestedConditionTernary(nested_condition_ternary_depth)))
+
+        nodes = [dmntree.root]
+        expression_nodes = 0
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.children)
+            expression_nodes += 1
+            # условие тернарного оператора копируется как один операнд
+            zipped = zipFormula(tree(node.expression)).expression
+            self.assertTrue(zipped.count('op_') <= 4, zipped)
+
+        self.assertEqual(nested_condition_ternary_depth + 1, expression_nodes)
+
+    def test_deep_dmn_tree(self):
+        leaf = ExpressionDMN("fields.a eq 'x' or fields.b", [])
+        dmntree = DMNTree(None)
+        dmntree.root = leaf
+        for _ in range(deep_dmn_chain):
+            not_node = OperatorDMN(JavaELParser.Not)
+            not_node.children.append(dmntree.root)
+            dmntree.root = not_node
+
+        # обходы DMN дерева без рекурсии
+        printDMNTree(dmntree)
+        translateDMNReadyinDMNTree(dmntree)
+        nodes = list(postorder(dmntree.root))
+        self.assertIs(leaf, nodes[0])
+        self.assertIs(dmntree.root, nodes[-1])
+        self.assertEqual(deep_dmn_chain + 1, len(nodes))
+        self.assertIn('fields.a = ', leaf.expression)
+
+    def test_collapse_chains(self):
+        dmntree = translate('fields.b and !(fields.a eq 1 or fields.c)', collapse=False)
+        not_node = dmntree.root.children[0]
+        operand = not_node.children[0]
+        self.assertEqual(1, collapseChains(dmntree))
+        self.assertEqual([operand], dmntree.root.children)
+        self.assertEqual((JavaELParser.Not,), operand.operators)
+        self.assertIn(f'dmn{id(operand)}', dmntree.root.expression)
+
+        # ( dmn ) над результатом потомка заменяется потомком
+        dmntree = translate('!(!(fields.a eq 1))')
+        self.assertEqual([], dmntree.root.children)
+        self.assertEqual((JavaELParser.Not, JavaELParser.Not), dmntree.root.operators)
+
+    def test_collapse_empty_path(self):
+        # empty сворачивается в проверку всего пути операнда, а не первого идентификатора fields
+        for expression, path in [("!empty fields['a']", 'fields [ "a" ]'), ('!empty fields.a', 'fields.a'),
+                                 ("!empty fields['a'].b", 'fields [ "a" ].b')]:
+            dmntree = translate(expression)
+            self.assertEqual([], dmntree.root.children, expression)
+            self.assertEqual((JavaELParser.Empty, JavaELParser.Not), dmntree.root.operators, expression)
+            (decision,) = DMN_XML.visit(dmntree).iter('decision')
+            self.assertEqual([path], [e.findtext('text') for e in decision.iter('inputExpression')])
+            self.assertEqual([DecisionTable.EMPTY_TEST, ''], [e.findtext('text') for e in decision.iter('inputEntry')])
+
+    def test_collapse_deep_chain(self):
+        leaf = ExpressionDMN("fields.a eq 'x' or fields.b", [])
+        dmntree = DMNTree(None)
+        dmntree.root = leaf
+        for _ in range(deep_dmn_chain):
+            not_node = OperatorDMN(JavaELParser.Not)
+            not_node.children.append(dmntree.root)
+            dmntree.root = not_node
+        translateDMNReadyinDMNTree(dmntree)
+        self.assertEqual(deep_dmn_chain, collapseChains(dmntree))
+        self.assertIs(leaf, dmntree.root)
+        self.assertEqual(deep_dmn_chain, len(leaf.operators))
+
+    def test_fold_operators(self):
+        rules = [RuleTag(['= 1'], 'true'), RuleTag([None], 'false')]
+        self.assertEqual([RuleTag(['= 1'], 'false'), RuleTag([None], 'true')],
+                         DecisionTable.foldOperators(rules, [JavaELParser.Not], 1))
+        # строка для значений без правила
+        self.assertEqual([RuleTag(['= 1'], 'true'), RuleTag([None], 'true')],
+                         DecisionTable.foldOperators([RuleTag(['= 1'], 'false')], [JavaELParser.Not], 1))
+        with self.assertRaises(ValueError):
+            DecisionTable.foldOperators(rules, [JavaELParser.Empty], 1)
+        # empty над одиночным операндом проверяет его вход
+        self.assertEqual([RuleTag([DecisionTable.EMPTY_TEST], 'true'), RuleTag([None], 'false')],
+                         DecisionTable.expressionRules('( fields [ "a" ] )', {'fields [ "a" ]'}, [JavaELParser.Empty]))
+
+    def test_zipper_ternary(self):
+        operand_ids = extract_id_re.findall(zipFormula(tree(translate_with_ternary)).expression)
+        # a, c, a, b
+        self.assertEqual(4, len(operand_ids))
+        self.assertEqual(3, len(set(operand_ids)))
+
 if __name__ == '__main__':
     unittest.main()
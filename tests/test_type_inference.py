@@ -0,0 +1,89 @@
+import unittest
+
+from lxml import etree
+
+from src.translator.translate import translate
+from src.translator.treeFormula import DMN_XML
+from src.translator.typeInference import TypeRef, InputTypes, outputType, literalKind, INTEGER_STRING, DATE
+from src.translator.rulePruning import literalOf
+from src.translator.xmlPacker import RuleTag
+
+
+def typeRefs(definitions: etree.Element) -> dict:
+    # текст входа -> typeRef по всем таблицам
+    refs = {}
+    for e in definitions.iter():
+        if isinstance(e.tag, str) and etree.QName(e).localname == 'inputExpression':
+            refs.setdefault(e.findtext('{*}text'), set()).add(e.get('typeRef'))
+    return refs
+
+
+def entries(definitions: etree.Element) -> list:
+    return [e.findtext('{*}text') for e in definitions.iter()
+            if isinstance(e.tag, str) and etree.QName(e).localname == 'inputEntry']
+
+
+class TestTypeInference(unittest.TestCase):
+    def test_literal_kind(self):
+        self.assertEqual(INTEGER_STRING, literalKind(literalOf('"7185643"')))
+        self.assertEqual(DATE, literalKind(literalOf('"2021-03-01"')))
+        self.assertIsNone(literalKind(literalOf('null')))
+
+    def test_type_of(self):
+        types = InputTypes()
+        for entry in ['= 1', '= "2"', '= null', None]:
+            types.observe('a', entry)
+        types.observe('b', '= 1.5')
+        types.observe('c', '')
+        types.observe('c', '= "TRUE"')
+        types.observe('d', '= "1"')
+        types.observe('e', '"2020-01-01","2021-01-01"')
+        self.assertEqual(TypeRef.INTEGER, types.typeOf('a'))
+        self.assertEqual(TypeRef.DOUBLE, types.typeOf('b'))
+        self.assertEqual(TypeRef.BOOLEAN, types.typeOf('c'))
+        # только строки: тип по значениям не угадывается
+        self.assertEqual(TypeRef.STRING, types.typeOf('d'))
+        self.assertEqual(TypeRef.DATE, types.typeOf('e'))
+        self.assertTrue(types.observe('a', '= "x"'))
+        self.assertEqual(TypeRef.STRING, types.typeOf('a'))
+        self.assertEqual(types.kinds, InputTypes(types.toDict()).kinds)
+
+    def test_typed_entry(self):
+        types = InputTypes({'a': ['integer', 'integer_string'], 'c': ['boolean'], 'e': ['date']})
+        self.assertEqual('= 2', types.typedEntry('a', '= "2"'))
+        self.assertEqual('true', types.typedEntry('c', ''))
+        self.assertEqual('true', types.typedEntry('c', '(c'))
+        self.assertEqual('not((c))', types.typedEntry('c', 'not((c))'))
+        self.assertEqual('date("2020-01-01"),date("2021-01-01")',
+                         types.typedEntry('e', '"2020-01-01","2021-01-01"'))
+        self.assertIsNone(types.typedEntry('a', None))
+        self.assertEqual('= "x"', types.typedEntry('s', '= "x"'))
+
+    def test_output_type(self):
+        self.assertEqual(TypeRef.BOOLEAN, outputType([RuleTag(['= 1'], 'true'), RuleTag([''], 'false')]))
+        self.assertEqual(TypeRef.STRING, outputType([RuleTag(['= 1'], '"a"')]))
+
+    def test_xml_type_refs(self):
+        definitions = DMN_XML.visit(translate("fields['a'] eq 1 and fields['b'] eq '2021-03-01' or fields['c']"))
+        self.assertEqual({'fields [ "a" ]': {'integer'}, 'fields [ "b" ]': {'date'}, 'fields [ "c" ]': {'boolean'}},
+                         typeRefs(definitions))
+        self.assertIn('= date("2021-03-01")', entries(definitions))
+        self.assertIn('true', entries(definitions))
+
+    def test_catalog_types(self):
+        # одинаковый тип входа во всех таблицах каталога
+        expressions = ["fields['a'] eq 1 or fields['b'] eq true", "fields['a'] eq '2' and fields['c'] eq 'x'",
+                       "fields['a'] eq 3.5 or fields['c'] eq 'y'"]
+        trees = [translate(e) for e in expressions]
+        types = InputTypes()
+        for dmn_tree in trees:
+            DMN_XML.observeTypes(dmn_tree, types)
+        self.assertEqual(TypeRef.DOUBLE, types.typeOf('fields [ "a" ]'))
+        for dmn_tree in trees:
+            for refs in typeRefs(DMN_XML.visit(dmn_tree, types)).values():
+                self.assertEqual(1, len(refs))
+        self.assertIn('= 2', entries(DMN_XML.visit(trees[1], types)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from src.translator.xmlPacker import DmnElementsExtracter, RuleTag
 
 
 class MyTestCase(unittest.TestCase):
@@ -6,5 +7,50 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(True, False)
 
 
+
+class TestDmnElementsExtracter(unittest.TestCase):
+    def test_merge_equality_rules(self):
+        rules = [
+            RuleTag(inputEntries=['= "a"', None], outputEntry='true'),
+            RuleTag(inputEntries=['= "b"', None], outputEntry='true'),
+            RuleTag(inputEntries=['= "c"', '= 1'], outputEntry='true'),
+            RuleTag(inputEntries=[None, None], outputEntry='false'),
+        ]
+        self.assertEqual(
+            [
+                RuleTag(inputEntries=['"a","b"', None], outputEntry='true'),
+                RuleTag(inputEntries=['= "c"', '= 1'], outputEntry='true'),
+                RuleTag(inputEntries=[None, None], outputEntry='false'),
+            ],
+            DmnElementsExtracter.mergeEqualityRules(rules)
+        )
+
+    def test_merge_different_subfields(self):
+        # fields.a и fields.b - разные входы, их равенства не сливаются
+        expression = '( fields.a = "x" ) or ( fields.b = "y" ) or ( fields.a = "z" )'
+        inputs = DmnElementsExtracter.getInputs(expression)
+        self.assertEqual({'fields.a', 'fields.b'}, inputs)
+        rules = DmnElementsExtracter.getRulesOrdered(expression, ['fields.a', 'fields.b'])
+        self.assertEqual(
+            [
+                RuleTag(inputEntries=['"x","z"', None], outputEntry='true'),
+                RuleTag(inputEntries=[None, '= "y"'], outputEntry='true'),
+                RuleTag(inputEntries=[None, None], outputEntry='false'),
+            ],
+            rules
+        )
+
+    def test_one_test_per_input(self):
+        # разные проверки одного входа в строке не теряются
+        with self.assertRaises(ValueError):
+            DmnElementsExtracter.getRulesOrdered('( fields.a.size() = 1 and fields.a.size() = 2 )', ['fields.a.size()'],
+                                                 prune=False)
+        with self.assertRaises(ValueError):
+            DmnElementsExtracter.getRulesOrdered('( not(fields.a) and not(fields.b) )', ['fields'])
+        self.assertEqual([RuleTag(['= "x"', ''], 'true'), RuleTag([None, None], 'false')],
+                         DmnElementsExtracter.getRulesOrdered('( fields.a = "x" and fields.b and fields.a = "x" )',
+                                                              ['fields.a', 'fields.b']))
+
+
 if __name__ == '__main__':
     unittest.main()